@@ -0,0 +1,423 @@
+"""
+Per-view request metrics in the Prometheus text format.
+
+MetricsMiddleware records, for every request, under the resolved view name
+(`home`, `tour_detail`, `admin:index`, ...):
+
+    bondvoyage_http_requests_total                 by status code
+    bondvoyage_http_request_duration_seconds       histogram
+    bondvoyage_db_queries_total                    queries run
+    bondvoyage_db_query_seconds_total              time spent in them
+    bondvoyage_template_render_seconds_total       time spent rendering templates
+    bondvoyage_http_response_bytes_total           response bodies sent
+
+A streaming response (CSV/XLSX exports) is recorded when the server closes
+it, so its duration and queries include producing the body and its bytes
+are the ones actually sent. A FileResponse keeps its file for the server's
+sendfile path: it is timed to close() too, and counted by Content-Length.
+Async streaming responses (under ASGI) are recorded when the view returns,
+with no body bytes.
+
+The request path only does a few additions on plain Python numbers (a few
+microseconds; see measure_overhead()). Queries are timed by an execute
+wrapper installed once per connection, templates by the
+InstrumentedDjangoTemplates backend.
+
+Counters live in the worker process. With several workers (gunicorn) set
+settings.METRICS_DIR to a directory they share: each process writes its
+counters to its own file there (named by a per-process id, so a reused pid
+never overwrites another process's counts) after a request at most every
+METRICS_FLUSH_INTERVAL seconds, and once more at exit. The /metrics view
+adds up every file. A file whose process (on this host) has exited is
+still counted for METRICS_DEAD_PROCESS_RETENTION seconds after its last
+write, so a scrape sees the final counts, and then deleted: the totals
+drop back, which Prometheus treats as a counter reset.
+"""
+import atexit
+import bisect
+import contextvars
+import glob
+import hmac
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template import TemplateDoesNotExist
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Summed counters kept per view, besides the status counts and histogram
+TOTALS = {
+    'queries': ('bondvoyage_db_queries_total', "Database queries run, by view."),
+    'db_seconds': ('bondvoyage_db_query_seconds_total', "Seconds spent in database queries, by view."),
+    'template_seconds': ('bondvoyage_template_render_seconds_total', "Seconds spent rendering templates, by view."),
+    'response_bytes': ('bondvoyage_http_response_bytes_total', "Response body bytes, by view."),
+}
+
+_current = contextvars.ContextVar('bondvoyage_request_stats', default=None)
+
+
+class RequestStats:
+    """What one request spent on queries and templates."""
+    __slots__ = ('queries', 'db_seconds', 'template_seconds', 'template_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+
+
+def _timed_execute(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:  # outside a request, e.g. a management command
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_seconds += time.perf_counter() - started
+        stats.queries += 1
+
+
+def install_query_timer(connection, **kwargs):
+    """
+    Adds the query timer to a connection for good (rather than per request
+    with execute_wrapper(), which costs more than the rest of the
+    middleware); it only measures while a request is being handled.
+    """
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_execute)
+
+
+connection_created.connect(install_query_timer)
+
+
+def _empty_view():
+    return {
+        'statuses': {},
+        'buckets': [0] * (len(DURATION_BUCKETS) + 1),  # per bucket, not cumulative; last is +Inf
+        'duration_sum': 0.0,
+        **{key: 0 for key in TOTALS},
+    }
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)  # signal 0: only checks that the process exists
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, but belongs to another user
+    return True
+
+
+class MetricsStore:
+    """The counters of this process, plus flushing them to METRICS_DIR."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.process_id = uuid.uuid4().hex
+        self.reset()
+
+    def reset(self):
+        self.views = {}
+        self.flushed_at = time.monotonic()
+
+    def forked(self):
+        # A forked worker is a new process: its own file, counting from zero
+        self.process_id = uuid.uuid4().hex
+        self.reset()
+
+    def record(self, view, status, duration, stats, response_bytes):
+        with self.lock:
+            entry = self.views.get(view)
+            if entry is None:
+                entry = self.views[view] = _empty_view()
+            statuses = entry['statuses']
+            statuses[status] = statuses.get(status, 0) + 1
+            entry['buckets'][bisect.bisect_left(DURATION_BUCKETS, duration)] += 1
+            entry['duration_sum'] += duration
+            entry['queries'] += stats.queries
+            entry['db_seconds'] += stats.db_seconds
+            entry['template_seconds'] += stats.template_seconds
+            entry['response_bytes'] += response_bytes
+
+    def snapshot(self):
+        with self.lock:
+            return json.loads(json.dumps(self.views))
+
+    def _path(self, directory):
+        return os.path.join(directory, f"metrics-{self.process_id}.json")
+
+    def maybe_flush(self):
+        directory = settings.METRICS_DIR
+        if directory and time.monotonic() - self.flushed_at >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush(directory)
+
+    def flush(self, directory):
+        self.flushed_at = time.monotonic()
+        path = self._path(directory)
+        os.makedirs(directory, exist_ok=True)
+        with open(f"{path}.tmp", 'w') as handle:
+            json.dump({'pid': os.getpid(), 'host': socket.gethostname(), 'views': self.snapshot()}, handle)
+        os.replace(f"{path}.tmp", path)  # readers never see a half-written file
+
+    def flush_at_exit(self):
+        """The last interval of a worker that stops (or idles until it is stopped)."""
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if directory and self.views:
+            try:
+                self.flush(directory)
+            except OSError:
+                pass  # nothing left to report it to
+
+    def _is_dead(self, path, flushed):
+        """Whether the process behind a flushed file has exited longer ago than the retention."""
+        if 'pid' not in flushed:
+            return True  # written before files carried their process
+        if flushed.get('host') != socket.gethostname() or _process_alive(flushed['pid']):
+            return False  # another host's processes cannot be checked from here
+        return time.time() - os.path.getmtime(path) > settings.METRICS_DEAD_PROCESS_RETENTION
+
+    def collect(self):
+        """This process's counters plus every other live (or just exited) process's last flush."""
+        merged = {}
+        sources = [self.snapshot()]
+        directory = settings.METRICS_DIR
+        if directory:
+            own = self._path(directory)
+            for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+                if path == own:
+                    continue
+                try:
+                    with open(path) as handle:
+                        flushed = json.load(handle)
+                    if self._is_dead(path, flushed):
+                        os.remove(path)
+                        continue
+                except (OSError, ValueError):
+                    continue  # being replaced (or removed) right now; next scrape gets it
+                sources.append(flushed['views'])
+
+        for views in sources:
+            for view, entry in views.items():
+                total = merged.setdefault(view, _empty_view())
+                for status, count in entry['statuses'].items():
+                    total['statuses'][status] = total['statuses'].get(status, 0) + count
+                total['buckets'] = [a + b for a, b in zip(total['buckets'], entry['buckets'])]
+                total['duration_sum'] += entry['duration_sum']
+                for key in TOTALS:
+                    total[key] += entry[key]
+        return merged
+
+
+store = MetricsStore()
+# A forked worker starts counting from zero rather than repeating its parent's
+os.register_at_fork(after_in_child=store.forked)
+atexit.register(store.flush_at_exit)
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name or match.route or 'unnamed'
+
+
+def _response_bytes(response):
+    length = response.get('Content-Length')
+    if length and length.isdigit():
+        return int(length)
+    return 0 if response.streaming else len(response.content)
+
+
+def _streamed(chunks, stats, sent):
+    """The body of a streaming response, with its queries counted and its bytes added to sent[0]."""
+    chunks = iter(chunks)
+    while True:
+        token = _current.set(stats)
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        finally:
+            _current.reset(token)
+        sent[0] += len(chunk)
+        yield chunk
+
+
+class MetricsMiddleware:
+    """Outermost middleware, so the timings include every other one."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Connections opened before this module was loaded missed connection_created
+        for connection in connections.all(initialized_only=True):
+            install_query_timer(connection)
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        if response.streaming and not response.is_async:
+            self._record_at_close(request, response, stats, started)
+        else:
+            self._record(request, response, stats, started, _response_bytes(response))
+        return response
+
+    def _record(self, request, response, stats, started, response_bytes):
+        duration = time.perf_counter() - started
+        store.record(view_label(request), str(response.status_code), duration, stats, response_bytes)
+        store.maybe_flush()
+
+    def _record_at_close(self, request, response, stats, started):
+        if getattr(response, 'file_to_stream', None) is not None:
+            sent = None  # left to wsgi.file_wrapper; Content-Length says how much
+        else:
+            sent = [0]
+            response.streaming_content = _streamed(response.streaming_content, stats, sent)
+
+        def record():
+            self._record(request, response, stats, started, _response_bytes(response) if sent is None else sent[0])
+
+        # The server calls close() once the body is sent (or the client went away)
+        response._resource_closers.append(record)
+
+
+# --- Template render time ---
+
+class InstrumentedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(context, request)
+
+        # Only the outermost render counts; nested ones are part of its time
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_seconds += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render times fed to the metrics."""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return InstrumentedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+# --- Exposition ---
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(views):
+    lines = [
+        "# HELP bondvoyage_http_requests_total Requests handled, by view and status code.",
+        "# TYPE bondvoyage_http_requests_total counter",
+    ]
+    for view, entry in sorted(views.items()):
+        for status, count in sorted(entry['statuses'].items()):
+            lines.append(f'bondvoyage_http_requests_total{{view="{_label(view)}",status="{_label(status)}"}} {count}')
+
+    lines += [
+        "# HELP bondvoyage_http_request_duration_seconds Request latency, by view.",
+        "# TYPE bondvoyage_http_request_duration_seconds histogram",
+    ]
+    for view, entry in sorted(views.items()):
+        label = _label(view)
+        cumulative = 0
+        for bound, count in zip(DURATION_BUCKETS + ('+Inf',), entry['buckets']):
+            cumulative += count
+            le = bound if bound == '+Inf' else repr(bound)
+            lines.append(f'bondvoyage_http_request_duration_seconds_bucket{{view="{label}",le="{le}"}} {cumulative}')
+        lines.append(f'bondvoyage_http_request_duration_seconds_sum{{view="{label}"}} {_number(entry["duration_sum"])}')
+        lines.append(f'bondvoyage_http_request_duration_seconds_count{{view="{label}"}} {cumulative}')
+
+    for key, (name, help_text) in TOTALS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for view, entry in sorted(views.items()):
+            lines.append(f'{name}{{view="{_label(view)}"}} {_number(entry[key])}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def _token_allowed(request):
+    token = settings.METRICS_TOKEN
+    header = request.headers.get('Authorization', '')
+    return bool(token) and hmac.compare_digest(header.encode(), f"Bearer {token}".encode())
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint. Staff sessions only, or a scraper sending
+    `Authorization: Bearer <settings.METRICS_TOKEN>`.
+    """
+    if not (request.user.is_active and request.user.is_staff) and not _token_allowed(request):
+        return HttpResponseForbidden("Staff only.")
+    return HttpResponse(render_prometheus(store.collect()), content_type=CONTENT_TYPE)
+
+
+def measure_overhead(iterations=10000):
+    """
+    Mean seconds MetricsMiddleware adds to a request that does nothing:
+    the middleware around a no-op view minus the no-op view alone.
+    """
+    from django.http import HttpResponse as Response
+    from django.test import RequestFactory
+    from django.urls import resolve
+
+    request = RequestFactory().get('/')
+    request.resolver_match = resolve('/')
+    response = Response(b'ok')
+
+    def bare(request):
+        return response
+
+    middleware = MetricsMiddleware(bare)
+    saved = store.views
+    store.views = {}
+    try:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            bare(request)
+        baseline = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for _ in range(iterations):
+            middleware(request)
+        instrumented = time.perf_counter() - started
+    finally:
+        store.views = saved
+    return max(instrumented - baseline, 0.0) / iterations
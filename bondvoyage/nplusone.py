@@ -0,0 +1,190 @@
+"""
+N+1 query detection.
+
+QueryPatternDetector groups every SQL statement run while it is active by
+its shape (the statement with literals, parameters and IN lists replaced,
+so `... WHERE id = 3` and `... WHERE id = 4` are the same query) and by
+its call site: the template line being rendered when the query ran, e.g.
+`admin/booking_list.html:42` for a lazy `{{ booking.user.username }}`,
+otherwise the innermost line of project code. A shape repeated from one
+site more than settings.NPLUSONE_THRESHOLD times is an N+1: one query per
+row where a select_related(), prefetch_related() or annotation would do.
+
+NPlusOneMiddleware runs a detector around every request when
+settings.NPLUSONE_MODE is 'log' (a warning on the `bondvoyage.nplusone`
+logger) or 'raise' (NPlusOneError, which fails the test that made the
+request). Left unset, it logs while DEBUG is on and is off otherwise; when
+off it costs nothing, since the stack is only inspected while detecting.
+
+Tests can also check a block directly:
+
+    with assert_no_n_plus_one():
+        self.client.get(reverse('admin_booking_list'))
+"""
+import logging
+import os
+import re
+import sys
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+
+import django
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+MODES = ('off', 'log', 'raise')
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+# Transaction bookkeeping repeats by design (one SAVEPOINT per atomic block)
+_IGNORED = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+_DJANGO_DIR = os.path.dirname(django.__file__) + os.sep
+_THIS_FILE = __file__
+
+
+class NPlusOneError(AssertionError):
+    """Raised in 'raise' mode; an AssertionError so test runners report a failure."""
+
+
+def normalize(sql):
+    """The statement's shape: literals and parameters as ?, IN lists as (...)."""
+    sql = _STRING.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDERS.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def _project_file(filename):
+    root = str(settings.BASE_DIR) + os.sep
+    return (
+        filename.startswith(root)
+        and not filename.startswith(_DJANGO_DIR)
+        and 'site-packages' not in filename
+        and filename != _THIS_FILE
+    )
+
+
+def call_site(frame=None, skip=()):
+    """
+    Where the running query came from: `template.html:line` while a
+    template node is rendering (the innermost one, i.e. the variable or
+    tag that needed the data), else `path/to/module.py:line (function)` of
+    the innermost project frame, else '<unknown>'. Frames running a code
+    object in `skip` (other execute wrappers) are never the call site.
+    """
+    frame = frame or sys._getframe(1)
+    code_site = None
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == 'render_annotated':
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                return f"{origin.template_name or origin.name}:{token.lineno}"
+        elif code_site is None and code not in skip and _project_file(code.co_filename):
+            path = os.path.relpath(code.co_filename, settings.BASE_DIR)
+            code_site = f"{path}:{frame.f_lineno} ({code.co_name})"
+        frame = frame.f_back
+    return code_site or '<unknown>'
+
+
+@dataclass
+class QueryGroup:
+    shape: str
+    site: str
+    count: int
+    sql: str  # the first statement of the group, as run
+
+    def __str__(self):
+        return f"{self.count} x {self.site}: {self.shape}"
+
+
+class QueryPatternDetector:
+    """
+    Counts queries by (shape, call site) on every database connection
+    while in its `with` block. violations() lists the groups that ran more
+    than `threshold` times, most repeated first.
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = settings.NPLUSONE_THRESHOLD if threshold is None else threshold
+        self.groups = {}
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        shape = normalize(sql)
+        if not shape.upper().startswith(_IGNORED):
+            # e.g. bondvoyage.metrics' timer, which is project code but no call site
+            wrappers = {getattr(wrapper, '__code__', None) for wrapper in context['connection'].execute_wrappers}
+            key = (shape, call_site(sys._getframe(1), skip=wrappers))
+            group = self.groups.get(key)
+            if group is None:
+                self.groups[key] = QueryGroup(shape, key[1], 1, sql)
+            else:
+                group.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        self._stack = None
+
+    def violations(self):
+        found = [group for group in self.groups.values() if group.count > self.threshold]
+        return sorted(found, key=lambda group: (-group.count, group.site))
+
+    def report(self, label=''):
+        violations = self.violations()
+        heading = f"{len(violations)} repeated query patterns" + (f" in {label}" if label else '')
+        return '\n'.join([f"{heading} (threshold {self.threshold}):"] + [f"  {group}" for group in violations])
+
+    def check(self, mode='raise', label=''):
+        """Logs a warning ('log') or raises NPlusOneError ('raise') if any group is over the threshold."""
+        if mode == 'off' or not self.violations():
+            return
+        if mode == 'raise':
+            raise NPlusOneError(self.report(label))
+        logger.warning(self.report(label))
+
+
+def detection_mode():
+    mode = settings.NPLUSONE_MODE or ('log' if settings.DEBUG else 'off')
+    if mode not in MODES:
+        raise ValueError(f"NPLUSONE_MODE must be one of {', '.join(MODES)}, not {mode!r}")
+    return mode
+
+
+@contextmanager
+def assert_no_n_plus_one(threshold=None):
+    """Fails (NPlusOneError) if the block repeats a query pattern over the threshold."""
+    with QueryPatternDetector(threshold) as detector:
+        yield detector
+    detector.check('raise')
+
+
+class NPlusOneMiddleware:
+    """Runs a QueryPatternDetector around each request unless detection is off."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = detection_mode()
+        if mode == 'off':
+            return self.get_response(request)
+        with QueryPatternDetector() as detector:
+            response = self.get_response(request)
+        detector.check(mode, label=f"{request.method} {request.path}")
+        return response
@@ -0,0 +1,236 @@
+"""
+Keyset (cursor) pagination shared by the catalog, dashboards and admin lists.
+
+Instead of OFFSET, each page remembers the sort key of its last (or first)
+row in an opaque `cursor` query parameter and the next page asks for rows
+strictly after it. Every page costs one index range scan, however deep.
+
+Usage in a view:
+
+    bookings = Booking.objects.filter(...).order_by('-booking_date')
+    page = paginate_keyset(request, bookings, per_page=25)
+    return render(request, 'x.html', {'bookings': page, 'page': page})
+
+The queryset's own order_by() is used, with the primary key appended as a
+tie-breaker. Orderings across relations (`tour__name`) are annotated onto
+the rows, so building the cursor never loads the related object. Random
+(`?`) and expression orderings cannot be encoded in a cursor and raise
+ValueError as soon as paginate_keyset() is called, whatever the cursor.
+
+Sort keys must be non-null: `k > v` is never true for a NULL k or v, so
+rows with a NULL key would be skipped or repeated between pages (and the
+backends disagree on where NULLs sort). Ordering by a nullable field
+raises ValueError like the orderings above; for a key reached through a
+nullable relation or an annotation, filter out the rows where it is NULL
+(as the dashboard's upcoming trips do) before paginating.
+Other GET parameters (q, status, start_date, ...) are kept in the
+previous/next links.
+"""
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.expressions import OrderBy
+
+DEFAULT_PAGE_SIZE = 25
+CURSOR_PARAM = 'cursor'
+
+
+def _dump(value):
+    # Full precision: DjangoJSONEncoder drops microseconds, which would
+    # make rows sharing a millisecond fall between pages.
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps({'d': direction, 'v': [_dump(value) for value in values]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns (direction, raw values) or None for a missing/garbled cursor."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction, values = payload['d'], payload['v']
+    except (ValueError, KeyError, TypeError, binascii.Error):
+        return None
+    if direction not in ('next', 'prev') or not isinstance(values, list):
+        return None
+    return direction, values
+
+
+class KeysetPage:
+    """One page of results; iterates like the object list it wraps."""
+
+    def __init__(self, object_list, keys, request, has_next, has_previous, cursor_param=CURSOR_PARAM):
+        self.object_list = object_list
+        self.keys = keys
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self._request = request
+        self._cursor_param = cursor_param
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def _row_values(self, obj):
+        return [getattr(obj, name) for name, _, _ in self.keys]
+
+    def _query_with(self, cursor):
+        params = self._request.GET.copy()
+        params[self._cursor_param] = cursor
+        return params.urlencode()
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    @property
+    def next_query(self):
+        """Query string (filters included) for the following page."""
+        if not self.has_next:
+            return ''
+        return self._query_with(encode_cursor('next', self._row_values(self.object_list[-1])))
+
+    @property
+    def previous_query(self):
+        if not self.has_previous:
+            return ''
+        return self._query_with(encode_cursor('prev', self._row_values(self.object_list[0])))
+
+
+def _key_field(queryset, path):
+    """
+    The model field `path` (`name`, `fk_id` or `relation__...__name`)
+    orders by, or None for an annotation.
+    """
+    if path in queryset.query.annotations:
+        return None
+    model = queryset.model
+    parts = path.split(LOOKUP_SEP)
+    for index, part in enumerate(parts):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            raise ValueError(f"Keyset pagination cannot order by {path!r}: {part!r} is not a field") from None
+        if not field.is_relation or part == field.attname:
+            if index != len(parts) - 1:
+                raise ValueError(f"Keyset pagination cannot order by {path!r}: transforms are not supported")
+            if field.null:
+                raise ValueError(f"Keyset pagination cannot order by the nullable {path!r} (see the module docstring)")
+            return field
+        if index == len(parts) - 1:
+            # order_by('tour') sorts by Tour's Meta.ordering, which a cursor cannot follow
+            raise ValueError(f"Keyset pagination cannot order by the relation {path!r}; use {path}_id or one of its fields")
+        model = field.related_model
+
+
+def _ordering_keys(queryset):
+    """[(path, descending, field)] from the queryset ordering, pk last."""
+    opts = queryset.model._meta
+    ordering = list(queryset.query.order_by or opts.ordering or [])
+
+    keys = []
+    for term in ordering:
+        if isinstance(term, OrderBy) and isinstance(term.expression, F):
+            name, descending = term.expression.name, term.descending
+        elif isinstance(term, str) and not term.startswith('?'):
+            name, descending = term.lstrip('-'), term.startswith('-')
+        else:
+            raise ValueError(f"Keyset pagination needs field, related field or annotation ordering, got {term!r}")
+        if name == 'pk':
+            name = opts.pk.attname
+        keys.append((name, descending, _key_field(queryset, name)))
+
+    if not any(name == opts.pk.attname for name, _, _ in keys):
+        keys.append((opts.pk.attname, keys[-1][1] if keys else False, opts.pk))
+    return keys
+
+
+def _annotate_related(queryset, keys):
+    """Annotates related-field keys onto the rows; returns (queryset, keys by annotation)."""
+    aliases = {}
+    annotated = []
+    for index, (name, descending, field) in enumerate(keys):
+        if LOOKUP_SEP in name:
+            aliases[f'keyset_{index}'] = F(name)
+            name = f'keyset_{index}'
+        annotated.append((name, descending, field))
+    return (queryset.annotate(**aliases) if aliases else queryset), annotated
+
+
+def _parse_values(keys, raw_values):
+    if len(raw_values) != len(keys):
+        return None
+
+    values = []
+    for (_, _, field), raw in zip(keys, raw_values):
+        if field is None:
+            values.append(raw)  # annotation, e.g. search_rank
+            continue
+        try:
+            values.append(field.to_python(raw))
+        except ValidationError:
+            return None
+    return values
+
+
+def _after(keys, values, reverse=False):
+    """
+    Rows strictly after `values` in key order (before it when reverse=True):
+    (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ..., with per-key direction.
+    """
+    condition = Q()
+    equal = Q()
+    for (name, descending, _), value in zip(keys, values):
+        forward = descending == reverse  # ascending forward / descending reverse -> '>'
+        lookup = 'gt' if forward else 'lt'
+        condition |= equal & Q(**{f'{name}__{lookup}': value})
+        equal &= Q(**{name: value})
+
+    # Redundant bound on the leading key so the planner can range-scan its index
+    name, descending, _ = keys[0]
+    bound = 'gte' if descending == reverse else 'lte'
+    return Q(**{f'{name}__{bound}': values[0]}) & condition
+
+
+def paginate_keyset(request, queryset, per_page=DEFAULT_PAGE_SIZE, cursor_param=CURSOR_PARAM):
+    queryset, keys = _annotate_related(queryset, _ordering_keys(queryset))
+    ordering = [f"-{name}" if descending else name for name, descending, _ in keys]
+
+    decoded = decode_cursor(request.GET.get(cursor_param))
+    values = _parse_values(keys, decoded[1]) if decoded else None
+
+    if values is None:
+        rows = list(queryset.order_by(*ordering)[:per_page + 1])
+        return KeysetPage(rows[:per_page], keys, request, len(rows) > per_page, False, cursor_param)
+
+    if decoded[0] == 'next':
+        rows = list(queryset.filter(_after(keys, values)).order_by(*ordering)[:per_page + 1])
+        return KeysetPage(rows[:per_page], keys, request, len(rows) > per_page, True, cursor_param)
+
+    # Walking backwards: fetch in reverse order, then flip back
+    reversed_ordering = [term[1:] if term.startswith('-') else f"-{term}" for term in ordering]
+    rows = list(queryset.filter(_after(keys, values, reverse=True)).order_by(*reversed_ordering)[:per_page + 1])
+    has_previous = len(rows) > per_page
+    rows = rows[:per_page]
+    rows.reverse()
+    return KeysetPage(rows, keys, request, True, has_previous, cursor_param)
@@ -36,6 +36,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'bondvoyage.metrics.MetricsMiddleware',  # outermost: times everything below
+    'bondvoyage.nplusone.NPlusOneMiddleware',  # repeated-query check (NPLUSONE_MODE)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -49,7 +51,8 @@ ROOT_URLCONF = 'bondvoyage.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'bondvoyage.metrics.InstrumentedDjangoTemplates',  # DjangoTemplates + render timing
+        'NAME': 'django',
         'DIRS': [BASE_DIR / 'templates'],  # Global templates folder
         'APP_DIRS': True,
         'OPTIONS': {
@@ -78,8 +81,59 @@ DATABASES = {
 }
 
 
+# --- Caching ---
+# 'locmem' keeps the cache inside each worker process; 'file' shares it
+# between the workers on one host, so invalidations reach all of them.
+CACHE_BACKEND = os.environ.get('BONDVOYAGE_CACHE_BACKEND', 'locmem')
+
+if CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': BASE_DIR / 'cache',
+            'OPTIONS': {'MAX_ENTRIES': 20000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'bondvoyage',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+CATALOG_CACHE_TIMEOUT = 60 * 15     # Seconds a rendered catalog/detail fragment may live
+TOUR_SEATS_MAX_STALENESS = 30       # Upper bound (seconds) on stale seat counts on tour pages
+SEAT_HOLD_TTL = 60 * 15             # Seconds seats stay reserved while a customer pays
+DASHBOARD_STATS_TTL = 30            # Seconds the staff dashboard figures may be served from cache
+EXPORT_CHUNK_SIZE = 2000            # Rows fetched per server-side cursor round trip in CSV/XLSX exports
+
+# Rendered ticket PDFs (bookings.tickets). Private: outside MEDIA_ROOT,
+# only ever served through the download_ticket permission check.
+TICKET_CACHE_DIR = Path(os.environ.get('BONDVOYAGE_TICKET_CACHE_DIR', BASE_DIR / 'ticket_cache'))
+TICKET_RENDERER = os.environ.get('BONDVOYAGE_TICKET_RENDERER', 'xhtml2pdf')  # or 'reportlab' (bookings.ticket_canvas)
+TICKET_RENDER_WORKERS = int(os.environ.get('BONDVOYAGE_TICKET_RENDER_WORKERS', 2))  # Rendering processes; 0 renders inline after commit (the test runner's choice)
+
+# Per-view request metrics at /metrics (bondvoyage.metrics). Each worker
+# process counts on its own; with several workers, point METRICS_DIR at a
+# directory they share so /metrics reports the sum of all of them.
+METRICS_DIR = os.environ.get('BONDVOYAGE_METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = 5          # Seconds between a worker's writes to METRICS_DIR
+METRICS_DEAD_PROCESS_RETENTION = 120  # Seconds an exited worker's last counts stay in /metrics
+METRICS_TOKEN = os.environ.get('BONDVOYAGE_METRICS_TOKEN') or None  # Bearer token for a Prometheus scraper
+
+# N+1 query detection per request (bondvoyage.nplusone): 'off', 'log' or
+# 'raise'. Unset, it logs while DEBUG is on and is off otherwise.
+NPLUSONE_MODE = os.environ.get('BONDVOYAGE_NPLUSONE') or None
+NPLUSONE_THRESHOLD = 5              # Same-shape queries one call site may run per request
+
+
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# Renders tickets inline into a temporary directory during tests
+TEST_RUNNER = 'bondvoyage.test_runner.BondVoyageTestRunner'
+
 AUTH_PASSWORD_VALIDATORS = [
     { 'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator', },
     { 'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator', },
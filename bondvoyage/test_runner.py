@@ -0,0 +1,26 @@
+"""
+The project's test runner (settings.TEST_RUNNER).
+
+Ticket PDFs (bookings.tickets) are rendered inline, without the spawned
+process pool, into a temporary directory removed after the run, so tests
+neither start worker processes nor leave files in TICKET_CACHE_DIR.
+"""
+import shutil
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class BondVoyageTestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._ticket_dir = tempfile.mkdtemp(prefix='bondvoyage-tickets-')
+        self._ticket_settings = override_settings(TICKET_CACHE_DIR=self._ticket_dir, TICKET_RENDER_WORKERS=0)
+        self._ticket_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._ticket_settings.disable()
+        shutil.rmtree(self._ticket_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,399 @@
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import URLResolver, get_resolver, reverse
+
+from bookings.models import Booking
+from tours.models import Tour, TourDate
+from users.models import CustomUser
+from . import metrics
+from .nplusone import NPlusOneError, QueryPatternDetector, assert_no_n_plus_one, call_site, normalize
+from .pagination import decode_cursor, encode_cursor, paginate_keyset
+
+# The admin site's generated URLs are walked per registered model instead
+SKIPPED_NAMESPACES = {'admin'}
+
+
+def named_patterns(patterns=None, namespace=None):
+    """(view name, URL parameter names) for every named URL in bondvoyage.urls."""
+    for pattern in get_resolver().url_patterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace in SKIPPED_NAMESPACES:
+                continue
+            yield from named_patterns(pattern.url_patterns, pattern.namespace or namespace)
+        elif pattern.name:
+            name = f"{namespace}:{pattern.name}" if namespace else pattern.name
+            yield name, sorted(pattern.pattern.converters)
+
+
+class QueryPatternDetectorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        tour = Tour.objects.create(name='Spiti Valley Drive', location='Kaza', description='Passes', duration_days=6, price=900)
+        tour_date = TourDate.objects.create(tour=tour, start_date=date.today() + timedelta(days=20), capacity=100)
+        for n in range(settings.NPLUSONE_THRESHOLD + 2):
+            user = CustomUser.objects.create_user(username=f'rider{n}')
+            Booking.objects.create(user=user, tour=tour, tour_date=tour_date)
+
+    def test_normalize_ignores_values_not_structure(self):
+        self.assertEqual(
+            normalize('SELECT "a"."id" FROM "a" WHERE ("a"."id" = 3 AND "a"."name" = \'x\') LIMIT 21'),
+            normalize('SELECT "a"."id"  FROM "a" WHERE ("a"."id" = 41 AND "a"."name" = \'it\'\'s\') LIMIT 1'),
+        )
+        self.assertEqual(normalize('SELECT 1 FROM "T3" WHERE "id" IN (%s, %s, %s)'), 'SELECT ? FROM "T3" WHERE "id" IN (...)')
+        self.assertNotEqual(normalize('SELECT "a"."id" FROM "a"'), normalize('SELECT "a"."name" FROM "a"'))
+
+    def test_lazy_foreign_keys_are_flagged_per_call_site(self):
+        with QueryPatternDetector() as detector:
+            names = [booking.user.username for booking in Booking.objects.all()]
+        (violation,) = detector.violations()
+        self.assertEqual(violation.count, len(names))
+        self.assertIn('bondvoyage/tests.py', violation.site)
+        self.assertIn('users_customuser', violation.shape)
+
+        with assert_no_n_plus_one():
+            [booking.user.username for booking in Booking.objects.select_related('user')]
+
+    def test_template_lines_are_the_call_site(self):
+        from django.template import engines
+
+        template = engines['django'].from_string('{% for b in bookings %}\n{{ b.tour.name }}{% endfor %}')
+        with self.assertRaisesMessage(NPlusOneError, ':2: SELECT'):
+            with assert_no_n_plus_one():
+                template.render({'bookings': Booking.objects.all()})
+
+        self.assertIn('bondvoyage/tests.py', call_site())
+
+    def test_middleware_logs_or_raises(self):
+        staff = CustomUser.objects.create_user(username='desk', is_staff=True)
+        self.client.force_login(staff)
+
+        # A view that reads FKs lazily, run through the real middleware stack
+        def view(request):
+            from django.http import HttpResponse
+            return HttpResponse(', '.join(booking.tour.name for booking in Booking.objects.order_by('pk')))
+
+        from django.urls import path
+        urls = type('urls', (), {'urlpatterns': [path('lazy/', view)]})
+        with override_settings(ROOT_URLCONF=urls, NPLUSONE_MODE='log'):
+            with self.assertLogs('bondvoyage.nplusone', logging.WARNING) as logs:
+                self.assertEqual(self.client.get('/lazy/').status_code, 200)
+            self.assertIn('GET /lazy/', logs.output[0])
+        with override_settings(ROOT_URLCONF=urls, NPLUSONE_MODE='raise'):
+            with self.assertRaises(NPlusOneError):
+                self.client.get('/lazy/')
+        with override_settings(ROOT_URLCONF=urls, NPLUSONE_MODE='off'):
+            self.assertEqual(self.client.get('/lazy/').status_code, 200)
+
+
+class KeysetPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        start = date.today() + timedelta(days=10)
+        user = CustomUser.objects.create_user(username='pager')
+        # Repeated names and dates, so ties have to be broken by pk
+        for n in range(7):
+            tour = Tour.objects.create(name=f'Trail {n % 3}', location='Hills', description='Walk', duration_days=2, price=100)
+            tour_date = TourDate.objects.create(tour=tour, start_date=start + timedelta(days=n % 2), capacity=50)
+            for _ in range(2):
+                Booking.objects.create(user=user, tour=tour, tour_date=tour_date)
+
+    def page(self, queryset, cursor=None, per_page=4):
+        request = RequestFactory().get('/', {'status': 'Pending', **({'cursor': cursor} if cursor else {})})
+        return paginate_keyset(request, queryset, per_page=per_page)
+
+    def cursor_of(self, query):
+        params = dict(part.split('=', 1) for part in query.split('&'))
+        self.assertEqual(params['status'], 'Pending')  # filters survive paging
+        return params['cursor']
+
+    def walk(self, queryset):
+        """Every page forwards to the end, then backwards to the start."""
+        pages = [self.page(queryset)]
+        while pages[-1].has_next:
+            pages.append(self.page(queryset, self.cursor_of(pages[-1].next_query)))
+        backwards = [pages[-1]]
+        while backwards[-1].has_previous:
+            backwards.append(self.page(queryset, self.cursor_of(backwards[-1].previous_query)))
+        return [[row.pk for row in page] for page in pages], [[row.pk for row in page] for page in reversed(backwards)]
+
+    def test_cursor_round_trip_and_tampering(self):
+        cursor = encode_cursor('next', [date(2026, 1, 2), 7])
+        self.assertEqual(decode_cursor(cursor), ('next', ['2026-01-02', 7]))
+        for garbled in ('', 'not base64!', cursor[:-3], encode_cursor('sideways', [1]), 'eyJkIjoibmV4dCJ9'):
+            with self.subTest(cursor=garbled):
+                self.assertIsNone(decode_cursor(garbled))
+
+        queryset = Booking.objects.order_by('-booking_date')
+        first = [row.pk for row in self.page(queryset)]
+        # Wrong arity or unparseable values restart at the first page instead of failing
+        for tampered in (encode_cursor('next', [1]), encode_cursor('next', ['yesterday', 3])):
+            with self.subTest(cursor=tampered):
+                page = self.page(queryset, tampered)
+                self.assertEqual([row.pk for row in page], first)
+                self.assertFalse(page.has_previous)
+
+    def test_pages_cover_every_row_once_in_order(self):
+        # (ordering, the same with the pk tie-breaker the paginator appends)
+        orderings = [
+            (['-booking_date'], ['-booking_date', '-pk']),
+            (['tour_date__start_date', '-tour__name'], ['tour_date__start_date', '-tour__name', '-pk']),
+            ([F('tour__name').desc(), 'pk'], [F('tour__name').desc(), 'pk']),
+            (['trip_date'], ['trip_date', 'pk']),
+        ]
+        bookings = Booking.objects.annotate(trip_date=F('tour_date__start_date'))
+        for ordering, expected in orderings:
+            with self.subTest(ordering=ordering):
+                forwards, backwards = self.walk(bookings.order_by(*ordering))
+                self.assertEqual(sum(forwards, []), list(bookings.order_by(*expected).values_list('pk', flat=True)))
+                self.assertEqual(backwards, forwards)
+
+    def test_related_keys_are_read_without_loading_the_relation(self):
+        queryset = Booking.objects.order_by('tour__name')
+        page = self.page(queryset)
+        with self.assertNumQueries(0):
+            self.cursor_of(page.next_query)
+
+    def test_orderings_a_cursor_cannot_encode_fail_up_front(self):
+        for queryset in (
+            Booking.objects.order_by('?'),
+            Booking.objects.order_by('tour'),
+            Booking.objects.order_by('tour__name__lower'),
+            Booking.objects.order_by(Lower('transaction_id')),
+            Booking.objects.order_by('tour_date_id'),  # nullable
+            Booking.objects.order_by('-tour__image'),
+        ):
+            with self.subTest(ordering=queryset.query.order_by):
+                with self.assertRaises(ValueError):
+                    self.page(queryset)
+
+
+class UrlQueryPatternTests(TestCase):
+    """
+    Requests every URL in bondvoyage.urls as a visitor, a customer and
+    staff, over more rows than NPLUSONE_THRESHOLD, and fails on any query
+    repeated once per row.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        rows = settings.NPLUSONE_THRESHOLD + 3
+        today = date.today()
+        cls.staff = CustomUser.objects.create_user(username='walker-staff', is_staff=True, role=CustomUser.ADMIN)
+        cls.customer = CustomUser.objects.create_user(username='walker')
+        tours = [
+            Tour.objects.create(name=f'Walk {n}', location=f'Town {n}', description='Trail', duration_days=2, price=100 + n)
+            for n in range(rows)
+        ]
+        for n, tour in enumerate(tours):
+            upcoming = TourDate.objects.create(tour=tour, start_date=today + timedelta(days=10 + n), capacity=50)
+            TourDate.objects.create(tour=tour, start_date=today.replace(day=1) + timedelta(days=n % 28), capacity=50)
+            past = TourDate.objects.create(tour=tour, start_date=today - timedelta(days=30 + n), capacity=50)
+            other = CustomUser.objects.create_user(username=f'walker{n}', email=f'w{n}@example.com')
+            Booking.objects.create(user=other, tour=tour, tour_date=upcoming, transaction_id=f'UPI{n:04d}')
+            Booking.objects.create(
+                user=cls.customer, tour=tour, tour_date=upcoming if n % 2 else past,
+                status='Confirmed', payment_status='Paid', transaction_id=f'UPIW{n:04d}',
+            )
+        cls.tour = tours[0]
+        cls.tour_date = tours[0].dates.order_by('-start_date').first()
+        cls.booking = Booking.objects.filter(user=cls.customer).order_by('pk').first()
+
+    def url_kwargs(self):
+        today = date.today()
+        return {
+            'tour_id': self.tour.pk,
+            'booking_id': self.booking.pk,
+            'year': today.year,
+            'month': today.month,
+            'export_format': 'csv',
+            'action': 'mark_completed',
+        }
+
+    def hold_seat(self, client):
+        client.post(reverse('book_tour', args=[self.tour.pk]), {'tour_date': self.tour_date.pk, 'number_of_people': 1})
+
+    def test_walked_urls_cover_the_urlconf(self):
+        names = [name for name, _ in named_patterns()]
+        self.assertIn('admin_booking_list', names)
+        self.assertIn('metrics', names)
+        self.assertFalse([name for name in names if name.startswith('admin:')])
+
+    def test_no_url_repeats_a_query_per_row(self):
+        kwargs = self.url_kwargs()
+        for name, params in named_patterns():
+            missing = set(params) - set(kwargs)
+            self.assertFalse(missing, f"No fixture value for {name}'s URL parameters {missing}; add one to url_kwargs()")
+            url = reverse(name, kwargs={param: kwargs[param] for param in params})
+
+            for identity in (None, self.customer, self.staff):
+                with self.subTest(url=url, user=identity and identity.username):
+                    cache.clear()
+                    if identity is None:
+                        self.client.logout()
+                    else:
+                        self.client.force_login(identity)
+                    if name == 'payment_page' and identity is self.customer:
+                        self.hold_seat(self.client)
+
+                    with assert_no_n_plus_one():
+                        response = self.client.get(url)
+                        if response.streaming:
+                            b''.join(response.streaming_content)  # exports query while streaming
+                    response.close()
+                    self.assertLess(response.status_code, 500)
+
+    def test_no_admin_page_repeats_a_query_per_row(self):
+        superuser = CustomUser.objects.create_superuser(username='walker-root', password=None)
+        self.client.force_login(superuser)
+        for model in admin.site._registry:
+            opts = model._meta
+            obj = model.objects.order_by('pk').first()
+            urls = [reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist')]
+            if obj is not None:
+                urls.append(reverse(f'admin:{opts.app_label}_{opts.model_name}_change', args=[obj.pk]))
+            for url in urls:
+                with self.subTest(url=url):
+                    with assert_no_n_plus_one():
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+
+
+class RequestMetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user(username='ops', password='pass12345', is_staff=True)
+        cls.customer = CustomUser.objects.create_user(username='visitor', password='pass12345')
+
+    def setUp(self):
+        saved = metrics.store.views
+        metrics.store.views = {}
+        self.addCleanup(setattr, metrics.store, 'views', saved)
+
+    def scrape(self, **headers):
+        return self.client.get(reverse('metrics'), **headers)
+
+    def sample(self, text, name, **labels):
+        wanted = ','.join(f'{key}="{value}"' for key, value in labels.items())
+        for line in text.splitlines():
+            if line.startswith(f'{name}{{{wanted}}} '):
+                return float(line.rsplit(' ', 1)[1])
+        return None
+
+    def test_records_views_queries_and_templates(self):
+        self.client.force_login(self.staff)
+        for _ in range(3):
+            self.client.get(reverse('admin_dashboard'))
+        self.client.get('/no-such-page/')
+
+        text = self.scrape().content.decode()
+        self.assertEqual(self.sample(text, 'bondvoyage_http_requests_total', view='admin_dashboard', status='200'), 3)
+        self.assertEqual(self.sample(text, 'bondvoyage_http_request_duration_seconds_count', view='admin_dashboard'), 3)
+        self.assertEqual(self.sample(text, 'bondvoyage_http_request_duration_seconds_bucket', view='admin_dashboard', le='+Inf'), 3)
+        self.assertGreater(self.sample(text, 'bondvoyage_db_queries_total', view='admin_dashboard'), 0)
+        self.assertGreater(self.sample(text, 'bondvoyage_template_render_seconds_total', view='admin_dashboard'), 0)
+        self.assertGreater(self.sample(text, 'bondvoyage_http_response_bytes_total', view='admin_dashboard'), 0)
+        self.assertEqual(self.sample(text, 'bondvoyage_http_requests_total', view='unresolved', status='404'), 1)
+
+    def test_streaming_responses_are_recorded_once_sent(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('admin_booking_export', args=['csv']))
+        self.assertNotIn('admin_booking_export', metrics.store.snapshot())  # still streaming
+
+        body = b''.join(response.streaming_content)  # the test client closes the response at the end
+        text = self.scrape().content.decode()
+        self.assertEqual(self.sample(text, 'bondvoyage_http_requests_total', view='admin_booking_export', status='200'), 1)
+        self.assertEqual(self.sample(text, 'bondvoyage_http_response_bytes_total', view='admin_booking_export'), len(body))
+        self.assertGreater(self.sample(text, 'bondvoyage_db_queries_total', view='admin_booking_export'), 0)
+
+    def test_staff_or_token_only(self):
+        self.assertEqual(self.scrape().status_code, 403)
+        self.client.force_login(self.customer)
+        self.assertEqual(self.scrape().status_code, 403)
+
+        self.client.logout()
+        with self.settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            response = self.scrape(HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+    def write_worker_file(self, directory, name, pid, home_requests, host=None, age=0, **extra):
+        views = {'home': {**metrics._empty_view(), 'statuses': {'200': home_requests}}}
+        views['home']['buckets'][0] = home_requests
+        path = os.path.join(directory, f'metrics-{name}.json')
+        with open(path, 'w') as handle:
+            json.dump({'pid': pid, 'host': host or socket.gethostname(), 'views': views, **extra}, handle)
+        written = time.time() - age
+        os.utime(path, (written, written))
+        return path
+
+    def test_adds_up_worker_processes(self):
+        self.client.force_login(self.staff)
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            self.write_worker_file(directory, 'sibling', os.getppid(), 5)
+
+            self.client.get(reverse('home'))
+            text = self.scrape().content.decode()
+
+        self.assertEqual(self.sample(text, 'bondvoyage_http_requests_total', view='home', status='200'), 6)
+        self.assertEqual(self.sample(text, 'bondvoyage_http_request_duration_seconds_count', view='home'), 6)
+
+    def test_exited_workers_are_dropped_after_the_retention(self):
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+        self.client.force_login(self.staff)
+
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory, METRICS_DEAD_PROCESS_RETENTION=60):
+            live = self.write_worker_file(directory, 'live', os.getppid(), 1, age=3600)  # idle, not dead
+            just_exited = self.write_worker_file(directory, 'just-exited', exited.pid, 10, age=5)
+            long_gone = self.write_worker_file(directory, 'long-gone', exited.pid, 100, age=600)
+            elsewhere = self.write_worker_file(directory, 'elsewhere', exited.pid, 1000, host='other-host', age=600)
+            legacy = os.path.join(directory, 'metrics-4242.json')
+            with open(legacy, 'w') as handle:
+                json.dump({'home': metrics._empty_view()}, handle)  # the old, per-pid format
+
+            text = self.scrape().content.decode()
+            remaining = {path for path in (live, just_exited, long_gone, elsewhere, legacy) if os.path.exists(path)}
+
+        self.assertEqual(self.sample(text, 'bondvoyage_http_requests_total', view='home', status='200'), 1 + 10 + 1000)
+        self.assertEqual(remaining, {live, just_exited, elsewhere})
+
+    def test_files_are_per_process_and_written_at_exit(self):
+        store = metrics.MetricsStore()
+        store.record('home', '200', 0.01, metrics.RequestStats(), 10)
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory, METRICS_FLUSH_INTERVAL=3600):
+            store.maybe_flush()
+            self.assertEqual(os.listdir(directory), [])  # not due yet
+
+            store.flush_at_exit()
+            path = os.path.join(directory, f'metrics-{store.process_id}.json')
+            with open(path) as handle:
+                flushed = json.load(handle)
+
+            parent_id = store.process_id
+            store.forked()
+            self.assertNotEqual(store.process_id, parent_id)
+            self.assertEqual(store.views, {})
+
+        self.assertEqual(flushed['pid'], os.getpid())
+        self.assertEqual(flushed['views']['home']['statuses'], {'200': 1})
+
+    def test_overhead_stays_in_microseconds(self):
+        self.assertLess(metrics.measure_overhead(2000), 50e-6)
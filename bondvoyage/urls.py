@@ -11,9 +11,14 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
 
+    # Prometheus scrape endpoint (staff or METRICS_TOKEN)
+    path('metrics', metrics_view, name='metrics'),
+
     # Handles: Register, Login, Logout, Dashboard
     path('', include('users.urls')), 
 
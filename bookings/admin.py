@@ -1,10 +1,47 @@
+from django import forms
 from django.contrib import admin
-from .models import Booking
+from django.core.exceptions import ValidationError
+from tours.models import TourDate
+from .models import Booking, SeatHold
+from .seats import claim_delta
+from .holds import release_hold
+
+
+class BookingAdminForm(forms.ModelForm):
+    class Meta:
+        model = Booking
+        fields = '__all__'
+
+    def clean(self):
+        """
+        Friendly error for edits that need more seats than are left. The
+        save itself still claims them atomically (bookings.seats).
+        """
+        cleaned_data = super().clean()
+        tour_date = cleaned_data.get('tour_date')
+        edited = Booking(
+            tour_date=tour_date,
+            status=cleaned_data.get('status'),
+            number_of_people=cleaned_data.get('number_of_people') or 0,
+        )
+        stored = self.instance.seat_claim if self.instance.pk else (None, 0)
+
+        needed = claim_delta(stored, edited.seat_claim).get(tour_date.pk if tour_date else None, 0)
+        if needed > 0:
+            remaining = TourDate.objects.get(pk=tour_date.pk).remaining_seats
+            if needed > remaining:
+                raise ValidationError(f"Only {max(remaining, 0)} seats are left on {tour_date.start_date:%d %b %Y}.")
+        return cleaned_data
+
 
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
+    form = BookingAdminForm
+
     # columns to show
     list_display = ('id', 'user', 'tour', 'tour_date', 'total_price', 'status', 'payment_status', 'booking_date')
+    # tour_date is nullable, so the admin's automatic select_related() would skip it
+    list_select_related = ('user', 'tour', 'tour_date')
     
     # filters on the right sidebar
     list_filter = ('status', 'payment_status', 'booking_date', 'tour')
@@ -25,4 +62,22 @@ class BookingAdmin(admin.ModelAdmin):
         ('Workflow', {
             'fields': ('status', 'booking_date')
         }),
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(SeatHold)
+class SeatHoldAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'tour_date', 'seats', 'created_at', 'expires_at')
+    list_select_related = ('user', 'tour_date__tour')
+    readonly_fields = ('user', 'tour_date', 'seats', 'created_at', 'expires_at')
+
+    def has_add_permission(self, request):
+        return False  # holds are only placed through the booking form
+
+    # Deleting a hold here must give its seats back, like the sweeper does
+    def delete_model(self, request, obj):
+        release_hold(obj.pk)
+
+    def delete_queryset(self, request, queryset):
+        for hold_id in queryset.values_list('pk', flat=True):
+            release_hold(hold_id)
@@ -0,0 +1,329 @@
+"""
+Latency benchmarks for the hot pages, used by `manage.py benchmark_views`.
+
+Each scenario drives one view through the Django test client (the full
+middleware, session, template and ORM stack, without a network or web
+server) as an anonymous visitor, a customer or staff. A run reports, per
+scenario:
+
+    p50_ms / p95_ms / p99_ms / mean_ms   wall time per request
+    queries_mean / queries_max           SQL queries per request
+    peak_kib                             peak Python heap of one request
+
+Results are plain JSON, so a run saved on one commit is the baseline for
+the next: compare() lists every metric that grew past its threshold.
+Numbers are only comparable on the same machine, database backend and
+dataset (see `populate_db --seed`), which is recorded in the "meta" block.
+"""
+import platform
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Callable, Optional
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from tours.models import Tour, TourDate
+from .models import Booking
+from .tickets import TICKET_STATUSES
+
+# Dataset presets for `benchmark_views --populate` (passed to populate_db)
+SCALES = {
+    'small': {'users': 1000, 'tours': 50, 'dates_per_tour': 10, 'bookings': 10000},
+    'medium': {'users': 20000, 'tours': 300, 'dates_per_tour': 20, 'bookings': 200000},
+    'large': {'users': 200000, 'tours': 2000, 'dates_per_tour': 24, 'bookings': 1000000},
+    # The catalog_facets target: 10k tours, 500k departures
+    'catalog': {'users': 1000, 'tours': 10000, 'dates_per_tour': 50, 'bookings': 20000},
+}
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'mean_ms', 'queries_mean', 'queries_max', 'peak_kib')
+
+# metric -> allowed growth over the baseline, in percent
+DEFAULT_THRESHOLDS = {'p95_ms': 25.0, 'queries_max': 0.0, 'peak_kib': 50.0}
+
+# Latency changes smaller than this are noise, whatever the percentage
+MIN_LATENCY_DELTA_MS = 1.0
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+@dataclass
+class Fixtures:
+    """The rows the scenarios point at, plus scratch accounts to log in with."""
+    tag: str
+    customer: object
+    staff: object
+    tour_id: int  # the busiest tour
+    booking_tour_id: int  # the tour of tour_date, or the busiest tour
+    tour_date_id: Optional[int]
+    location: str
+    search_term: str
+    ticket_booking_id: Optional[int]
+
+
+@dataclass
+class Scenario:
+    name: str
+    login: Optional[str]  # None, 'customer' or 'staff'
+    request: Callable  # (client, fixtures, iteration) -> response, timed
+    setup: Optional[Callable] = None  # same signature, run untimed before each request
+    needs: tuple = ()  # Fixtures attributes that must be set for the scenario to run
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    latencies: list = field(default_factory=list)
+    queries: list = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    peak_bytes: int = 0
+
+    def summary(self):
+        ordered = sorted(self.latencies)
+        count = len(ordered) or 1
+        return {
+            'requests': len(ordered),
+            'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+            'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+            'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+            'mean_ms': round(sum(ordered) / count * 1000, 3),
+            'queries_mean': round(sum(self.queries) / count, 2),
+            'queries_max': max(self.queries, default=0),
+            'peak_kib': round(self.peak_bytes / 1024, 1),
+            'statuses': {str(status): total for status, total in sorted(self.statuses.items())},
+        }
+
+
+def _pick(variants, iteration):
+    return variants[iteration % len(variants)]
+
+
+def _home(client, fixtures, iteration):
+    return client.get(reverse('home'), _pick([{}, {'q': fixtures.search_term}, {'location': fixtures.location}], iteration))
+
+
+def _uncached_grid(client, fixtures, iteration):
+    cache.clear()  # the grid fragment would otherwise hide the facet query
+
+
+def _catalog_facets(client, fixtures, iteration):
+    today = timezone.localdate()
+    window = {'available_from': (today + timedelta(days=7)).isoformat(), 'available_to': (today + timedelta(days=60)).isoformat()}
+    return client.get(reverse('home'), _pick([
+        {'location': fixtures.location},
+        {'price': ['0-5000', '10000-25000'], 'duration': '4-7'},
+        window,
+        {'location': fixtures.location, 'price': '5000-10000', **window},
+    ], iteration))
+
+
+def _tour_detail(client, fixtures, iteration):
+    return client.get(reverse('tour_detail', args=[fixtures.tour_id]))
+
+
+def _book_tour(client, fixtures, iteration):
+    return client.get(reverse('book_tour', args=[fixtures.booking_tour_id]))
+
+
+def _hold_seat(client, fixtures, iteration):
+    client.post(reverse('book_tour', args=[fixtures.booking_tour_id]), {'tour_date': fixtures.tour_date_id, 'number_of_people': 1})
+
+
+def _payment(client, fixtures, iteration):
+    return client.post(reverse('payment_page'), {'transaction_id': f"BENCH{fixtures.tag}{iteration}"})
+
+
+def _download_ticket(client, fixtures, iteration):
+    response = client.get(reverse('download_ticket', args=[fixtures.ticket_booking_id]))
+    if response.streaming:
+        b''.join(response.streaming_content)  # count sending the file too
+    response.close()
+    return response
+
+
+def _admin_booking_list(client, fixtures, iteration):
+    return client.get(reverse('admin_booking_list'), _pick([{}, {'status': 'Pending'}, {'q': fixtures.search_term}], iteration))
+
+
+def _admin_payment_report(client, fixtures, iteration):
+    month_ago = (timezone.localdate() - timedelta(days=30)).isoformat()
+    return client.get(reverse('admin_payment_report'), _pick([{}, {'start_date': month_ago}], iteration))
+
+
+def _admin_dashboard(client, fixtures, iteration):
+    return client.get(reverse('admin_dashboard'))
+
+
+SCENARIOS = {
+    scenario.name: scenario for scenario in [
+        Scenario('home', None, _home),
+        Scenario('catalog_facets', None, _catalog_facets, setup=_uncached_grid),
+        Scenario('tour_detail', None, _tour_detail),
+        Scenario('book_tour', 'customer', _book_tour),
+        Scenario('payment_page', 'customer', _payment, setup=_hold_seat, needs=('tour_date_id',)),
+        Scenario('download_ticket', 'staff', _download_ticket, needs=('ticket_booking_id',)),
+        Scenario('admin_booking_list', 'staff', _admin_booking_list),
+        Scenario('admin_payment_report', 'staff', _admin_payment_report),
+        Scenario('admin_dashboard', 'staff', _admin_dashboard),
+    ]
+}
+
+
+def prepare_fixtures():
+    """
+    Picks the busiest active tour, the emptiest upcoming departure and a
+    ticketed booking, and creates a scratch customer and staff account.
+    Returns None when there is no active tour to benchmark against.
+    """
+    tour = (
+        Tour.objects.filter(is_active=True)
+        .annotate(booking_total=Count('bookings'))
+        .order_by('-booking_total', 'pk')
+        .first()
+    )
+    if tour is None:
+        return None
+
+    # The departure with the most free seats, so booking never sells it out mid-run
+    tour_date = (
+        TourDate.objects.filter(tour__is_active=True).upcoming().with_availability()
+        .filter(annotated_remaining_seats__gt=0)
+        .order_by('-annotated_remaining_seats', 'start_date', 'pk').first()
+    )
+    ticket_booking = Booking.objects.filter(status__in=TICKET_STATUSES).order_by('-pk').values_list('pk', flat=True).first()
+
+    tag = uuid.uuid4().hex[:8]
+    User = get_user_model()
+    return Fixtures(
+        tag=tag,
+        customer=User.objects.create_user(username=f'bench-{tag}', password=None),
+        staff=User.objects.create_user(username=f'bench-{tag}-staff', password=None, is_staff=True, role=User.ADMIN),
+        tour_id=tour.pk,
+        booking_tour_id=tour_date.tour_id if tour_date else tour.pk,
+        tour_date_id=tour_date.pk if tour_date else None,
+        location=tour.location,
+        search_term=tour.name.split()[0].lower(),
+        ticket_booking_id=ticket_booking,
+    )
+
+
+def cleanup(fixtures):
+    """Deletes the scratch accounts; the customer's bookings and holds go with them."""
+    get_user_model().objects.filter(pk__in=[fixtures.customer.pk, fixtures.staff.pk]).delete()
+
+
+def skipped_reason(scenario, fixtures):
+    missing = [name for name in scenario.needs if getattr(fixtures, name) is None]
+    return f"no {', '.join(missing)} in the dataset" if missing else None
+
+
+def run_scenario(scenario, fixtures, iterations, warmup=5, cold_cache=False):
+    """Times `iterations` requests after `warmup` untimed ones; returns a ScenarioResult."""
+    client = Client()
+    if scenario.login:
+        client.force_login(getattr(fixtures, scenario.login))
+
+    def one(iteration):
+        if cold_cache:
+            cache.clear()
+        if scenario.setup:
+            scenario.setup(client, fixtures, iteration)
+
+    for iteration in range(warmup):
+        one(iteration)
+        scenario.request(client, fixtures, iteration)
+
+    result = ScenarioResult(scenario.name)
+    for iteration in range(warmup, warmup + iterations):
+        one(iteration)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = scenario.request(client, fixtures, iteration)
+            elapsed = time.perf_counter() - started
+        result.latencies.append(elapsed)
+        result.queries.append(len(queries.captured_queries))
+        result.statuses[response.status_code] += 1
+
+    # Peak heap from one extra request, traced on its own so tracing
+    # overhead does not distort the timings above
+    one(warmup + iterations)
+    tracemalloc.start()
+    try:
+        scenario.request(client, fixtures, warmup + iterations)
+        _, result.peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+def dataset_meta():
+    User = get_user_model()
+    return {
+        'users': User.objects.count(),
+        'tours': Tour.objects.count(),
+        'tour_dates': TourDate.objects.count(),
+        'bookings': Booking.objects.count(),
+    }
+
+
+def run_meta(iterations, warmup, cold_cache):
+    return {
+        'started_at': timezone.now().isoformat(),
+        'database': connection.vendor,
+        'django': django.get_version(),
+        'python': platform.python_version(),
+        'machine': platform.node(),
+        'iterations': iterations,
+        'warmup': warmup,
+        'cold_cache': cold_cache,
+        'dataset': dataset_meta(),
+    }
+
+
+def compare(results, baseline, thresholds):
+    """
+    Returns (regressions, warnings) between two result documents. A
+    metric regresses when it exceeds the baseline by more than its
+    threshold percentage (latencies also by MIN_LATENCY_DELTA_MS).
+    """
+    warnings = []
+    for key in ('database', 'dataset', 'cold_cache'):
+        if results['meta'].get(key) != baseline.get('meta', {}).get(key):
+            warnings.append(
+                f"{key} differs from the baseline ({baseline.get('meta', {}).get(key)!r} -> {results['meta'].get(key)!r}); "
+                "numbers may not be comparable"
+            )
+
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            warnings.append(f"{name}: not in the baseline")
+            continue
+        for metric, allowed in thresholds.items():
+            if metric not in previous or metric not in current:
+                continue
+            before, after = previous[metric], current[metric]
+            if after <= before * (1 + allowed / 100):
+                continue
+            if metric.endswith('_ms') and after - before < MIN_LATENCY_DELTA_MS:
+                continue
+            growth = f"+{(after - before) / before * 100:.1f}%" if before else "new"
+            regressions.append(f"{name} {metric}: {before} -> {after} ({growth}, allowed +{allowed:g}%)")
+    return regressions, warnings
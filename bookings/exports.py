@@ -0,0 +1,161 @@
+"""
+CSV and XLSX downloads of the staff booking list and payment report.
+
+Both read the filtered queryset as plain tuples (values_list) through
+`iterator(chunk_size=EXPORT_CHUNK_SIZE)`, which on PostgreSQL is a
+server-side cursor: memory stays bounded however many rows match.
+
+CSV is a StreamingHttpResponse, so bytes reach the client from the first
+chunk on. XLSX is written with xlsxwriter's constant_memory mode (each row
+is flushed to a temp file as soon as it is written) into an anonymous
+temporary file, which is then streamed with FileResponse. An .xlsx is a
+ZIP whose directory comes last, so nothing is sent until the whole
+workbook is written: memory stays flat, but a very large XLSX export can
+still run into the request timeout where the CSV one would not.
+"""
+import csv
+import datetime
+import io
+import tempfile
+
+import xlsxwriter
+from django.conf import settings
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.utils import timezone
+
+# (header, values_list() field)
+BOOKING_COLUMNS = [
+    ('Booking ID', 'pk'),
+    ('Username', 'user__username'),
+    ('Email', 'user__email'),
+    ('Tour', 'tour__name'),
+    ('Departure', 'tour_date__start_date'),
+    ('People', 'number_of_people'),
+    ('Amount', 'total_price'),
+    ('Status', 'status'),
+    ('Payment Status', 'payment_status'),
+    ('Transaction ID', 'transaction_id'),
+    ('Booked At', 'booking_date'),
+]
+
+PAYMENT_COLUMNS = [
+    ('Transaction ID', 'transaction_id'),
+    ('Booking ID', 'pk'),
+    ('Username', 'user__username'),
+    ('Package Name', 'tour__name'),
+    ('Amount', 'total_price'),
+    ('Payment Status', 'payment_status'),
+    ('Booked At', 'booking_date'),
+]
+
+CSV_FLUSH_ROWS = 500            # rows per chunk handed to the WSGI server
+XLSX_MAX_ROWS = 1_048_576       # Excel's per-sheet limit, header included
+
+
+def _plain(value):
+    # Excel has no time zones: show local wall-clock time
+    if isinstance(value, datetime.datetime) and timezone.is_aware(value):
+        return timezone.localtime(value).replace(tzinfo=None)
+    return value
+
+
+def export_rows(queryset, columns):
+    rows = queryset.values_list(*[field for _, field in columns])
+    for row in rows.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield [_plain(value) for value in row]
+
+
+def _csv_safe(value):
+    """Text cells that a spreadsheet would run as a formula get a leading quote."""
+    if value is None:
+        return ''
+    if isinstance(value, datetime.datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, str) and value[:1] in ('=', '+', '-', '@', '\t', '\r'):
+        return "'" + value
+    return value
+
+
+def _csv_chunks(queryset, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    buffer.write('\ufeff')  # BOM: Excel then opens the file as UTF-8 (₹, names)
+    writer.writerow([header for header, _ in columns])
+
+    for count, row in enumerate(export_rows(queryset, columns), start=1):
+        writer.writerow([_csv_safe(value) for value in row])
+        if count % CSV_FLUSH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def csv_response(queryset, columns, filename):
+    response = StreamingHttpResponse(_csv_chunks(queryset, columns), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    return response
+
+
+def write_xlsx(output, queryset, columns):
+    """Writes the rows to `output` (a path or binary file) in constant memory."""
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'strings_to_formulas': False,   # user-entered text stays text
+        'strings_to_urls': False,
+        'default_date_format': 'yyyy-mm-dd hh:mm',
+    })
+    header_format = workbook.add_format({'bold': True})
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+    headers = [header for header, _ in columns]
+
+    def new_sheet():
+        sheet = workbook.add_worksheet(f"Sheet{len(workbook.worksheets()) + 1}")
+        sheet.write_row(0, 0, headers, header_format)
+        sheet.freeze_panes(1, 0)
+        sheet.set_column(0, len(headers) - 1, 18)
+        return sheet
+
+    sheet, row_number = new_sheet(), 1
+    for row in export_rows(queryset, columns):
+        if row_number == XLSX_MAX_ROWS:
+            sheet, row_number = new_sheet(), 1  # constant_memory sheets are append-only
+        for column, value in enumerate(row):
+            if value is None:
+                continue
+            if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+                sheet.write_datetime(row_number, column, value, date_format)
+            else:
+                sheet.write(row_number, column, value)
+        row_number += 1
+
+    workbook.close()
+
+
+def xlsx_response(queryset, columns, filename):
+    """
+    The workbook, written in full to a temporary file and then sent; the
+    first byte goes out only after the last row is written (see above).
+    """
+    output = tempfile.TemporaryFile()  # removed when FileResponse closes it
+    try:
+        write_xlsx(output, queryset, columns)
+    except BaseException:
+        output.close()
+        raise
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=f"{filename}.xlsx",
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def export_response(queryset, columns, filename, export_format):
+    if export_format == 'csv':
+        return csv_response(queryset, columns, filename)
+    if export_format == 'xlsx':
+        return xlsx_response(queryset, columns, filename)
+    raise Http404("Unknown export format")
@@ -1,7 +1,6 @@
 from django import forms
 from django.core.exceptions import ValidationError 
-from django.db.models import Sum
-from datetime import date 
+from django.core.validators import FileExtensionValidator
 from .models import Booking
 from tours.models import TourDate
 
@@ -28,9 +27,8 @@ class BookingForm(forms.ModelForm):
         
         if self.tour:
             self.fields['tour_date'].queryset = TourDate.objects.filter(
-                tour=self.tour,
-                start_date__gte=date.today()
-            ).order_by('start_date')
+                tour=self.tour
+            ).upcoming().with_availability()
 
     def clean(self):
         cleaned_data = super().clean()
@@ -38,19 +36,20 @@ class BookingForm(forms.ModelForm):
         number_of_people = cleaned_data.get('number_of_people')
 
         if tour_date and number_of_people:
-            booked_seats = Booking.objects.filter(
-                tour_date=tour_date, 
-                status__in=['Pending', 'Confirmed']
-            ).aggregate(Sum('number_of_people'))['number_of_people__sum'] or 0
+            available_seats = tour_date.remaining_seats
 
-            total_needed = booked_seats + number_of_people
-            
-            if total_needed > tour_date.capacity:
-                available_seats = tour_date.capacity - booked_seats
-                
+            if number_of_people > available_seats:
                 if available_seats <= 0:
                     raise ValidationError("Sorry, this date is fully booked.")
                 else:
                     raise ValidationError(f"Sorry, only {available_seats} seats are left for this date.")
         
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+class StatementUploadForm(forms.Form):
+    statement = forms.FileField(
+        label="Bank / UPI statement",
+        help_text="CSV or XLSX export with a transaction reference (UTR / UPI ref) column and an amount column.",
+        validators=[FileExtensionValidator(['csv', 'xlsx'])],
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,.xlsx'}),
+    )
@@ -0,0 +1,98 @@
+"""
+Seat holds: seats reserved between the booking form and UPI payment.
+
+    book_tour      -> place_hold()       seats_held += n  (conditional UPDATE)
+    payment_page   -> book_from_hold()   seats_held -= n, seats_booked += n
+    sweeper        -> expire_holds()     seats_held -= n  for expired holds
+
+Availability stays a read of the TourDate row: remaining seats are
+capacity - seats_booked - seats_held. A hold that expired but was not yet
+swept still counts until `manage.py expire_seat_holds` (or the next hold
+on the same date) releases it, so availability errs on the safe side.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Booking, SeatHold
+from .seats import claim_seats, release_held_seats
+
+
+def _release(holds):
+    """Deletes these (pk, tour_date_id, seats) rows and frees their seats."""
+    if not holds:
+        return 0
+
+    deltas = defaultdict(int)
+    for _, tour_date_id, seats in holds:
+        deltas[tour_date_id] += seats
+
+    SeatHold.objects.filter(pk__in=[pk for pk, _, _ in holds]).delete()
+    release_held_seats(deltas)
+    return len(holds)
+
+
+def _locked(holds):
+    # Row locks make the sweeper and a paying customer agree on who
+    # releases a hold; skip_locked lets several sweepers share the work.
+    return holds.select_for_update(skip_locked=True).values_list('pk', 'tour_date_id', 'seats')
+
+
+def place_hold(user, tour_date, seats):
+    """
+    Reserves `seats` on `tour_date` for SEAT_HOLD_TTL seconds, first
+    releasing holds on that date which already expired.
+    Raises SeatsUnavailable when the seats are not there.
+    """
+    with transaction.atomic():
+        _release(list(_locked(SeatHold.objects.filter(tour_date=tour_date).expired())))
+
+        claim_seats(tour_date.pk, seats, counter='seats_held')
+        return SeatHold.objects.create(
+            user=user,
+            tour_date=tour_date,
+            seats=seats,
+            expires_at=timezone.now() + timedelta(seconds=settings.SEAT_HOLD_TTL),
+        )
+
+
+def release_hold(hold_id, user=None):
+    """Gives a hold's seats back early (customer abandoned or changed the booking)."""
+    holds = SeatHold.objects.filter(pk=hold_id)
+    if user is not None:
+        holds = holds.filter(user=user)
+    with transaction.atomic():
+        return _release(list(_locked(holds)))
+
+
+def book_from_hold(hold_id, **booking_fields):
+    """
+    Creates the Booking for a hold. The customer's hold is released first,
+    expired or not (an expired one may not have been swept yet and would
+    still count in seats_held), so its seats move straight to
+    seats_booked. The Booking insert's claim_seats() then decides: it only
+    raises SeatsUnavailable when someone else took the seats meanwhile.
+    """
+    with transaction.atomic():
+        # Waits (no skip_locked) if a sweeper is releasing this very hold
+        hold = list(
+            SeatHold.objects.filter(pk=hold_id, user=booking_fields['user'])
+            .select_for_update().values_list('pk', 'tour_date_id', 'seats')
+        )
+        _release(hold)  # frees the seats the Booking insert claims next
+        return Booking.objects.create(**booking_fields)
+
+
+def expire_holds(batch_size=500, now=None):
+    """Releases expired holds in batches of `batch_size`. Returns how many."""
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            batch = list(_locked(SeatHold.objects.expired(now).order_by('expires_at')[:batch_size]))
+            released += _release(batch)
+        if len(batch) < batch_size:
+            return released
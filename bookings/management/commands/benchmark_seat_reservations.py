@@ -0,0 +1,63 @@
+import uuid
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings.seats import actual_seat_counts
+from bookings.stress import run_concurrent_reservations
+from tours.models import Tour, TourDate
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Fires simultaneous bookings at one scratch TourDate and checks nothing was oversold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attempts', type=int, default=500, help='Bookings to attempt')
+        parser.add_argument('--workers', type=int, default=50, help='Concurrent threads (one DB connection each)')
+        parser.add_argument('--capacity', type=int, default=100, help='Seats on the scratch departure')
+        parser.add_argument('--seats', type=int, default=1, help='People per booking')
+        parser.add_argument('--keep', action='store_true', help='Keep the scratch tour, users and bookings')
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        users = [
+            CustomUser.objects.create_user(username=f'bench-{tag}-{n}', password=None)
+            for n in range(min(options['workers'], 20))
+        ]
+        tour = Tour.objects.create(
+            name=f'Benchmark {tag}', location='Benchmark', description='Scratch tour for benchmark_seat_reservations',
+            duration_days=1, price=1, is_active=False,
+        )
+        tour_date = TourDate.objects.create(tour=tour, start_date=date.today() + timedelta(days=365), capacity=options['capacity'])
+
+        try:
+            run = run_concurrent_reservations(tour_date, users, options['attempts'], options['workers'], options['seats'])
+
+            tour_date.refresh_from_db()
+            actual = actual_seat_counts([tour_date.pk]).get(tour_date.pk, 0)
+
+            self.stdout.write(
+                f"{run.attempts} attempts from {options['workers']} threads in {run.elapsed:.2f}s "
+                f"({run.throughput:.0f}/s): {run.reserved} reserved, {run.rejected} rejected, {len(run.errors)} errors"
+            )
+            self.stdout.write(
+                f"Latency p50={run.percentile(0.5) * 1000:.1f}ms p95={run.percentile(0.95) * 1000:.1f}ms "
+                f"max={run.percentile(1.0) * 1000:.1f}ms"
+            )
+            self.stdout.write(f"Seats: capacity={tour_date.capacity} counter={tour_date.seats_booked} bookings={actual}")
+
+            for error in run.errors[:5]:
+                self.stderr.write(f"  {error!r}")
+
+            if tour_date.seats_booked > tour_date.capacity or actual > tour_date.capacity:
+                raise CommandError("Oversold!")
+            if tour_date.seats_booked != actual:
+                raise CommandError("Seat counter disagrees with the bookings.")
+            if run.errors:
+                raise CommandError(f"{len(run.errors)} reservations failed with unexpected errors.")
+            self.stdout.write(self.style.SUCCESS("No overselling."))
+        finally:
+            if not options['keep']:
+                tour.delete()
+                CustomUser.objects.filter(pk__in=[user.pk for user in users]).delete()
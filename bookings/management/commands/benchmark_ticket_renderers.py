@@ -0,0 +1,58 @@
+import time
+import tracemalloc
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from bookings.tickets import render_ticket
+
+RENDERERS = ('xhtml2pdf', 'reportlab')
+
+
+def sample_context(number):
+    """A realistic ticket context; no database needed."""
+    return {
+        'booking': {
+            'id': 10000 + number,
+            'status': 'Confirmed',
+            'number_of_people': 1 + number % 6,
+            'total_price': Decimal('12499.00') * (1 + number % 6),
+            'transaction_id': f'UPI{412300000000 + number}',
+            'tour_date': {'start_date': date(2026, 12, 1) + timedelta(days=number % 60)},
+        },
+        'tour': {'name': 'Kashmir Great Lakes Trek', 'location': 'Sonamarg, Jammu & Kashmir', 'duration_days': 7},
+        'user': {'first_name': 'Asha', 'last_name': f'Traveller {number}', 'email': f'asha{number}@example.com'},
+    }
+
+
+class Command(BaseCommand):
+    help = 'Compares ticket rendering throughput and peak memory of the xhtml2pdf and reportlab renderers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200, help='Tickets rendered per renderer')
+        parser.add_argument('--renderer', choices=RENDERERS, action='append', help='Limit to one renderer (repeatable)')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        contexts = [sample_context(number) for number in range(count)]
+
+        for renderer in options['renderer'] or RENDERERS:
+            render_ticket(contexts[0], renderer)  # warm up imports, fonts and templates
+
+            started = time.perf_counter()
+            total_bytes = sum(len(render_ticket(context, renderer)) for context in contexts)
+            elapsed = time.perf_counter() - started
+
+            # Peak Python heap for a single ticket, measured separately so
+            # tracing overhead does not distort the timing above
+            tracemalloc.start()
+            render_ticket(contexts[0], renderer)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            self.stdout.write(
+                f"{renderer:>10}: {count} tickets in {elapsed:.2f}s = {count / elapsed:.1f}/s, "
+                f"{elapsed / count * 1000:.1f}ms each, {total_bytes / count / 1024:.1f} KiB each, "
+                f"peak heap {peak / 1024 / 1024:.2f} MiB per ticket"
+            )
@@ -0,0 +1,109 @@
+import io
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings import benchmarks
+
+
+def threshold(value):
+    metric, _, percent = value.partition('=')
+    try:
+        return metric.strip(), float(percent)
+    except ValueError:
+        raise ValueError(f"Expected METRIC=PERCENT, got {value!r}")
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks the hot pages through the test client (p50/p95/p99 latency, queries and peak memory '
+        'per request), saves the results as JSON and fails on regressions against a baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', choices=list(benchmarks.SCENARIOS), action='append', help='Limit to one scenario (repeatable)')
+        parser.add_argument('--iterations', type=int, default=50, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per scenario first')
+        parser.add_argument('--cold-cache', action='store_true', help='Clear the cache before every request')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', help='Compare against a JSON file from an earlier run; regressions fail the command')
+        parser.add_argument(
+            '--threshold', type=threshold, action='append', metavar='METRIC=PERCENT',
+            help=f'Allowed growth over the baseline, e.g. p99_ms=40 (repeatable; defaults: '
+                 f'{", ".join(f"{k}={v:g}" for k, v in benchmarks.DEFAULT_THRESHOLDS.items())})',
+        )
+        parser.add_argument(
+            '--populate', choices=list(benchmarks.SCALES),
+            help='First replace the data with a populate_db dataset of this size (destructive)',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='populate_db seed for --populate')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        if iterations < 1 or options['warmup'] < 0:
+            raise CommandError("--iterations must be at least 1 and --warmup not negative.")
+
+        thresholds = dict(benchmarks.DEFAULT_THRESHOLDS)
+        thresholds.update(dict(options['threshold'] or []))
+        unknown = set(thresholds) - set(benchmarks.METRICS)
+        if unknown:
+            raise CommandError(f"Unknown threshold metrics: {', '.join(sorted(unknown))} (choose from {', '.join(benchmarks.METRICS)}).")
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as handle:
+                    baseline = json.load(handle)
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Cannot read the baseline: {error}")
+
+        if options['populate']:
+            self.stdout.write(f"Populating a {options['populate']} dataset (seed {options['seed']})...")
+            call_command('populate_db', seed=options['seed'], stdout=io.StringIO(), **benchmarks.SCALES[options['populate']])
+
+        fixtures = benchmarks.prepare_fixtures()
+        if fixtures is None:
+            raise CommandError("No active tours to benchmark; run populate_db (or pass --populate) first.")
+
+        results = {
+            'meta': benchmarks.run_meta(iterations, options['warmup'], options['cold_cache']),
+            'scenarios': {},
+        }
+        try:
+            for name in options['scenario'] or benchmarks.SCENARIOS:
+                scenario = benchmarks.SCENARIOS[name]
+                reason = benchmarks.skipped_reason(scenario, fixtures)
+                if reason:
+                    self.stdout.write(f"{name:>22}: skipped ({reason})")
+                    continue
+
+                summary = benchmarks.run_scenario(
+                    scenario, fixtures, iterations, options['warmup'], options['cold_cache'],
+                ).summary()
+                results['scenarios'][name] = summary
+                self.stdout.write(
+                    f"{name:>22}: p50={summary['p50_ms']:.1f}ms p95={summary['p95_ms']:.1f}ms "
+                    f"p99={summary['p99_ms']:.1f}ms, {summary['queries_mean']:g} queries "
+                    f"(max {summary['queries_max']}), peak heap {summary['peak_kib']:.0f} KiB, "
+                    f"statuses {summary['statuses']}"
+                )
+        finally:
+            benchmarks.cleanup(fixtures)
+
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(results, handle, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is None:
+            return
+
+        regressions, warnings = benchmarks.compare(results, baseline, thresholds)
+        for warning in warnings:
+            self.stderr.write(f"Warning: {warning}")
+        if regressions:
+            for regression in regressions:
+                self.stderr.write(f"  {regression}")
+            raise CommandError(f"{len(regressions)} regressions against {options['baseline']}.")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}."))
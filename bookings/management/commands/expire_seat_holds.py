@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from bookings.holds import expire_holds
+
+
+class Command(BaseCommand):
+    help = 'Releases the seats of expired seat holds (run from cron, or with --every as a worker)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Holds released per transaction')
+        parser.add_argument('--every', type=int, default=0, help='Keep running, sweeping every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            released = expire_holds(batch_size=options['batch_size'])
+            if released or not options['every']:
+                self.stdout.write(self.style.SUCCESS(f"Released {released} expired seat holds."))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from bookings.models import Booking, DailyRevenue
+from bookings.revenue import actual_rollup, stored_rollup
+from bookings.stats import invalidate_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds (or with --check, verifies) the DailyRevenue rollup from the Booking table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drift, do not write anything')
+        parser.add_argument('--batch-days', type=int, default=31, help='Booking days per grouped query')
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+        batch_days = max(options['batch_days'], 1)
+
+        bounds = Booking.objects.aggregate(first=Min('booking_date'), last=Max('booking_date'))
+        stored = DailyRevenue.objects.aggregate(first=Min('day'), last=Max('day'))
+        days = [timezone.localdate(bounds[key]) for key in ('first', 'last') if bounds[key]]
+        days += [stored[key] for key in ('first', 'last') if stored[key]]
+
+        checked = 0
+        drifted = []
+        if days:
+            start, end = min(days), max(days)
+            while start <= end:
+                window_end = min(start + timedelta(days=batch_days - 1), end)
+                drifted += self._process(start, window_end, check_only)
+                checked += (window_end - start).days + 1
+                start = window_end + timedelta(days=1)
+
+        for key, stored_values, actual in drifted[:50]:
+            self.stdout.write(f"{key}: rollup={stored_values} actual={actual}")
+        if len(drifted) > 50:
+            self.stdout.write(f"... and {len(drifted) - 50} more")
+
+        if drifted and not check_only:
+            invalidate_stats()
+
+        if check_only and drifted:
+            raise CommandError(f"{len(drifted)} rollup rows over {checked} days have drifted.")
+
+        if check_only:
+            self.stdout.write(self.style.SUCCESS(f"Verified {checked} days of revenue rollup, no drift."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {checked} days of revenue rollup ({len(drifted)} rows corrected)."))
+
+    def _process(self, start, end, check_only):
+        """Compares one window of days against a grouped aggregate and replaces it on drift."""
+        with transaction.atomic():
+            if not check_only:
+                # Lock the window's rows: a booking saved meanwhile waits, then
+                # finds its row replaced and applies its delta to the new one
+                list(DailyRevenue.objects.between(start, end).select_for_update().values_list('pk', flat=True))
+
+            actual = actual_rollup(start, end)
+            stored = stored_rollup(start, end)
+            zero = (0, 0, 0)
+            drifted = [
+                (key, stored.get(key, zero), actual.get(key, zero))
+                for key in sorted(set(actual) | set(stored))
+                if stored.get(key, zero) != actual.get(key, zero)
+            ]
+
+            if drifted and not check_only:
+                DailyRevenue.objects.between(start, end).delete()
+                DailyRevenue.objects.bulk_create([
+                    DailyRevenue(
+                        day=day, tour_id=tour_id, status=status, payment_status=payment_status,
+                        bookings=count, seats=seats, amount=amount,
+                    )
+                    for (day, tour_id, status, payment_status), (count, seats, amount) in actual.items()
+                ], batch_size=1000)
+        return drifted
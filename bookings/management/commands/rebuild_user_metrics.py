@@ -0,0 +1,46 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from bookings.user_metrics import drifted_users, refresh_user_metrics
+
+
+class Command(BaseCommand):
+    help = "Rebuilds (or with --check, verifies) the users' stored booking metrics from the Booking table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drift, do not write anything')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Users per query')
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+        batch_size = max(options['batch_size'], 1)
+
+        user_ids = get_user_model().objects.order_by('pk').values_list('pk', flat=True)
+        checked = 0
+        drifted = []
+        last_id = 0
+        while True:
+            batch = list(user_ids.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]
+            checked += len(batch)
+            with transaction.atomic():
+                found = drifted_users(batch)
+                if found and not check_only:
+                    refresh_user_metrics([user_id for user_id, _, _ in found])
+            drifted += found
+
+        for user_id, stored, actual in drifted[:50]:
+            self.stdout.write(f"user {user_id}: stored={stored} actual={actual}")
+        if len(drifted) > 50:
+            self.stdout.write(f"... and {len(drifted) - 50} more")
+
+        if check_only and drifted:
+            raise CommandError(f"{len(drifted)} of {checked} users have drifted booking metrics.")
+
+        if check_only:
+            self.stdout.write(self.style.SUCCESS(f"Verified booking metrics of {checked} users, no drift."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt booking metrics of {checked} users ({len(drifted)} corrected)."))
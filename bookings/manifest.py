@@ -0,0 +1,151 @@
+"""
+Departure manifest: every ticket of a TourDate plus a passenger list (PDF
+to print, CSV to import elsewhere), streamed as one ZIP.
+
+The ZIP is written into a small buffer that is drained after each member,
+so only one ticket is ever held in memory and the first bytes reach the
+browser before the last ticket is rendered. Tickets come from the ticket
+cache; missing ones render in parallel in the process pool
+(bookings.tickets.ticket_files).
+
+A ticket that fails to render does not cut the download short (which
+would leave a truncated, unreadable ZIP): it is left out and listed in
+MISSING_TICKETS.txt at the end of an otherwise complete archive.
+"""
+import csv
+import io
+import shutil
+import zipfile
+from io import BytesIO
+
+from django.utils.dateformat import format as format_date
+from django.utils.text import slugify
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .models import Booking
+from .tickets import TICKET_STATUSES, ticket_files
+
+COPY_CHUNK = 64 * 1024
+
+
+class _ZipStream(io.RawIOBase):
+    """Unseekable sink for zipfile; collects what it writes until drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def manifest_bookings(tour_date):
+    return (
+        Booking.objects.filter(tour_date=tour_date, status__in=TICKET_STATUSES)
+        .select_related('user', 'tour', 'tour_date')
+        .order_by('id')
+    )
+
+
+def manifest_filename(tour_date):
+    return f"manifest_{slugify(tour_date.tour.name)}_{tour_date.start_date:%Y-%m-%d}.zip"
+
+
+PASSENGER_COLUMNS = ['Booking', 'Lead Traveler', 'Email', 'Phone', 'Guests', 'Status', 'Payment', 'Transaction Ref']
+
+
+def passenger_rows(bookings):
+    for booking in bookings:
+        user = booking.user
+        yield [
+            f"#{booking.id}",
+            user.get_full_name() or user.username,
+            user.email,
+            user.phone_number or '',
+            booking.number_of_people,
+            booking.status,
+            booking.payment_status,
+            booking.transaction_id or '',
+        ]
+
+
+def passenger_csv(bookings):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(PASSENGER_COLUMNS)
+    writer.writerows(passenger_rows(bookings))
+    return buffer.getvalue().encode('utf-8-sig')  # BOM: Excel reads UTF-8 names correctly
+
+
+def render_passenger_list(tour_date, bookings):
+    """Passenger manifest PDF (one row per booking) for a departure."""
+    styles = getSampleStyleSheet()
+    buffer = BytesIO()
+    document = SimpleDocTemplate(
+        buffer, pagesize=landscape(A4), leftMargin=1 * cm, rightMargin=1 * cm, topMargin=1 * cm, bottomMargin=1 * cm,
+        title=f"Manifest – {tour_date.tour.name}",
+    )
+
+    rows = [PASSENGER_COLUMNS, *passenger_rows(bookings)]
+    guests = sum(booking.number_of_people for booking in bookings)
+
+    table = Table(rows, repeatRows=1, hAlign='LEFT')
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#0056b3')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f4f6f8')]),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#cccccc')),
+        ('ALIGN', (4, 1), (4, -1), 'RIGHT'),
+    ]))
+
+    document.build([
+        Paragraph(f"{tour_date.tour.name} – {format_date(tour_date.start_date, 'F d, Y')}", styles['Title']),
+        Paragraph(f"{tour_date.tour.location} · {len(rows) - 1} bookings · {guests} guests", styles['Normal']),
+        Spacer(1, 0.5 * cm),
+        table,
+    ])
+    return buffer.getvalue()
+
+
+def stream_manifest_zip(tour_date):
+    """Yields the ZIP (passenger list + tickets) for a departure, chunk by chunk."""
+    bookings = list(manifest_bookings(tour_date))
+    sink = _ZipStream()
+
+    with zipfile.ZipFile(sink, 'w') as archive:
+        archive.writestr('passenger_list.pdf', render_passenger_list(tour_date, bookings), compress_type=zipfile.ZIP_DEFLATED)
+        archive.writestr('passenger_list.csv', passenger_csv(bookings), compress_type=zipfile.ZIP_DEFLATED)
+        yield sink.drain()
+
+        # PDFs are already compressed: store them as they are
+        missing = []
+        for booking, path, error in ticket_files(bookings):
+            if error is not None:
+                missing.append(f"#{booking.id}: {error}")
+                continue
+            name = f"tickets/Ticket_{booking.id}_{slugify(booking.user.get_full_name() or booking.user.username)}.pdf"
+            with open(path, 'rb') as source, archive.open(name, 'w') as target:
+                shutil.copyfileobj(source, target, COPY_CHUNK)
+            yield sink.drain()
+
+        if missing:
+            archive.writestr(
+                'MISSING_TICKETS.txt',
+                "These tickets could not be rendered; download them one by one:\n" + '\n'.join(missing) + '\n',
+            )
+
+    yield sink.drain()  # central directory
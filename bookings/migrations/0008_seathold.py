@@ -0,0 +1,31 @@
+# Generated by Django 6.0 on 2026-10-18 05:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0007_booking_updated_at_alter_booking_total_price_and_more'),
+        ('tours', '0011_tourdate_seats_held'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seats', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('tour_date', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_holds', to='tours.tourdate')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='seat_holds', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='seathold_expires_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 6.0 on 2026-10-18 07:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0008_seathold'),
+        ('tours', '0011_tourdate_seats_held'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'booking_date'], name='booking_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['payment_status', 'booking_date'], name='booking_payment_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['booking_date'], name='booking_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['transaction_id'], name='booking_transaction_idx'),
+        ),
+    ]
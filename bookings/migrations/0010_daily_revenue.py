@@ -0,0 +1,59 @@
+# Generated by Django 6.0 on 2026-10-18 07:40
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def backfill_daily_revenue(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    DailyRevenue = apps.get_model('bookings', 'DailyRevenue')
+
+    rows = (
+        Booking.objects.order_by()
+        .annotate(day=TruncDate('booking_date', tzinfo=timezone.get_current_timezone()))
+        .values('day', 'tour_id', 'status', 'payment_status')
+        .annotate(count=Count('pk'), people=Sum('number_of_people'), total=Sum('total_price'))
+    )
+    DailyRevenue.objects.bulk_create(
+        (
+            DailyRevenue(
+                day=row['day'], tour_id=row['tour_id'], status=row['status'], payment_status=row['payment_status'],
+                bookings=row['count'], seats=row['people'] or 0, amount=row['total'] or Decimal('0'),
+            )
+            for row in rows.iterator(chunk_size=2000)
+        ),
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0009_booking_list_indexes'),
+        ('tours', '0011_tourdate_seats_held'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('Pending', 'Pending Verification'), ('Confirmed', 'Confirmed'), ('Cancelled', 'Cancelled'), ('Completed', 'Completed')], max_length=20)),
+                ('payment_status', models.CharField(choices=[('Pending', 'Payment Pending'), ('Paid', 'Payment Verified'), ('Rejected', 'Payment Rejected'), ('Refunded', 'Payment Refunded')], max_length=20)),
+                ('bookings', models.IntegerField(default=0)),
+                ('seats', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('tour', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_revenue', to='tours.tour')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['payment_status', 'day'], name='daily_revenue_payment_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'tour', 'status', 'payment_status'), name='daily_revenue_unique_key')],
+            },
+        ),
+        migrations.RunPython(backfill_daily_revenue, migrations.RunPython.noop),
+    ]
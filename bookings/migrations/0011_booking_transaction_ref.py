@@ -0,0 +1,43 @@
+# Generated by Django 6.0 on 2026-10-18 08:05
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_transaction_ref(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+
+    batch = []
+    paid = Booking.objects.exclude(transaction_id__isnull=True).exclude(transaction_id='').only('pk', 'transaction_id')
+    for booking in paid.iterator(chunk_size=2000):
+        booking.transaction_ref = re.sub(r'[^0-9A-Z]', '', booking.transaction_id.upper())
+        batch.append(booking)
+        if len(batch) >= 2000:
+            Booking.objects.bulk_update(batch, ['transaction_ref'])
+            batch = []
+    if batch:
+        Booking.objects.bulk_update(batch, ['transaction_ref'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0010_daily_revenue'),
+        ('tours', '0011_tourdate_seats_held'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='transaction_ref',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(backfill_transaction_ref, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['transaction_ref', 'payment_status'], name='booking_txn_ref_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-18 08:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0011_booking_transaction_ref'),
+        ('tours', '0011_tourdate_seats_held'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'booking_date'], name='booking_user_date_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.0 on 2026-10-18 09:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0012_booking_user_date_index'),
+        ('tours', '0011_tourdate_seats_held'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'payment_status', 'total_price'], name='booking_user_paid_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0013_booking_user_paid_index'),
+        ('tours', '0011_tourdate_seats_held'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='dailyrevenue',
+            name='daily_revenue_unique_key',
+        ),
+        migrations.AddField(
+            model_name='dailyrevenue',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrevenue',
+            constraint=models.UniqueConstraint(fields=('day', 'tour', 'status', 'payment_status', 'shard'), name='daily_revenue_unique_key'),
+        ),
+    ]
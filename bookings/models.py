@@ -1,7 +1,73 @@
-from django.db import models
+import re
+from datetime import datetime, time
+
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from tours.models import Tour, TourDate
 
+
+def normalize_transaction_id(value):
+    """
+    Canonical form of a payment reference for matching: upper case, letters
+    and digits only, so 'upi-4123 5567' from a form and 'UPI41235567' from a
+    bank statement compare equal.
+    """
+    return re.sub(r'[^0-9A-Z]', '', (value or '').upper())
+
+
+def _as_date(value):
+    if isinstance(value, str):
+        try:
+            return parse_date(value)
+        except ValueError:
+            return None
+    return value
+
+
+class BookingQuerySet(models.QuerySet):
+
+    def for_listing(self):
+        """Joins everything the staff lists print per row (user, tour, date)."""
+        return self.select_related('user', 'tour', 'tour_date')
+
+    def search(self, query):
+        """
+        Staff search: an exact booking id, a username prefix, a tour name or
+        an exact transaction id. Every branch is a condition on an indexed
+        Booking column (pk, user_id, tour_id, transaction_id), so the
+        planner can OR index scans instead of scanning joined rows.
+        """
+        query = query.strip()
+        if not query:
+            return self
+
+        users = get_user_model().objects.filter(username__startswith=query).values('pk')
+        tours = Tour.objects.filter(name__icontains=query).values('pk')  # pg_trgm index on PostgreSQL
+        condition = Q(user_id__in=users) | Q(tour_id__in=tours) | Q(transaction_id=query)
+
+        booking_id = query.lstrip('#')
+        if booking_id.isdigit() and int(booking_id) < 2 ** 31:
+            condition |= Q(pk=int(booking_id))
+        return self.filter(condition)
+
+    def booked_between(self, start=None, end=None):
+        """
+        Bookings made on or after `start` and on or before `end` (dates or
+        'YYYY-MM-DD' strings; unparseable ones are ignored). Compared as a
+        datetime range, so the booking_date indexes apply.
+        """
+        start, end = _as_date(start), _as_date(end)
+        bookings = self
+        if start:
+            bookings = bookings.filter(booking_date__gte=timezone.make_aware(datetime.combine(start, time.min)))
+        if end:
+            bookings = bookings.filter(booking_date__lte=timezone.make_aware(datetime.combine(end, time.max)))
+        return bookings
+
 class Booking(models.Model):
     # Workflow: Pending -> Confirmed -> Completed (or Cancelled)
     STATUS_CHOICES = [
@@ -19,6 +85,9 @@ class Booking(models.Model):
         ('Refunded', 'Payment Refunded'),
     ]
 
+    # Only these statuses occupy seats on a TourDate
+    SEAT_HOLDING_STATUSES = ('Pending', 'Confirmed')
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL, 
         on_delete=models.CASCADE,
@@ -57,6 +126,9 @@ class Booking(models.Model):
         help_text="Payment Reference ID (e.g., UPI Transaction ID)"
     )
 
+    # normalize_transaction_id(transaction_id), for statement reconciliation
+    transaction_ref = models.CharField(max_length=100, blank=True, default='', editable=False)
+
     status = models.CharField(
         max_length=20, 
         choices=STATUS_CHOICES, 
@@ -72,10 +144,134 @@ class Booking(models.Model):
     booking_date = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BookingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Staff lists filter by a status and sort by booking_date
+            models.Index(fields=['status', 'booking_date'], name='booking_status_date_idx'),
+            models.Index(fields=['payment_status', 'booking_date'], name='booking_payment_date_idx'),
+            models.Index(fields=['booking_date'], name='booking_date_idx'),
+            # Customer dashboard: a user's bookings, newest first
+            models.Index(fields=['user', 'booking_date'], name='booking_user_date_idx'),
+            # Staff user list: a user's paid total, read from the index alone
+            models.Index(fields=['user', 'payment_status', 'total_price'], name='booking_user_paid_idx'),
+            models.Index(fields=['transaction_id'], name='booking_transaction_idx'),
+            models.Index(fields=['transaction_ref', 'payment_status'], name='booking_txn_ref_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remember the values loaded from the DB so signal handlers can
+        work out what a save actually changed (see bookings.signals).
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    @property
+    def seat_claim(self):
+        """(tour_date_id, seats) this booking currently occupies."""
+        if self.tour_date_id and self.status in self.SEAT_HOLDING_STATUSES:
+            return self.tour_date_id, self.number_of_people
+        return self.tour_date_id, 0
+
     def save(self, *args, **kwargs):
         if self.tour and self.number_of_people:
             self.total_price = self.tour.price * self.number_of_people
-        super().save(*args, **kwargs)
+        self.transaction_ref = normalize_transaction_id(self.transaction_id)
+
+        # Atomic so the seat counter update in post_save commits with the row,
+        # and a claim that would oversell (SeatsUnavailable) rolls it back.
+        # post_save claims the seats after its revenue and user metric
+        # writes, so the TourDate row is locked last and only until commit.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"#{self.id} | {self.user.username} - {self.tour.name} ({self.status})"
+
+class SeatHoldQuerySet(models.QuerySet):
+
+    def live(self):
+        return self.filter(expires_at__gt=timezone.now())
+
+    def expired(self, now=None):
+        return self.filter(expires_at__lte=now or timezone.now())
+
+
+class SeatHold(models.Model):
+    """
+    Seats set aside on a TourDate between the booking form and payment.
+    Counted in TourDate.seats_held; turned into a Booking on payment or
+    released by `manage.py expire_seat_holds` after SEAT_HOLD_TTL.
+    See bookings.holds.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='seat_holds')
+    tour_date = models.ForeignKey(TourDate, on_delete=models.CASCADE, related_name='seat_holds')
+    seats = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    objects = SeatHoldQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['expires_at'], name='seathold_expires_idx'),
+        ]
+
+    @property
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+    def __str__(self):
+        return f"Hold #{self.id} | {self.seats} seats on {self.tour_date_id} until {self.expires_at:%H:%M}"
+
+
+class DailyRevenueQuerySet(models.QuerySet):
+
+    def between(self, start=None, end=None):
+        """Rows for local days from `start` to `end` inclusive (as Booking.booked_between)."""
+        start, end = _as_date(start), _as_date(end)
+        rows = self
+        if start:
+            rows = rows.filter(day__gte=start)
+        if end:
+            rows = rows.filter(day__lte=end)
+        return rows
+
+
+class DailyRevenue(models.Model):
+    """
+    Bookings rolled up per local booking day, tour, status and payment
+    status, so revenue totals and charts read a few rows per day instead of
+    the whole Booking table. Kept in step by bookings.signals and
+    bookings.workflow in the same transaction as the booking change; see
+    bookings.revenue and `manage.py rebuild_revenue_rollup`.
+
+    Each key is spread over up to REVENUE_SHARDS rows (`shard`), so
+    same-day bookings of a tour rarely update the same row; readers sum
+    them and the rebuild folds them back into shard 0.
+    """
+    day = models.DateField()
+    tour = models.ForeignKey(Tour, on_delete=models.CASCADE, related_name='daily_revenue')
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    payment_status = models.CharField(max_length=20, choices=Booking.PAYMENT_STATUS_CHOICES)
+    shard = models.PositiveSmallIntegerField(default=0)
+    bookings = models.IntegerField(default=0)
+    seats = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    objects = DailyRevenueQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'tour', 'status', 'payment_status', 'shard'], name='daily_revenue_unique_key'),
+        ]
+        indexes = [
+            models.Index(fields=['payment_status', 'day'], name='daily_revenue_payment_day_idx'),
+        ]
 
     def __str__(self):
-        return f"#{self.id} | {self.user.username} - {self.tour.name} ({self.status})"
\ No newline at end of file
+        return f"{self.day} | tour {self.tour_id} | {self.status}/{self.payment_status} #{self.shard}: {self.bookings} bookings, ₹{self.amount}"
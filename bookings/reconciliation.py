@@ -0,0 +1,234 @@
+"""
+Bank / UPI statement reconciliation.
+
+Staff upload a statement export (CSV or XLSX). Each line's reference is
+normalized (models.normalize_transaction_id) and looked up against
+Booking.transaction_ref in chunks of `IN (...)` queries on the
+(transaction_ref, payment_status) index, so 100k lines cost a few dozen
+index lookups rather than one table scan per line.
+
+Every line ends up in one bucket:
+
+    matched          one Pending booking, one statement line, same amount
+    amount_mismatch  the statement amount differs from total_price
+    duplicate        the reference appears on several lines or bookings
+    already_handled  the booking is no longer awaiting verification
+    unknown          no booking carries this reference
+    unreadable       no reference or no parseable amount on the line
+
+Only `matched` bookings are verified, all together through
+bookings.workflow (one compare-and-set UPDATE in one transaction).
+"""
+import csv
+import io
+import os
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+from zipfile import BadZipFile
+
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from .models import Booking, normalize_transaction_id
+from .workflow import apply_transition
+
+LOOKUP_CHUNK = 5000
+HEADER_SCAN_ROWS = 30           # statements often start with account details
+MAX_ISSUES_SHOWN = 500
+
+# Header keywords, most specific first
+REFERENCE_HEADERS = ('utr', 'upi ref', 'rrn', 'transaction id', 'txn id', 'transaction ref', 'reference', 'ref no', 'ref')
+AMOUNT_HEADERS = ('credit', 'deposit', 'amount')
+
+ISSUE_KINDS = ('amount_mismatch', 'duplicate', 'already_handled', 'unknown', 'unreadable')
+
+
+class StatementError(ValueError):
+    """The upload is not a statement we can read."""
+
+
+@dataclass
+class StatementLine:
+    line_number: int
+    raw_reference: str
+    reference: str
+    amount: Decimal = None
+
+
+@dataclass
+class Issue:
+    kind: str
+    line_number: int
+    reference: str
+    detail: str
+    booking_id: int = None
+
+
+@dataclass
+class ReconciliationResult:
+    lines: int = 0
+    matched: list = field(default_factory=list)      # booking ids
+    issues: list = field(default_factory=list)
+    verified: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)      # changed between matching and verifying
+
+    def counts(self):
+        tally = defaultdict(int)
+        for issue in self.issues:
+            tally[issue.kind] += 1
+        return {kind: tally[kind] for kind in ISSUE_KINDS}
+
+
+# --- Reading ---
+
+def _rows_from_csv(uploaded):
+    text = io.TextIOWrapper(getattr(uploaded, 'file', uploaded), encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        sample = text.read(4096)
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t|')
+        except csv.Error:
+            dialect = csv.excel
+        yield from csv.reader(text, dialect)
+    finally:
+        text.detach()
+
+
+def _rows_from_xlsx(uploaded):
+    try:
+        workbook = load_workbook(uploaded, read_only=True, data_only=True)  # streams rows
+    except (BadZipFile, InvalidFileException, KeyError, OSError) as error:
+        raise StatementError(f"Could not open the spreadsheet: {error}") from error
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield ['' if cell is None else str(cell) for cell in row]
+    finally:
+        workbook.close()
+
+
+def _find_column(headers, keywords):
+    for keyword in keywords:
+        for index, header in enumerate(headers):
+            if header == keyword or re.search(rf'\b{re.escape(keyword)}\b', header):
+                return index
+    return None
+
+
+CURRENCY_PATTERN = re.compile(r'rs\.?|inr|₹', re.IGNORECASE)
+AMOUNT_PATTERN = re.compile(r'-?(?:\d+(?:\.\d*)?|\.\d+)')
+
+
+def parse_amount(value):
+    """The first number in a cell, so "Rs. 1,000", "INR 1000.00" and "₹1,000" all read 1000.00."""
+    match = AMOUNT_PATTERN.search(CURRENCY_PATTERN.sub('', str(value or '').replace(',', '')))
+    if not match:
+        return None
+    try:
+        return Decimal(match.group()).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+
+def read_statement(uploaded):
+    """Yields StatementLines from an uploaded CSV or XLSX statement."""
+    extension = os.path.splitext(uploaded.name or '')[1].lower()
+    rows = _rows_from_xlsx(uploaded) if extension == '.xlsx' else _rows_from_csv(uploaded)
+
+    reference_column = amount_column = None
+    for line_number, row in enumerate(rows, start=1):
+        if reference_column is None:
+            headers = [str(cell).strip().lower() for cell in row]
+            reference_column = _find_column(headers, REFERENCE_HEADERS)
+            amount_column = _find_column(headers, AMOUNT_HEADERS)
+            if reference_column is None or amount_column is None:
+                reference_column = None
+                if line_number >= HEADER_SCAN_ROWS:
+                    raise StatementError("No transaction reference and amount columns found in the statement header.")
+            continue
+
+        if not any(str(cell).strip() for cell in row):
+            continue
+        raw_reference = row[reference_column].strip() if reference_column < len(row) else ''
+        amount = parse_amount(row[amount_column]) if amount_column < len(row) else None
+        yield StatementLine(line_number, raw_reference, normalize_transaction_id(raw_reference), amount)
+
+    if reference_column is None:
+        raise StatementError("The statement is empty or has no header row.")
+
+
+# --- Matching ---
+
+def _bookings_by_reference(references):
+    found = defaultdict(list)
+    references = sorted(references)
+    for start in range(0, len(references), LOOKUP_CHUNK):
+        chunk = references[start:start + LOOKUP_CHUNK]
+        rows = Booking.objects.filter(transaction_ref__in=chunk).values_list(
+            'pk', 'transaction_ref', 'status', 'payment_status', 'total_price',
+        )
+        for pk, reference, status, payment_status, total_price in rows:
+            found[reference].append((pk, status, payment_status, total_price))
+    return found
+
+
+def match_statement(lines):
+    """Buckets statement lines against bookings; writes nothing."""
+    result = ReconciliationResult()
+    by_reference = defaultdict(list)
+
+    for line in lines:
+        result.lines += 1
+        if not line.reference or line.amount is None:
+            missing = "reference" if not line.reference else "amount"
+            result.issues.append(Issue('unreadable', line.line_number, line.raw_reference, f"No {missing} on this line"))
+        else:
+            by_reference[line.reference].append(line)
+
+    bookings = _bookings_by_reference(by_reference)
+
+    for reference, statement_lines in by_reference.items():
+        line = statement_lines[0]
+        candidates = bookings.get(reference, [])
+
+        if len(statement_lines) > 1 or len(candidates) > 1:
+            where = ', '.join(str(other.line_number) for other in statement_lines)
+            detail = f"{len(statement_lines)} statement lines ({where}), {len(candidates)} bookings"
+            for duplicate in statement_lines:
+                result.issues.append(Issue('duplicate', duplicate.line_number, duplicate.raw_reference, detail))
+            continue
+
+        if not candidates:
+            result.issues.append(Issue('unknown', line.line_number, line.raw_reference, "No booking with this reference"))
+            continue
+
+        pk, status, payment_status, total_price = candidates[0]
+        if (status, payment_status) != ('Pending', 'Pending'):
+            result.issues.append(Issue(
+                'already_handled', line.line_number, line.raw_reference, f"Booking is {status} / {payment_status}", pk,
+            ))
+        elif total_price is None or line.amount != total_price:
+            result.issues.append(Issue(
+                'amount_mismatch', line.line_number, line.raw_reference,
+                f"Statement ₹{line.amount}, booking ₹{total_price}", pk,
+            ))
+        else:
+            result.matched.append(pk)
+
+    result.matched.sort()
+    result.issues.sort(key=lambda issue: (ISSUE_KINDS.index(issue.kind), issue.line_number))
+    return result
+
+
+def reconcile(uploaded, verify=False):
+    """
+    Reads and matches a statement; with verify=True also confirms every
+    clean match in one transaction. Raises StatementError for bad files.
+    """
+    result = match_statement(read_statement(uploaded))
+    if verify and result.matched:
+        outcome = apply_transition('verify_payment', result.matched)
+        result.verified, result.skipped = outcome.updated, outcome.skipped
+    return result
@@ -0,0 +1,220 @@
+"""
+Revenue rollup: bookings summed per (local booking day, tour, status,
+payment_status) in the DailyRevenue table.
+
+Every Booking save/delete (bookings.signals) and bulk workflow action
+(bookings.workflow) moves the affected rollup rows with relative
+UPDATEs inside the same transaction, so totals read from the rollup agree
+with the Booking table at every commit. Reports then aggregate a few rows
+per day instead of scanning booking history. Bulk `QuerySet.update()`
+calls elsewhere bypass this; `manage.py rebuild_revenue_rollup --check`
+reports such drift and the command without --check repairs it.
+
+All of today's bookings of a tour move the same key, and an UPDATE locks
+its row until commit. So each transaction writes its deltas to one of
+REVENUE_SHARDS rows per key, picked at random: two concurrent bookings
+wait on each other only when they pick the same shard. Every read sums
+the shards (they are plain SUM() aggregates already) and
+rebuild_revenue_rollup folds them back into one row per key.
+"""
+import datetime
+import random
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, IntegerField, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Booking, DailyRevenue, _as_date
+
+# Sent after commit whenever apply_revenue_deltas() moved the rollup
+revenue_changed = Signal()
+
+# Booking fields the rollup key and measures are read from
+REVENUE_FIELDS = ('booking_date', 'tour_id', 'status', 'payment_status', 'number_of_people', 'total_price')
+
+# Up to this many days the chart shows one bar per day, beyond it one per month
+DAILY_CHART_MAX_DAYS = 92
+DEFAULT_CHART_DAYS = 30
+
+# Rows each rollup key is spread over, see above
+REVENUE_SHARDS = 8
+
+
+def rollup_entry(values):
+    """((day, tour_id, status, payment_status), (bookings, seats, amount)) for one booking."""
+    booking_date = values['booking_date']
+    if booking_date is None or values['tour_id'] is None:
+        return None
+    key = (timezone.localdate(booking_date), values['tour_id'], values['status'], values['payment_status'])
+    return key, (1, values['number_of_people'] or 0, values['total_price'] or Decimal('0'))
+
+
+def rollup_delta(old_values, new_values):
+    """
+    {key: [bookings, seats, amount]} moving a booking from its old state
+    (None when created) to its new one (None when deleted).
+    """
+    deltas = defaultdict(lambda: [0, 0, Decimal('0')])
+    for values, sign in ((old_values, -1), (new_values, 1)):
+        entry = rollup_entry(values) if values else None
+        if entry:
+            key, measures = entry
+            for position, measure in enumerate(measures):
+                deltas[key][position] += sign * measure
+    return {key: delta for key, delta in deltas.items() if any(delta)}
+
+
+def merge_deltas(target, deltas):
+    for key, delta in deltas.items():
+        current = target.setdefault(key, [0, 0, Decimal('0')])
+        for position, value in enumerate(delta):
+            current[position] += value
+    return target
+
+
+def apply_revenue_deltas(deltas, shard=None):
+    """
+    Adds {key: (bookings, seats, amount)} to the rollup, one relative UPDATE
+    per key (keys in sorted order, so concurrent writers never deadlock),
+    all on one shard row of each key: `shard`, or a random one.
+    """
+    shard = random.randrange(REVENUE_SHARDS) if shard is None else shard
+    with transaction.atomic():
+        for key, (count, seats, amount) in sorted(deltas.items()):
+            if not (count or seats or amount):
+                continue
+            day, tour_id, status, payment_status = key
+            key_rows = DailyRevenue.objects.filter(day=day, tour_id=tour_id, status=status, payment_status=payment_status)
+            rows = key_rows.filter(shard=shard)
+            changes = {'bookings': F('bookings') + count, 'seats': F('seats') + seats, 'amount': F('amount') + amount}
+
+            if rows.update(**changes):
+                continue
+            if count <= 0:
+                # Not an addition: move any existing row of the key instead of opening a
+                # negative shard; none at all means the rows went with their tour (cascade)
+                existing = key_rows.order_by('shard').values_list('pk', flat=True)[:1]
+                DailyRevenue.objects.filter(pk__in=list(existing)).update(**changes)
+                continue
+            try:
+                with transaction.atomic():
+                    DailyRevenue.objects.create(
+                        day=day, tour_id=tour_id, status=status, payment_status=payment_status, shard=shard,
+                        bookings=count, seats=seats, amount=amount,
+                    )
+            except IntegrityError:  # created concurrently in the meantime
+                rows.update(**changes)
+
+    transaction.on_commit(lambda: revenue_changed.send(sender=DailyRevenue))
+
+
+def actual_rollup(start_day=None, end_day=None):
+    """
+    Recomputes {key: (bookings, seats, amount)} from the Booking table for
+    local booking days in [start_day, end_day], with one grouped query.
+    """
+    bookings = Booking.objects.all()
+    tz = timezone.get_current_timezone()
+    if start_day:
+        bookings = bookings.filter(booking_date__gte=datetime.datetime.combine(start_day, datetime.time.min, tzinfo=tz))
+    if end_day:
+        bookings = bookings.filter(booking_date__lte=datetime.datetime.combine(end_day, datetime.time.max, tzinfo=tz))
+
+    rows = (
+        bookings.order_by()
+        .annotate(day=TruncDate('booking_date', tzinfo=tz))
+        .values('day', 'tour_id', 'status', 'payment_status')
+        .annotate(
+            count=Count('pk'),
+            people=Coalesce(Sum('number_of_people'), Value(0), output_field=IntegerField()),
+            total=Coalesce(Sum('total_price'), Value(Decimal('0')), output_field=DecimalField(max_digits=14, decimal_places=2)),
+        )
+    )
+    return {
+        (row['day'], row['tour_id'], row['status'], row['payment_status']): (row['count'], row['people'], row['total'])
+        for row in rows
+    }
+
+
+def stored_rollup(start_day=None, end_day=None):
+    """{key: (bookings, seats, amount)} as the rollup has it, shards summed."""
+    rows = (
+        DailyRevenue.objects.between(start_day, end_day)
+        .order_by()
+        .values('day', 'tour_id', 'status', 'payment_status')
+        .annotate(count=Sum('bookings'), people=Sum('seats'), total=Sum('amount'))
+    )
+    return {
+        (row['day'], row['tour_id'], row['status'], row['payment_status']): (row['count'], row['people'], row['total'])
+        for row in rows
+        if row['count'] or row['people'] or row['total']
+    }
+
+
+# --- Reads ---
+
+def revenue_total(payment_status='Paid', start=None, end=None):
+    """Sum of booking amounts with this payment status, booked between start and end."""
+    rows = DailyRevenue.objects.between(start, end).filter(payment_status=payment_status)
+    return rows.aggregate(total=Sum('amount'))['total'] or 0
+
+
+def filtered_total(payment_status=None, start=None, end=None):
+    """Amount of all bookings the (unsearched) payment report lists for these filters."""
+    rows = DailyRevenue.objects.between(start, end)
+    if payment_status:
+        rows = rows.filter(payment_status=payment_status)
+    return rows.aggregate(total=Sum('amount'))['total'] or 0
+
+
+def revenue_series(start, end, payment_status='Paid'):
+    """
+    [(period start, amount)] for the chart, by day for short ranges and by
+    month beyond DAILY_CHART_MAX_DAYS. Periods without revenue are zero.
+    """
+    by_month = (end - start).days > DAILY_CHART_MAX_DAYS
+    rows = DailyRevenue.objects.between(start, end).filter(payment_status=payment_status).order_by()
+    if by_month:
+        rows = rows.annotate(period=TruncMonth('day'))
+    else:
+        rows = rows.annotate(period=F('day'))
+    totals = {row['period']: row['total'] for row in rows.values('period').annotate(total=Sum('amount'))}
+
+    series = []
+    period = start.replace(day=1) if by_month else start
+    while period <= end:
+        series.append((period, totals.get(period, 0)))
+        if by_month:
+            period = (period + datetime.timedelta(days=32)).replace(day=1)
+        else:
+            period += datetime.timedelta(days=1)
+    return series
+
+
+def chart_window(start=None, end=None):
+    """The (start, end) days to chart for the report filters; the last 30 days by default."""
+    start, end = _as_date(start), _as_date(end)
+    end = end or timezone.localdate()
+    start = start or end - datetime.timedelta(days=DEFAULT_CHART_DAYS - 1)
+    return (start, end) if start <= end else (end, start)
+
+
+def revenue_chart(start=None, end=None, payment_status='Paid'):
+    """Bars for the revenue-over-time chart: label, amount and height in percent."""
+    start, end = chart_window(start, end)
+    series = revenue_series(start, end, payment_status)
+    peak = max((amount for _, amount in series), default=0) or 1
+    by_month = (end - start).days > DAILY_CHART_MAX_DAYS
+    return {
+        'start': start,
+        'end': end,
+        'by_month': by_month,
+        'bars': [
+            {'period': period, 'amount': amount, 'height': round(100 * amount / peak, 1)}
+            for period, amount in series
+        ],
+    }
@@ -0,0 +1,120 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F, Sum
+from django.dispatch import Signal
+from tours.models import TourDate
+
+# Sent after commit with tour_date_ids=[...] whenever seat counters move
+seats_changed = Signal()
+
+
+class SeatsUnavailable(Exception):
+    """A seat claim would take a TourDate past its capacity."""
+
+    def __init__(self, tour_date_id, requested, remaining):
+        self.tour_date_id = tour_date_id
+        self.requested = requested
+        self.remaining = max(remaining, 0)
+        super().__init__(f"TourDate #{tour_date_id}: {requested} seats requested, {self.remaining} left")
+
+
+def claim_delta(old_claim, new_claim):
+    """
+    Turns two (tour_date_id, seats) claims into {tour_date_id: delta}.
+    Handles bookings that moved between dates as well as size/status edits.
+    """
+    deltas = defaultdict(int)
+    old_date, old_seats = old_claim
+    new_date, new_seats = new_claim
+
+    if old_date:
+        deltas[old_date] -= old_seats
+    if new_date:
+        deltas[new_date] += new_seats
+
+    return {date_id: delta for date_id, delta in deltas.items() if delta}
+
+
+def claim_seats(tour_date_id, seats, counter='seats_booked'):
+    """
+    Takes `seats` on a TourDate with a single conditional
+        UPDATE ... SET seats_booked = seats_booked + n
+        WHERE id = ... AND seats_booked + seats_held + n <= capacity
+    The check and the increment are one statement, so concurrent claims
+    on the same date can never oversell it: they queue briefly on that
+    one row lock and each re-evaluates the condition. Nothing else is
+    locked. Raises SeatsUnavailable when the seats are not there.
+
+    counter='seats_held' claims for a SeatHold instead (bookings.holds).
+    """
+    claimed = TourDate.objects.filter(
+        pk=tour_date_id,
+        seats_booked__lte=F('capacity') - F('seats_held') - seats,
+    ).update(**{counter: F(counter) + seats})
+
+    if not claimed:
+        remaining = (
+            TourDate.objects.filter(pk=tour_date_id)
+            .values_list(F('capacity') - F('seats_booked') - F('seats_held'), flat=True)
+            .first()
+        )
+        raise SeatsUnavailable(tour_date_id, seats, remaining or 0)
+
+
+def release_held_seats(deltas):
+    """Gives {tour_date_id: seats} of expired or converted holds back."""
+    for date_id, seats in sorted(deltas.items()):
+        TourDate.objects.filter(pk=date_id).update(seats_held=F('seats_held') - seats)
+
+    date_ids = sorted(deltas)
+    if date_ids:
+        transaction.on_commit(lambda: seats_changed.send(sender=TourDate, tour_date_ids=date_ids))
+
+
+def apply_seat_deltas(deltas):
+    """
+    Applies {tour_date_id: delta} to TourDate.seats_booked with one UPDATE
+    per date. Releases are unconditional; claims go through claim_seats()
+    and raise SeatsUnavailable, rolling back the caller's transaction.
+    """
+    with transaction.atomic():
+        # Releases first, then claims in id order: a booking moving between
+        # dates frees its old seats, and two movers never deadlock.
+        for date_id, delta in sorted(deltas.items(), key=lambda item: (item[1] > 0, item[0])):
+            if delta > 0:
+                claim_seats(date_id, delta)
+            else:
+                TourDate.objects.filter(pk=date_id).update(seats_booked=F('seats_booked') + delta)
+
+    date_ids = sorted(deltas)
+    transaction.on_commit(lambda: seats_changed.send(sender=TourDate, tour_date_ids=date_ids))
+
+
+def actual_seat_counts(date_ids=None):
+    """
+    Recomputes seat usage from the Booking table in one grouped query.
+    Returns {tour_date_id: seats} for dates that have holding bookings.
+    """
+    from .models import Booking
+
+    bookings = Booking.objects.filter(
+        tour_date__isnull=False,
+        status__in=Booking.SEAT_HOLDING_STATUSES,
+    )
+    if date_ids is not None:
+        bookings = bookings.filter(tour_date_id__in=date_ids)
+
+    rows = bookings.values('tour_date_id').annotate(seats=Sum('number_of_people'))
+    return {row['tour_date_id']: row['seats'] for row in rows}
+
+
+def actual_held_counts(date_ids=None):
+    """{tour_date_id: seats} of the SeatHold rows that seats_held should count."""
+    from .models import SeatHold
+
+    holds = SeatHold.objects.all()
+    if date_ids is not None:
+        holds = holds.filter(tour_date_id__in=date_ids)
+
+    rows = holds.values('tour_date_id').annotate(seats=Sum('seats'))
+    return {row['tour_date_id']: row['seats'] for row in rows}
@@ -0,0 +1,216 @@
+"""
+Keeps TourDate.seats_booked, the DailyRevenue rollup and the users' stored
+booking metrics in sync with the Booking table.
+
+Every Booking save/delete (views, Django admin, shell) goes through these
+handlers, so availability and revenue reads never need to aggregate
+bookings. Bulk `QuerySet.update()` calls bypass signals and must call
+bookings.seats.apply_seat_deltas, bookings.revenue.apply_revenue_deltas
+and bookings.user_metrics.refresh_user_metrics themselves (bookings.workflow does,
+and sends `bookings_transitioned` for the ticket handler below).
+
+A save that needs more seats than the TourDate has left raises
+bookings.seats.SeatsUnavailable and nothing is written.
+
+Also schedules ticket PDF rendering (bookings.tickets) when anything
+printed on a ticket changes, and invalidates the cached customer
+dashboard (tours.cache scope user:<id>) of every user whose bookings
+change.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from tours import cache as fragment_cache
+from tours.models import Tour, TourDate
+from .models import Booking
+from .revenue import REVENUE_FIELDS, apply_revenue_deltas, revenue_changed, rollup_delta
+from .stats import invalidate_stats
+from .seats import claim_delta, apply_seat_deltas
+from .user_metrics import refresh_user_metrics
+from .workflow import bookings_transitioned
+from . import tickets
+
+SEAT_FIELDS = ('tour_date_id', 'status', 'number_of_people')
+TRACKED_FIELDS = tuple(dict.fromkeys(SEAT_FIELDS + REVENUE_FIELDS))
+
+
+def _is_tracked(instance):
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    return all(field in loaded for field in TRACKED_FIELDS)
+
+
+def _loaded_claim(instance):
+    """Seat claim as it was in the DB before this save (or none)."""
+    if not _is_tracked(instance):
+        return None, 0
+
+    loaded = instance._loaded_values
+    old = Booking(**{field: loaded.get(field) for field in SEAT_FIELDS})
+    return old.seat_claim
+
+
+def _loaded_revenue(instance):
+    """Rollup fields as they were in the DB before this save (or None)."""
+    if not _is_tracked(instance):
+        return None
+    return {field: instance._loaded_values[field] for field in REVENUE_FIELDS}
+
+
+def _current_revenue(instance):
+    return {field: getattr(instance, field) for field in REVENUE_FIELDS}
+
+
+def _remember_state(instance):
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    loaded.update({field: getattr(instance, field) for field in TRACKED_FIELDS + ('user_id',)})
+    instance._loaded_values = loaded
+
+
+@receiver(pre_save, sender=Booking)
+def load_seat_state(sender, instance, raw=False, **kwargs):
+    """
+    Instances built by hand (or with deferred fields) were not loaded
+    through from_db, so fetch their stored seat and revenue state before
+    it changes.
+    """
+    if raw or instance.pk is None or _is_tracked(instance):
+        return
+
+    stored = Booking.objects.filter(pk=instance.pk).values(*TRACKED_FIELDS).first()
+    if stored:
+        loaded = getattr(instance, '_loaded_values', None) or {}
+        loaded.update(stored)
+        instance._loaded_values = loaded
+
+
+@receiver(post_save, sender=Booking)
+def sync_seats_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return  # loaddata: rebuild with rebuild_seat_counts / rebuild_revenue_rollup
+
+    revenue = rollup_delta(None if created else _loaded_revenue(instance), _current_revenue(instance))
+    if revenue:
+        apply_revenue_deltas(revenue)
+
+    # Every metric input (booking date, payment status, price) is a rollup field too
+    previous_user = (getattr(instance, '_loaded_values', None) or {}).get('user_id', instance.user_id)
+    if revenue or created or previous_user != instance.user_id:
+        refresh_user_metrics({instance.user_id, previous_user})
+
+    # The seat claim is the last write: the departure row, which every
+    # booking of that date needs, stays locked only until commit
+    old_claim = (None, 0) if created else _loaded_claim(instance)
+    deltas = claim_delta(old_claim, instance.seat_claim)
+    if deltas:
+        apply_seat_deltas(deltas)
+
+    _remember_state(instance)
+
+
+@receiver(post_delete, sender=Booking)
+def sync_seats_on_delete(sender, instance, **kwargs):
+    # Use what was loaded from the DB, not unsaved edits on the instance
+    revenue = rollup_delta(_loaded_revenue(instance) if _is_tracked(instance) else _current_revenue(instance), None)
+    if revenue:
+        apply_revenue_deltas(revenue)
+    refresh_user_metrics({instance.user_id})
+
+    claim = _loaded_claim(instance) if _is_tracked(instance) else instance.seat_claim
+    deltas = claim_delta(claim, (None, 0))
+    if deltas:
+        apply_seat_deltas(deltas)  # last, as on save
+
+
+@receiver(revenue_changed)
+def refresh_booking_stats(sender, **kwargs):
+    # Sent after commit (bookings.revenue), so the next read recomputes committed data
+    invalidate_stats()
+
+
+# --- Customer dashboards ---
+
+def _bump_dashboards(user_ids):
+    fragment_cache.bump(*[f"user:{user_id}" for user_id in sorted({pk for pk in user_ids if pk})])
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def refresh_customer_dashboard(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    user_ids = {instance.user_id, loaded.get('user_id')}  # a booking moved to another user leaves both
+    transaction.on_commit(lambda: _bump_dashboards(user_ids))
+
+
+@receiver(post_save, sender=TourDate)
+def refresh_departure_dashboards(sender, instance, raw=False, created=False, **kwargs):
+    # A moved start date moves trips between upcoming and past
+    if raw or created:
+        return
+    tour_date_id = instance.pk
+    transaction.on_commit(lambda: _bump_dashboards(
+        Booking.objects.filter(tour_date_id=tour_date_id).values_list('user_id', flat=True).distinct()
+    ))
+
+
+@receiver(bookings_transitioned)
+def refresh_transitioned_dashboards(sender, booking_ids, **kwargs):
+    # Already after commit
+    _bump_dashboards(Booking.objects.filter(pk__in=booking_ids).values_list('user_id', flat=True).distinct())
+
+
+# --- Ticket PDFs ---
+
+User = get_user_model()
+
+# Fields of related models that appear on the ticket
+TICKET_FIELDS = {
+    Tour: {'name', 'location', 'duration_days'},
+    TourDate: {'start_date'},
+    User: {'first_name', 'last_name', 'email'},
+}
+TICKET_LOOKUPS = {Tour: 'tour_id', TourDate: 'tour_date_id', User: 'user_id'}
+
+
+def _schedule_after_commit(**lookup):
+    transaction.on_commit(lambda: tickets.schedule_tickets(Booking.objects.filter(**lookup)))
+
+
+@receiver(post_save, sender=Booking)
+def render_ticket_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    if instance.status in tickets.TICKET_STATUSES:
+        _schedule_after_commit(pk=instance.pk)
+    else:
+        booking_id = instance.pk
+        transaction.on_commit(lambda: tickets.delete_tickets(booking_id))
+
+
+@receiver(post_delete, sender=Booking)
+def delete_ticket_files(sender, instance, **kwargs):
+    booking_id = instance.pk
+    transaction.on_commit(lambda: tickets.delete_tickets(booking_id))
+
+
+@receiver(post_save, sender=Tour)
+@receiver(post_save, sender=TourDate)
+@receiver(post_save, sender=User)
+def rerender_tickets(sender, instance, raw=False, created=False, update_fields=None, **kwargs):
+    # e.g. a login only saves last_login, which no ticket shows
+    if raw or created or (update_fields is not None and not set(update_fields) & TICKET_FIELDS[sender]):
+        return
+    _schedule_after_commit(**{TICKET_LOOKUPS[sender]: instance.pk})
+
+
+
+@receiver(bookings_transitioned)
+def refresh_tickets_after_transition(sender, booking_ids, **kwargs):
+    # Already after commit: one render batch / one delete pass per bulk action
+    bookings = Booking.objects.filter(pk__in=booking_ids)
+    tickets.schedule_tickets(bookings)  # only the ticketed statuses
+    for booking_id in bookings.exclude(status__in=tickets.TICKET_STATUSES).values_list('pk', flat=True):
+        tickets.delete_tickets(booking_id)
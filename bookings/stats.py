@@ -0,0 +1,48 @@
+"""
+Booking statistics for the staff dashboard, the payment report and the
+JSON stats endpoint.
+
+booking_stats() answers everything in one conditional-aggregation query
+over the DailyRevenue rollup (a handful of rows per day, not one per
+booking) and caches the result for DASHBOARD_STATS_TTL seconds. Any
+booking change that moves the rollup clears the cached copy after commit
+(revenue_changed, see bookings.signals); the TTL bounds staleness for
+processes with their own local-memory cache.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, Sum
+
+from .models import Booking, DailyRevenue
+
+STATS_CACHE_KEY = 'bookings:stats'
+
+
+def _compute():
+    aggregates = {'total_bookings': Sum('bookings')}
+    for status, _ in Booking.STATUS_CHOICES:
+        aggregates[f'{status.lower()}_bookings'] = Sum('bookings', filter=Q(status=status))
+    for payment_status, _ in Booking.PAYMENT_STATUS_CHOICES:
+        key = payment_status.lower()
+        aggregates[f'{key}_pay_cnt'] = Sum('bookings', filter=Q(payment_status=payment_status))
+        aggregates[f'{key}_pay_amt'] = Sum('amount', filter=Q(payment_status=payment_status))
+
+    stats = DailyRevenue.objects.aggregate(**aggregates)
+    stats = {key: value or (Decimal('0') if key.endswith('_amt') else 0) for key, value in stats.items()}
+    stats['total_revenue'] = stats['paid_pay_amt']
+    return stats
+
+
+def booking_stats():
+    """
+    {'total_bookings', '<status>_bookings', '<payment status>_pay_cnt',
+    '<payment status>_pay_amt', 'total_revenue'} with lowercase statuses,
+    e.g. 'pending_bookings', 'refunded_pay_amt'.
+    """
+    return cache.get_or_set(STATS_CACHE_KEY, _compute, settings.DASHBOARD_STATS_TTL)
+
+
+def invalidate_stats():
+    cache.delete(STATS_CACHE_KEY)
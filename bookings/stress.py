@@ -0,0 +1,92 @@
+"""
+Concurrency harness for seat reservations.
+
+Fires many simultaneous bookings at one TourDate from a pool of threads,
+each on its own DB connection, the way a flash sale would. Used by the
+stress test in bookings.tests and by `manage.py benchmark_seat_reservations`.
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.db import connection
+
+from .models import Booking
+from .seats import SeatsUnavailable
+
+
+@dataclass
+class ReservationRun:
+    attempts: int = 0
+    reserved: int = 0          # bookings created
+    seats_reserved: int = 0
+    rejected: int = 0          # SeatsUnavailable
+    errors: list = field(default_factory=list)
+    latencies: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def throughput(self):
+        return self.attempts / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, fraction):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def run_concurrent_reservations(tour_date, users, attempts, workers, seats=1):
+    """
+    Makes `attempts` bookings of `seats` each on `tour_date` from `workers`
+    threads released together by a barrier. Returns a ReservationRun.
+    """
+    run = ReservationRun()
+    lock = threading.Lock()
+    barrier = threading.Barrier(workers)
+    remaining = iter(range(attempts))
+
+    def worker():
+        try:
+            barrier.wait()
+            while True:
+                with lock:
+                    number = next(remaining, None)
+                if number is None:
+                    return
+
+                started = time.perf_counter()
+                try:
+                    Booking.objects.create(
+                        user=users[number % len(users)],
+                        tour_id=tour_date.tour_id,
+                        tour_date=tour_date,
+                        number_of_people=seats,
+                    )
+                    outcome = 'reserved'
+                except SeatsUnavailable:
+                    outcome = 'rejected'
+                except Exception as error:  # reported, never hidden
+                    outcome = error
+
+                with lock:
+                    run.attempts += 1
+                    run.latencies.append(time.perf_counter() - started)
+                    if outcome == 'reserved':
+                        run.reserved += 1
+                        run.seats_reserved += seats
+                    elif outcome == 'rejected':
+                        run.rejected += 1
+                    else:
+                        run.errors.append(outcome)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    run.elapsed = time.perf_counter() - started
+    return run
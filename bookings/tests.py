@@ -0,0 +1,712 @@
+import csv
+import json
+import os
+import tempfile
+import zipfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+
+import openpyxl
+import xlsxwriter
+from pypdf import PdfReader
+from unittest import mock, skipIf
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from tours.models import Tour, TourDate
+from users.models import CustomUser
+from . import tickets
+from .holds import book_from_hold, expire_holds, place_hold
+from .models import Booking, DailyRevenue, SeatHold
+from .reconciliation import parse_amount, reconcile
+from .revenue import actual_rollup, filtered_total, revenue_total, stored_rollup
+from .seats import SeatsUnavailable, actual_seat_counts
+from .stress import run_concurrent_reservations
+from .tickets import fingerprint, ticket_context, ticket_file, ticket_path
+from .workflow import apply_transition
+
+
+@skipIf(connection.vendor == 'sqlite', "SQLite locks the whole database per writer; run against PostgreSQL")
+class SeatReservationStressTests(TransactionTestCase):
+    """Hundreds of simultaneous bookings against one departure."""
+
+    def setUp(self):
+        self.users = [CustomUser.objects.create_user(username=f'rush{n}', password='pass12345') for n in range(10)]
+        tour = Tour.objects.create(name='Flash Sale', location='Goa', description='Beach', duration_days=3, price=100)
+        self.tour_date = TourDate.objects.create(tour=tour, start_date=date.today() + timedelta(days=30), capacity=40)
+
+    def assert_not_oversold(self, run):
+        self.assertEqual(run.errors, [])
+        self.tour_date.refresh_from_db()
+        self.assertLessEqual(self.tour_date.seats_booked, self.tour_date.capacity)
+        self.assertEqual(self.tour_date.seats_booked, run.seats_reserved)
+        self.assertEqual(actual_seat_counts([self.tour_date.pk]).get(self.tour_date.pk, 0), run.seats_reserved)
+        self.assertEqual(Booking.objects.filter(tour_date=self.tour_date).count(), run.reserved)
+
+    def test_single_seat_rush_sells_exactly_capacity(self):
+        run = run_concurrent_reservations(self.tour_date, self.users, attempts=300, workers=20)
+
+        self.assert_not_oversold(run)
+        self.assertEqual(run.reserved, 40)
+        self.assertEqual(run.rejected, 260)
+
+    def test_group_bookings_never_oversell(self):
+        run = run_concurrent_reservations(self.tour_date, self.users, attempts=200, workers=20, seats=3)
+
+        self.assert_not_oversold(run)
+        self.assertEqual(run.seats_reserved, 39)  # 13 groups of 3 fit in 40 seats
+
+    def test_rush_keeps_the_revenue_rollup_exact(self):
+        # Every booking moves the same (today, tour, Pending, Pending) rollup key
+        TourDate.objects.filter(pk=self.tour_date.pk).update(capacity=1000)
+        run = run_concurrent_reservations(self.tour_date, self.users, attempts=300, workers=20)
+
+        self.assertEqual(run.errors, [])
+        self.assertEqual(run.reserved, 300)
+        self.assertEqual(stored_rollup(), actual_rollup())
+        self.assertGreater(DailyRevenue.objects.filter(tour=self.tour_date.tour_id).count(), 1)  # spread over shards
+
+
+class AdminBookingListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user(username='staff', password='pass12345', is_staff=True)
+        cls.tour = Tour.objects.create(name='Kerala Backwaters', location='Alleppey', description='Houseboats', duration_days=4, price=100)
+        cls.tour_date = TourDate.objects.create(tour=cls.tour, start_date=date.today() + timedelta(days=30), capacity=500)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def add_bookings(self, count):
+        for n in range(count):
+            user = CustomUser.objects.create_user(username=f'guest{CustomUser.objects.count()}', email=f'g{n}@example.com')
+            Booking.objects.create(user=user, tour=self.tour, tour_date=self.tour_date, transaction_id=f'UPI{user.pk:06d}')
+
+    def count_queries(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('admin_booking_list'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.add_bookings(3)
+        few, response = self.count_queries()
+        self.assertEqual(len(response.context['bookings']), 3)
+
+        self.add_bookings(40)
+        many, response = self.count_queries()
+        self.assertEqual(len(response.context['bookings']), 25)
+
+        self.assertEqual(few, many)
+
+    def test_search_matches_id_username_prefix_tour_and_transaction(self):
+        self.add_bookings(12)
+        booking = Booking.objects.select_related('user').order_by('pk')[5]
+
+        def found(query):
+            _, response = self.count_queries(q=query)
+            return {b.pk for b in response.context['bookings']}
+
+        self.assertIn(booking.pk, found(str(booking.pk)))
+        self.assertIn(booking.pk, found(f'#{booking.pk}'))
+        self.assertEqual(found(booking.transaction_id), {booking.pk})
+        self.assertIn(booking.pk, found(booking.user.username))
+        self.assertEqual(len(found('gue')), 12)
+        self.assertEqual(len(found('backwater')), 12)
+        # A substring of the username is not a prefix
+        self.assertNotIn(booking.pk, found(booking.user.username[2:]))
+
+    def test_total_count_stops_at_the_limit(self):
+        self.add_bookings(4)
+        self.assertEqual(self.count_queries()[1].context['total_count'], 4)
+        with mock.patch('bookings.views.ADMIN_LIST_COUNT_LIMIT', 3):
+            _, response = self.count_queries()
+        self.assertEqual(response.context['total_count'], '3+')
+        self.assertContains(response, '3+ Bookings')
+
+    def test_csv_export_streams_the_filtered_list(self):
+        self.add_bookings(30)
+        Booking.objects.filter(pk__in=Booking.objects.order_by('pk').values('pk')[:4]).update(status='Cancelled')
+
+        response = self.client.get(reverse('admin_booking_export', args=['csv']), {'status': 'Cancelled'})
+
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(lines[0].split(',')[:2], ['Booking ID', 'Username'])
+        self.assertEqual(len(lines), 1 + 4)
+
+    def test_xlsx_export_is_a_valid_workbook(self):
+        self.add_bookings(5)
+        Booking.objects.filter(pk=Booking.objects.order_by('pk').first().pk).update(transaction_id='=HYPERLINK("x")')
+
+        # A small row limit, so the rows roll over onto a second sheet
+        with mock.patch('bookings.exports.XLSX_MAX_ROWS', 4):
+            response = self.client.get(reverse('admin_booking_export', args=['xlsx']))
+            content = b''.join(response.streaming_content)
+        response.close()
+
+        self.assertIn('.xlsx', response['Content-Disposition'])
+        workbook = openpyxl.load_workbook(BytesIO(content))
+        self.assertEqual(workbook.sheetnames, ['Sheet1', 'Sheet2'])
+        rows = [row for sheet in workbook for row in sheet.iter_rows(values_only=True)]
+        self.assertEqual(rows[0][:3], ('Booking ID', 'Username', 'Email'))
+        self.assertEqual(rows.count(rows[0]), 2)  # each sheet has the header
+
+        bookings = [row for row in rows if row != rows[0]]
+        self.assertEqual(sorted(row[0] for row in bookings), sorted(Booking.objects.values_list('pk', flat=True)))
+        first = min(bookings)
+        self.assertEqual(first[9], '=HYPERLINK("x")')  # stored as text, not a formula
+        self.assertEqual(first[4].date(), self.tour_date.start_date)  # a date cell, not a string
+
+
+class SeatCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = CustomUser.objects.create_user(username='counted', password='pass12345')
+        cls.tour = Tour.objects.create(name='Hampi Ruins', location='Hampi', description='Boulders', duration_days=2, price=100)
+        cls.tour_date = TourDate.objects.create(tour=cls.tour, start_date=date.today() + timedelta(days=25), capacity=10)
+
+    def writes(self, action):
+        """The data-changing statements `action` runs, in order."""
+        with CaptureQueriesContext(connection) as ctx:
+            action()
+        return [query['sql'] for query in ctx.captured_queries if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+
+    def test_seat_claim_is_the_last_write(self):
+        # Nothing else may run while the departure row is locked
+        writes = self.writes(lambda: Booking.objects.create(user=self.customer, tour=self.tour, tour_date=self.tour_date))
+        self.assertIn('"tours_tourdate"', writes[-1])
+        self.assertEqual(sum('"tours_tourdate"' in sql for sql in writes), 1)
+
+        booking = Booking.objects.get()
+        writes = self.writes(lambda: apply_transition('reject_payment', [booking.pk]))  # releases the seat
+        self.assertIn('"tours_tourdate"', writes[-1])
+
+        booking = Booking.objects.create(user=self.customer, tour=self.tour, tour_date=self.tour_date)
+        writes = self.writes(booking.delete)
+        self.assertIn('"tours_tourdate"', writes[-1])
+
+    def counters(self, *tour_dates):
+        return [TourDate.objects.get(pk=tour_date.pk).seats_booked for tour_date in tour_dates]
+
+    def test_counters_follow_every_booking_change(self):
+        other_date = TourDate.objects.create(tour=self.tour, start_date=self.tour_date.start_date + timedelta(days=7), capacity=10)
+        booking = Booking.objects.create(user=self.customer, tour=self.tour, tour_date=self.tour_date, number_of_people=3)
+        self.assertEqual(self.counters(self.tour_date, other_date), [3, 0])
+
+        booking.number_of_people = 5
+        booking.save()
+        self.assertEqual(self.counters(self.tour_date, other_date), [5, 0])
+
+        booking.tour_date = other_date
+        booking.save()
+        self.assertEqual(self.counters(self.tour_date, other_date), [0, 5])
+
+        booking.status = 'Cancelled'  # releases the seats
+        booking.save()
+        self.assertEqual(self.counters(self.tour_date, other_date), [0, 0])
+
+        booking.status = 'Pending'
+        booking.save()
+        self.assertEqual(self.counters(self.tour_date, other_date), [0, 5])
+
+        booking.delete()
+        self.assertEqual(self.counters(self.tour_date, other_date), [0, 0])
+
+    def test_rebuild_repairs_a_corrupted_counter(self):
+        Booking.objects.create(user=self.customer, tour=self.tour, tour_date=self.tour_date, number_of_people=4)
+        TourDate.objects.filter(pk=self.tour_date.pk).update(seats_booked=9, seats_held=2)  # an edit that bypassed the signals
+
+        with self.assertRaisesMessage(CommandError, '1 of 1 tour dates have drifted'):
+            call_command('rebuild_seat_counts', check=True, stdout=StringIO())
+
+        output = StringIO()
+        call_command('rebuild_seat_counts', stdout=output)
+        self.assertIn('(1 corrected)', output.getvalue())
+        self.tour_date.refresh_from_db()
+        self.assertEqual((self.tour_date.seats_booked, self.tour_date.seats_held), (4, 0))
+        call_command('rebuild_seat_counts', check=True, stdout=StringIO())
+
+
+class BulkTransitionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user(username='staff', password='pass12345', is_staff=True)
+        cls.customer = CustomUser.objects.create_user(username='guest', password='pass12345')
+        cls.tour = Tour.objects.create(name='Rann Utsav', location='Kutch', description='Salt desert', duration_days=3, price=100)
+        cls.tour_date = TourDate.objects.create(tour=cls.tour, start_date=date.today() + timedelta(days=20), capacity=50)
+
+    def add_bookings(self, count, **fields):
+        return [
+            Booking.objects.create(user=self.customer, tour=self.tour, tour_date=self.tour_date, number_of_people=2, **fields).pk
+            for _ in range(count)
+        ]
+
+    def test_only_eligible_bookings_move(self):
+        pending = self.add_bookings(3)
+        confirmed = self.add_bookings(1, status='Confirmed', payment_status='Paid')
+
+        result = apply_transition('verify_payment', pending + confirmed + [999999])
+
+        self.assertEqual(result.updated, pending)
+        self.assertEqual(result.skipped, sorted(confirmed + [999999]))
+        self.assertEqual(Booking.objects.filter(status='Confirmed', payment_status='Paid').count(), 4)
+
+    def test_seat_counter_moves_once_per_batch(self):
+        pending = self.add_bookings(5)
+
+        with CaptureQueriesContext(connection) as ctx:
+            result = apply_transition('reject_payment', pending)
+
+        self.assertEqual(len(result.updated), 5)
+        self.tour_date.refresh_from_db()
+        self.assertEqual(self.tour_date.seats_booked, 0)
+        self.assertEqual(actual_seat_counts(), {})
+        counter_updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE') and 'seats_booked' in q['sql']]
+        self.assertEqual(len(counter_updates), 1)
+
+    def test_bulk_endpoint_reports_skipped_ids(self):
+        pending = self.add_bookings(2)
+        apply_transition('reject_payment', pending[:1])  # a colleague got there first
+        self.client.force_login(self.staff)
+
+        response = self.client.post(
+            reverse('admin_bulk_booking_action'),
+            {'action': 'verify_payment', 'booking_ids': pending},
+            HTTP_ACCEPT='application/json',
+        )
+
+        self.assertEqual(response.json(), {'action': 'verify_payment', 'updated': pending[1:], 'skipped': pending[:1]})
+
+
+class SeatHoldTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = CustomUser.objects.create_user(username='payer', password='pass12345')
+        cls.rival = CustomUser.objects.create_user(username='rival', password='pass12345')
+        cls.tour = Tour.objects.create(name='Valley of Flowers', location='Chamoli', description='Meadows', duration_days=5, price=200)
+        cls.tour_date = TourDate.objects.create(tour=cls.tour, start_date=date.today() + timedelta(days=25), capacity=4)
+
+    def seats(self):
+        self.tour_date.refresh_from_db()
+        return self.tour_date.seats_held, self.tour_date.seats_booked
+
+    def book(self, hold, seats=3):
+        return book_from_hold(hold.pk, user=self.customer, tour=self.tour, tour_date=self.tour_date, number_of_people=seats)
+
+    def expire(self, hold):
+        SeatHold.objects.filter(pk=hold.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    @override_settings(SEAT_HOLD_TTL=120)
+    def test_hold_lasts_the_ttl_and_becomes_the_booking(self):
+        before = timezone.now()
+        hold = place_hold(self.customer, self.tour_date, 3)
+        self.assertEqual(self.seats(), (3, 0))
+        self.assertAlmostEqual((hold.expires_at - before).total_seconds(), 120, delta=5)
+
+        self.book(hold)
+
+        self.assertEqual(self.seats(), (0, 3))
+        self.assertFalse(SeatHold.objects.exists())
+
+    def test_own_expired_unswept_hold_still_books(self):
+        hold = place_hold(self.customer, self.tour_date, 3)
+        self.expire(hold)
+
+        # Only 1 seat is "left" while the stale hold counts; it must not block its owner
+        self.book(hold)
+
+        self.assertEqual(self.seats(), (0, 3))
+        self.assertFalse(SeatHold.objects.exists())
+
+    def test_expired_hold_loses_seats_taken_meanwhile(self):
+        hold = place_hold(self.customer, self.tour_date, 3)
+        self.expire(hold)
+        place_hold(self.rival, self.tour_date, 2)  # releases the expired hold first
+
+        with self.assertRaises(SeatsUnavailable):
+            self.book(hold)
+        self.assertEqual(self.seats(), (2, 0))
+
+    def test_holds_never_oversell(self):
+        place_hold(self.rival, self.tour_date, 3)
+
+        with self.assertRaises(SeatsUnavailable) as raised:
+            place_hold(self.customer, self.tour_date, 2)
+
+        self.assertEqual(raised.exception.remaining, 1)
+        self.assertEqual(self.seats(), (3, 0))
+        self.assertEqual(SeatHold.objects.count(), 1)
+
+    def test_sweeper_releases_only_expired_holds(self):
+        stale = place_hold(self.rival, self.tour_date, 3)
+        place_hold(self.customer, self.tour_date, 1)
+        self.expire(stale)
+
+        output = StringIO()
+        call_command('expire_seat_holds', stdout=output)
+
+        self.assertIn('Released 1 expired seat holds.', output.getvalue())
+        self.assertEqual(self.seats(), (1, 0))
+        self.assertEqual(expire_holds(), 0)
+
+
+class TicketCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = CustomUser.objects.create_user(username='ticketed', password='pass12345', first_name='Isha')
+        tour = Tour.objects.create(name='Ladakh Road Trip', location='Leh', description='Passes', duration_days=7, price=1500)
+        tour_date = TourDate.objects.create(tour=tour, start_date=date.today() + timedelta(days=35), capacity=20)
+        cls.booking = Booking.objects.create(
+            user=cls.customer, tour=tour, tour_date=tour_date, number_of_people=2,
+            status='Confirmed', payment_status='Paid', transaction_id='UPI778899',
+        )
+
+    def load(self):
+        return Booking.objects.select_related('user', 'tour', 'tour_date').get(pk=self.booking.pk)
+
+    def download(self, **headers):
+        self.client.force_login(self.customer)
+        response = self.client.get(reverse('download_ticket', args=[self.booking.pk]), **headers)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, content
+
+    def test_suite_renders_inline_outside_the_checkout(self):
+        from bondvoyage import settings as shipped
+
+        self.assertGreater(shipped.TICKET_RENDER_WORKERS, 0)  # off the request path, whatever DEBUG says
+        self.assertEqual(settings.TICKET_RENDER_WORKERS, 0)
+        self.assertFalse(str(settings.TICKET_CACHE_DIR).startswith(str(settings.BASE_DIR)))
+
+    def test_unchanged_booking_reuses_the_cached_pdf(self):
+        path, etag = ticket_file(self.load())
+        with open(path, 'rb') as handle:
+            self.assertTrue(handle.read().startswith(b'%PDF'))
+        with open(path, 'wb') as handle:
+            handle.write(b'%PDF-cached')  # a re-render would overwrite this
+
+        self.assertEqual(ticket_file(self.load()), (path, etag))
+        _, content = self.download()
+        self.assertEqual(content, b'%PDF-cached')
+
+    def test_changed_booking_gets_a_new_fingerprint(self):
+        old_path, old_etag = ticket_file(self.load())
+
+        booking = self.load()
+        booking.number_of_people = 3
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.save()  # schedules the re-render (inline in tests)
+
+        context = ticket_context(self.load())
+        new_path = ticket_path(self.booking.pk, context)
+        self.assertNotEqual(fingerprint(context), old_etag)
+        self.assertTrue(os.path.exists(new_path))
+        self.assertFalse(os.path.exists(old_path))
+        self.assertEqual(ticket_file(self.load()), (new_path, fingerprint(context)))
+
+    def test_etag_answers_304(self):
+        response, content = self.download()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(content.startswith(b'%PDF'))
+
+        response, _ = self.download(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        response, _ = self.download(HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+
+class TicketRendererTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = CustomUser.objects.create_user(
+            username='twin', first_name='Meera', last_name='Rao', email='meera@example.com',
+        )
+        tour = Tour.objects.create(name='Coorg Coffee Trail', location='Madikeri', description='Estates', duration_days=3, price=750)
+        tour_date = TourDate.objects.create(tour=tour, start_date=date(2026, 12, 5), capacity=20)
+        cls.booking = Booking.objects.create(
+            user=customer, tour=tour, tour_date=tour_date, number_of_people=2,
+            status='Confirmed', payment_status='Paid', transaction_id='UPI424242',
+        )
+
+    def text(self, pdf):
+        self.assertTrue(pdf.startswith(b'%PDF'))
+        reader = PdfReader(BytesIO(pdf))
+        self.assertEqual(len(reader.pages), 1)
+        return ' '.join(' '.join(page.extract_text().split()) for page in reader.pages)
+
+    def test_reportlab_ticket_carries_the_template_fields(self):
+        context = ticket_context(Booking.objects.select_related('user', 'tour', 'tour_date').get(pk=self.booking.pk))
+        template = self.text(tickets.render_ticket(context, 'xhtml2pdf'))
+        canvas = self.text(tickets.render_ticket(context, 'reportlab'))
+
+        fields = [
+            f'#{self.booking.pk}', 'CONFIRMED', 'Coorg Coffee Trail', 'Madikeri', 'Meera Rao', 'meera@example.com',
+            'December 05, 2026', '3 Days', '2 Person(s)', str(self.booking.total_price), 'UPI424242',
+        ]
+        for field in fields:
+            with self.subTest(field=field):
+                self.assertIn(field, template)
+                self.assertIn(field, canvas)
+
+    def test_benchmark_command_runs_both_renderers(self):
+        out = StringIO()
+        call_command('benchmark_ticket_renderers', count=2, stdout=out)
+        self.assertIn('xhtml2pdf: 2 tickets', out.getvalue())
+        self.assertIn('reportlab: 2 tickets', out.getvalue())
+
+
+class DepartureManifestTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_superuser(username='root', password='pass12345')
+        tour = Tour.objects.create(name='Andaman Islands', location='Port Blair', description='Reefs', duration_days=5, price=2000)
+        cls.tour_date = TourDate.objects.create(tour=tour, start_date=date.today() + timedelta(days=15), capacity=30)
+        cls.bookings = []
+        for n, status in enumerate(['Confirmed', 'Completed', 'Pending']):
+            user = CustomUser.objects.create_user(username=f'diver{n}', first_name='Diver', last_name=str(n), email=f'd{n}@example.com')
+            cls.bookings.append(Booking.objects.create(
+                user=user, tour=tour, tour_date=cls.tour_date, number_of_people=n + 1,
+                status=status, payment_status='Paid' if status != 'Pending' else 'Pending', transaction_id=f'UPI55{n}',
+            ))
+
+    def download(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(
+            reverse('admin:tours_tourdate_changelist'),
+            {'action': 'download_manifest', '_selected_action': [self.tour_date.pk]},
+        )
+        self.assertTrue(response.streaming)
+        self.assertIn('manifest_andaman-islands_', response['Content-Disposition'])
+        return zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+
+    def test_zip_holds_passenger_lists_and_every_ticket(self):
+        archive = self.download()
+        confirmed, completed, _ = self.bookings
+
+        self.assertEqual(archive.namelist(), [
+            'passenger_list.pdf',
+            'passenger_list.csv',
+            f'tickets/Ticket_{confirmed.pk}_diver-0.pdf',
+            f'tickets/Ticket_{completed.pk}_diver-1.pdf',
+        ])
+        self.assertIsNone(archive.testzip())
+        self.assertTrue(archive.read(f'tickets/Ticket_{confirmed.pk}_diver-0.pdf').startswith(b'%PDF'))
+
+        rows = list(csv.reader(archive.read('passenger_list.csv').decode('utf-8-sig').splitlines()))
+        self.assertEqual(rows[0][:5], ['Booking', 'Lead Traveler', 'Email', 'Phone', 'Guests'])
+        self.assertEqual(rows[1:], [
+            [f'#{confirmed.pk}', 'Diver 0', 'd0@example.com', '', '1', 'Confirmed', 'Paid', 'UPI550'],
+            [f'#{completed.pk}', 'Diver 1', 'd1@example.com', '', '2', 'Completed', 'Paid', 'UPI551'],
+        ])
+
+    def test_a_failed_ticket_is_listed_not_a_truncated_zip(self):
+        confirmed, completed, _ = self.bookings
+        render = tickets.render_ticket
+
+        def flaky(context, renderer=None):
+            return None if context['booking']['id'] == confirmed.pk else render(context, renderer)
+
+        with mock.patch('bookings.tickets.render_ticket', side_effect=flaky), self.assertLogs('bookings.tickets', 'ERROR'):
+            archive = self.download()
+
+        self.assertIsNone(archive.testzip())  # still a complete, readable archive
+        self.assertEqual(archive.namelist(), [
+            'passenger_list.pdf', 'passenger_list.csv', f'tickets/Ticket_{completed.pk}_diver-1.pdf', 'MISSING_TICKETS.txt',
+        ])
+        self.assertIn(f'#{confirmed.pk}: Could not render ticket', archive.read('MISSING_TICKETS.txt').decode())
+
+
+class RevenueRollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = CustomUser.objects.create_user(username='payer', password='pass12345')
+        cls.tour = Tour.objects.create(name='Hampi Ruins', location='Hampi', description='Boulders', duration_days=2, price=250)
+        cls.tour_date = TourDate.objects.create(tour=cls.tour, start_date=date.today() + timedelta(days=15), capacity=100)
+
+    def book(self, people=2, **fields):
+        return Booking.objects.create(user=self.customer, tour=self.tour, tour_date=self.tour_date, number_of_people=people, **fields)
+
+    def assertInSync(self):
+        self.assertEqual(stored_rollup(), actual_rollup())
+
+    def test_saves_deletes_and_bulk_actions_keep_the_rollup_exact(self):
+        first, second, third = self.book(1), self.book(2), self.book(4)
+        self.assertInSync()
+
+        second.number_of_people = 3
+        second.save()
+        Booking.objects.get(pk=third.pk).delete()
+        apply_transition('verify_payment', [first.pk, second.pk])
+        apply_transition('refund_cancel', [first.pk])
+        self.assertInSync()
+
+        self.assertEqual(revenue_total('Paid'), 750)
+        self.assertEqual(revenue_total('Refunded'), 250)
+        self.assertEqual(filtered_total(None, date.today(), date.today()), 1000)
+        self.assertEqual(filtered_total('Paid', date.today() + timedelta(days=1)), 0)
+
+    def test_same_key_bookings_spread_over_shards(self):
+        with mock.patch('bookings.revenue.random.randrange', side_effect=[0, 1, 2]):
+            bookings = [self.book(1), self.book(2), self.book(3)]
+        self.assertEqual(sorted(DailyRevenue.objects.values_list('shard', flat=True)), [0, 1, 2])
+        self.assertInSync()
+        self.assertEqual(filtered_total('Pending'), 1500)
+
+        # A removal moves an existing row rather than opening a negative shard
+        with mock.patch('bookings.revenue.random.randrange', return_value=5):
+            bookings[1].delete()
+        self.assertInSync()
+        self.assertFalse(DailyRevenue.objects.filter(shard=5).exists())
+        self.assertFalse(DailyRevenue.objects.filter(bookings__lt=0).exists())
+
+        DailyRevenue.objects.filter(shard=2).update(amount=1)  # drift
+        call_command('rebuild_revenue_rollup', stdout=StringIO())
+        self.assertInSync()
+        self.assertEqual(list(DailyRevenue.objects.values_list('shard', 'bookings')), [(0, 2)])  # folded
+
+    def test_rebuild_command_repairs_drift(self):
+        self.book(2)
+        Booking.objects.update(total_price=999)  # bypasses the signals
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_revenue_rollup', '--check', stdout=StringIO())
+        call_command('rebuild_revenue_rollup', '--batch-days', '1', stdout=StringIO())
+
+        self.assertInSync()
+        call_command('rebuild_revenue_rollup', '--check', stdout=StringIO())
+
+
+class StatementReconciliationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = CustomUser.objects.create_user(username='upi', password='pass12345')
+        tour = Tour.objects.create(name='Spiti Valley', location='Spiti', description='Monasteries', duration_days=8, price=500)
+        tour_date = TourDate.objects.create(tour=tour, start_date=date.today() + timedelta(days=40), capacity=100)
+        cls.bookings = {
+            reference: Booking.objects.create(user=customer, tour=tour, tour_date=tour_date, number_of_people=people, transaction_id=reference)
+            for reference, people in [('upi-1001', 1), ('UPI 1002', 2), ('UPI1003', 1), ('UPI1004', 1), ('UPI1005', 1)]
+        }
+        apply_transition('verify_payment', [cls.bookings['UPI1005'].pk])
+
+    def statement(self):
+        return (
+            "Account,XXXX1234\n"
+            "\n"
+            "Date,Narration,UTR / Ref No,Credit Amount\n"
+            "2026-10-01,Payment,UPI1001,500.00\n"
+            "2026-10-01,Payment,upi-1002,\"1,000\"\n"
+            "2026-10-02,Payment,UPI1003,450.00\n"
+            "2026-10-02,Payment,UPI1004,500\n"
+            "2026-10-02,Payment,UPI1004,500\n"
+            "2026-10-03,Payment,UPI1005,500\n"
+            "2026-10-03,Payment,UPI9999,500\n"
+            "2026-10-03,Payment,,500\n"
+        )
+
+    def test_lines_are_bucketed(self):
+        result = reconcile(SimpleUploadedFile('statement.csv', self.statement().encode()))
+
+        self.assertEqual(result.lines, 8)
+        self.assertEqual(result.matched, sorted([self.bookings['upi-1001'].pk, self.bookings['UPI 1002'].pk]))
+        self.assertEqual(result.counts(), {
+            'amount_mismatch': 1, 'duplicate': 2, 'already_handled': 1, 'unknown': 1, 'unreadable': 1,
+        })
+        self.assertEqual(Booking.objects.filter(payment_status='Paid').count(), 1)  # preview writes nothing
+
+    def test_xlsx_statement_verifies_clean_matches(self):
+        output = BytesIO()
+        rows = [line.split(',') for line in self.statement().replace('"1,000"', '1000').splitlines()[2:]]
+        workbook = xlsxwriter.Workbook(output)
+        sheet = workbook.add_worksheet()
+        for number, row in enumerate(rows):
+            sheet.write_row(number, 0, row)
+        workbook.close()
+
+        result = reconcile(SimpleUploadedFile('statement.xlsx', output.getvalue()), verify=True)
+
+        self.assertEqual(len(result.verified), 2)
+        self.assertEqual(
+            set(Booking.objects.filter(payment_status='Paid').values_list('transaction_id', flat=True)),
+            {'upi-1001', 'UPI 1002', 'UPI1005'},
+        )
+
+    def test_amounts_with_a_currency_prefix(self):
+        for cell, amount in [
+            ('Rs. 1,000', '1000.00'), ('Rs.1,000.50', '1000.50'), ('INR 1,000', '1000.00'),
+            ('₹1,000', '1000.00'), ('1,000.00 Cr', '1000.00'), ('-500', '-500.00'), (1000.5, '1000.50'),
+        ]:
+            with self.subTest(cell=cell):
+                self.assertEqual(parse_amount(cell), Decimal(amount))
+        self.assertIsNone(parse_amount('Rs.'))
+
+
+class ViewBenchmarkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = CustomUser.objects.create_user(username='regular', password='pass12345')
+        tour = Tour.objects.create(name='Hampi Heritage Walk', location='Hampi', description='Ruins', duration_days=2, price=800)
+        tour_date = TourDate.objects.create(tour=tour, start_date=date.today() + timedelta(days=40), capacity=100)
+        Booking.objects.create(user=customer, tour=tour, tour_date=tour_date, number_of_people=2)
+
+    def benchmark(self, *args, scenarios=('home', 'payment_page', 'admin_dashboard')):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command(
+                'benchmark_views', '--iterations', '3', '--warmup', '1', '--output', output,
+                *[arg for name in scenarios for arg in ('--scenario', name)],
+                *args, stdout=StringIO(), stderr=StringIO(),
+            )
+            with open(output) as handle:
+                return json.load(handle)
+
+    def test_reports_every_metric_and_cleans_up(self):
+        results = self.benchmark()
+
+        self.assertEqual(list(results['scenarios']), ['home', 'payment_page', 'admin_dashboard'])
+        payment = results['scenarios']['payment_page']
+        self.assertEqual(payment['statuses'], {'302': 3})  # each request booked a seat
+        self.assertGreater(payment['queries_max'], 0)
+        self.assertLessEqual(payment['p50_ms'], payment['p99_ms'])
+        self.assertEqual(results['meta']['dataset']['tours'], 1)
+
+        # The scratch accounts and their bookings are gone again
+        self.assertFalse(CustomUser.objects.filter(username__startswith='bench-').exists())
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(TourDate.objects.get().seats_booked, 2)
+
+    def test_catalog_facets_miss_the_grid_cache(self):
+        facets = self.benchmark(scenarios=['catalog_facets'])['scenarios']['catalog_facets']
+        self.assertEqual(facets['statuses'], {'200': 3})
+        self.assertGreater(facets['queries_mean'], 0)  # the grid and its facets were computed, not read from the cache
+
+    def test_regressions_against_the_baseline_fail_the_run(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as handle:
+            baseline = self.benchmark()
+            baseline['scenarios']['admin_dashboard']['queries_max'] = 1
+            json.dump(baseline, handle)
+        self.addCleanup(os.remove, handle.name)
+
+        with self.assertRaisesMessage(CommandError, '1 regressions'):
+            self.benchmark('--baseline', handle.name, '--threshold', 'p95_ms=100000', '--threshold', 'peak_kib=100000')
+        self.benchmark('--baseline', handle.name, '--threshold', 'queries_max=100000',
+                       '--threshold', 'p95_ms=100000', '--threshold', 'peak_kib=100000')
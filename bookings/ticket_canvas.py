@@ -0,0 +1,134 @@
+"""
+Ticket renderer that draws ticket_pdf.html's layout straight onto a
+reportlab canvas, skipping the HTML parsing and layout of xhtml2pdf.
+Selected with TICKET_RENDERER = 'reportlab' (see bookings.tickets).
+
+Sizes and colours follow the template's stylesheet, converted the way
+xhtml2pdf does (1px = 0.75pt, 1cm page margins); keep the two in step
+when the ticket changes.
+"""
+from io import BytesIO
+
+from django.utils.dateformat import format as format_date
+from reportlab.lib.colors import HexColor
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfgen import canvas
+
+BLUE = HexColor('#0056b3')
+TEXT = HexColor('#333333')
+MUTED = HexColor('#666666')
+LABEL = HexColor('#555555')
+FAINT = HexColor('#999999')
+RULE = HexColor('#dddddd')
+STATUS_BG = HexColor('#d4edda')
+STATUS_BORDER = HexColor('#c3e6cb')
+STATUS_TEXT = HexColor('#155724')
+
+PX = 0.75
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 1 * cm
+CONTENT_WIDTH = PAGE_WIDTH - 2 * MARGIN
+
+
+def _text(pdf, x, y, text, font='Helvetica', size=14 * PX, color=TEXT, width=None):
+    """Draws (wrapped to `width`) text with its top at y; returns the y below it."""
+    pdf.setFont(font, size)
+    pdf.setFillColor(color)
+    lines = simpleSplit(str(text), font, size, width) if width else [str(text)]
+    for line in lines or ['']:
+        y -= size
+        pdf.drawString(x, y, line)
+        y -= size * 0.3
+    return y
+
+
+def _field(pdf, x, y, label, value, width, size=14 * PX, color=TEXT):
+    """A .label / .value pair from the template."""
+    y = _text(pdf, x, y, label.upper(), 'Helvetica-Bold', 10 * PX, LABEL, width)
+    return _text(pdf, x, y - 12, value, size=size, color=color, width=width) - 12
+
+
+def draw_ticket(context):
+    """PDF bytes for a ticket context (bookings.tickets.ticket_context)."""
+    booking, tour, user = context['booking'], context['tour'], context['user']
+    tour_date = booking['tour_date']
+
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4, pageCompression=1)
+    pdf.setTitle("Travel Ticket")
+    left, right, y = MARGIN, PAGE_WIDTH - MARGIN, PAGE_HEIGHT - MARGIN
+
+    # .header: brand on the left, ticket reference on the right
+    _text(pdf, left, y, "BondVoyage", 'Helvetica-Bold', 24 * PX, BLUE)
+    _text(pdf, left, y - 28, "Your Adventure Awaits", size=12 * PX, color=MUTED)
+    pdf.setFillColor(TEXT)
+    pdf.setFont('Helvetica-Bold', 10)
+    pdf.drawRightString(right, y - 10, "E-TICKET")
+    pdf.setFont('Helvetica', 12 * PX)
+    pdf.drawRightString(right, y - 37, f"Ref: #{booking['id']}")
+    y -= 50
+    pdf.setStrokeColor(BLUE)
+    pdf.setLineWidth(2 * PX)
+    pdf.line(left, y, right, y)
+    y -= 20
+
+    # Tour (60%) and .status-box (40%)
+    tour_width = CONTENT_WIDTH * 0.6 - 10
+    below = _field(pdf, left + 5, y, "Tour Package", tour['name'], tour_width, size=18 * PX, color=HexColor('#000000'))
+    below = _field(pdf, left + 5, below, "Location", tour['location'], tour_width)
+
+    box_x, box_width, box_height = left + CONTENT_WIDTH * 0.6, CONTENT_WIDTH * 0.4 - 5, 22
+    pdf.setFillColor(STATUS_BG)
+    pdf.setStrokeColor(STATUS_BORDER)
+    pdf.setLineWidth(PX)
+    pdf.rect(box_x, y - box_height, box_width, box_height, fill=1, stroke=1)
+    pdf.setFillColor(STATUS_TEXT)
+    pdf.setFont('Helvetica-Bold', 10 * PX)
+    pdf.drawCentredString(box_x + box_width / 2, y - 12, f"STATUS: {booking['status'].upper()}")
+
+    y = min(below, y - box_height) - 8
+    pdf.setStrokeColor(HexColor('#000000'))
+    pdf.setLineWidth(1)
+    pdf.line(left, y, right, y)
+    y -= 12
+
+    # Two rows of three columns
+    column = CONTENT_WIDTH / 3
+    start_date = format_date(tour_date['start_date'], "F d, Y") if tour_date else ""
+    rows = [
+        [
+            ("Lead Traveler", f"{user['first_name']} {user['last_name']}", user['email']),
+            ("Tour Date", start_date, None),
+            ("Duration", f"{tour['duration_days']} Days", None),
+        ],
+        [
+            ("Total Guests", f"{booking['number_of_people']} Person(s)", None),
+            ("Total Amount Paid", f"Rs. {booking['total_price']}", None),
+            ("Transaction Ref", booking['transaction_id'] or "", None),
+        ],
+    ]
+    for row in rows:
+        bottoms = []
+        for index, (label, value, extra) in enumerate(row):
+            x = left + 5 + column * index
+            bottom = _field(pdf, x, y, label, value, column - 10)
+            if extra:
+                bottom = _text(pdf, x, bottom + 4, extra, size=12 * PX, width=column - 10) - 8
+            bottoms.append(bottom)
+        y = min(bottoms)
+
+    # .footer
+    y -= 30
+    pdf.setStrokeColor(RULE)
+    pdf.setLineWidth(PX)
+    pdf.line(left, y, right, y)
+    pdf.setFont('Helvetica', 10 * PX)
+    pdf.setFillColor(FAINT)
+    pdf.drawCentredString(PAGE_WIDTH / 2, y - 18, "This is a computer-generated receipt. Please present this at the venue.")
+    pdf.drawCentredString(PAGE_WIDTH / 2, y - 28, "BondVoyage Tours Pvt Ltd.")
+
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
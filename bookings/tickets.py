@@ -0,0 +1,214 @@
+"""
+Ticket PDFs, rendered once and served from disk.
+
+A ticket only shows a handful of booking, tour and user fields. Those are
+collected into a plain dict (ticket_context) whose hash, the fingerprint,
+names the cached file:
+
+    TICKET_CACHE_DIR/<booking id>/<fingerprint>.pdf
+
+so a ticket is re-rendered only when something printed on it changes,
+and a stale file can never be served. bookings.signals schedules
+rendering after commit whenever a Confirmed/Completed booking, its tour,
+date or customer is saved; the work runs in a process pool
+(TICKET_RENDER_WORKERS) so no web request pays for it. download_ticket
+renders on demand only if the file is missing.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .ticket_canvas import draw_ticket
+from .utils import render_to_pdf
+
+logger = logging.getLogger(__name__)
+
+TICKET_STATUSES = ('Confirmed', 'Completed')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def ticket_context(booking):
+    """Everything ticket_pdf.html prints, as plain (picklable) data."""
+    user = booking.user
+    tour = booking.tour
+    return {
+        'booking': {
+            'id': booking.id,
+            'status': booking.status,
+            'number_of_people': booking.number_of_people,
+            'total_price': booking.total_price,
+            'transaction_id': booking.transaction_id,
+            'tour_date': {'start_date': booking.tour_date.start_date} if booking.tour_date_id else None,
+        },
+        'tour': {
+            'name': tour.name,
+            'location': tour.location,
+            'duration_days': tour.duration_days,
+        },
+        'user': {
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'email': user.email,
+        },
+    }
+
+
+def fingerprint(context):
+    # The renderer is part of the key: switching TICKET_RENDERER re-renders
+    payload = json.dumps([settings.TICKET_RENDERER, context], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:20]
+
+
+def ticket_path(booking_id, context):
+    return os.path.join(settings.TICKET_CACHE_DIR, str(booking_id), f"{fingerprint(context)}.pdf")
+
+
+def render_ticket(context, renderer=None):
+    """
+    PDF bytes for one ticket context, or None if rendering failed.
+    'xhtml2pdf' renders ticket_pdf.html; 'reportlab' draws the same layout
+    directly (bookings.ticket_canvas), several times faster.
+    """
+    renderer = renderer or settings.TICKET_RENDERER
+    if renderer == 'reportlab':
+        return draw_ticket(context)
+    if renderer == 'xhtml2pdf':
+        return render_to_pdf('ticket_pdf.html', context)
+    raise ImproperlyConfigured(f"Unknown TICKET_RENDERER {renderer!r}")
+
+
+def store_ticket(context, path):
+    """Renders into `path` atomically and drops older renderings. Returns the path."""
+    pdf = render_ticket(context)
+    if pdf is None:
+        raise ValueError(f"Could not render ticket #{context['booking']['id']}")
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix='.part')
+    with os.fdopen(handle, 'wb') as out:
+        out.write(pdf)
+    os.replace(temporary, path)  # readers never see a half-written file
+
+    for name in os.listdir(directory):
+        if name != os.path.basename(path) and name.endswith('.pdf'):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+    return path
+
+
+def delete_tickets(booking_id):
+    shutil.rmtree(os.path.join(settings.TICKET_CACHE_DIR, str(booking_id)), ignore_errors=True)
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: workers start clean, without the parent's DB connections
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.TICKET_RENDER_WORKERS,
+                mp_context=get_context('spawn'),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def _submit(function, *args):
+    """Runs function(*args) in the pool, or right away when TICKET_RENDER_WORKERS is 0."""
+    if settings.TICKET_RENDER_WORKERS <= 0:
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        except Exception as error:
+            future.set_exception(error)
+        return future
+
+    try:
+        return _get_pool().submit(function, *args)
+    except BrokenProcessPool:  # a worker died; start a fresh pool
+        _reset_pool()
+        return _get_pool().submit(function, *args)
+
+
+def _report(future):
+    if future.exception() is not None:
+        logger.error("Ticket rendering failed", exc_info=future.exception())
+
+
+def schedule_tickets(bookings):
+    """
+    Queues rendering for every ticketed booking in the `bookings` queryset
+    whose current data has no file yet. Returns the number queued.
+    """
+    jobs = []
+    bookings = bookings.filter(status__in=TICKET_STATUSES).select_related('user', 'tour', 'tour_date')
+    for booking in bookings.iterator(chunk_size=500):
+        context = ticket_context(booking)
+        path = ticket_path(booking.id, context)
+        if not os.path.exists(path):
+            jobs.append((context, path))
+
+    for context, path in jobs:
+        _submit(store_ticket, context, path).add_done_callback(_report)
+    return len(jobs)
+
+
+def ticket_files(bookings):
+    """
+    Yields (booking, path, error) for ticketed bookings, in order; error is
+    the exception of a failed render (and path then None). Tickets missing
+    from the cache are all queued on the process pool up front, so they
+    render in parallel while the caller streams the first ones.
+    """
+    queued = []
+    for booking in bookings:
+        context = ticket_context(booking)
+        path = ticket_path(booking.id, context)
+        job = None if os.path.exists(path) else _submit(store_ticket, context, path)
+        queued.append((booking, path, job))
+
+    for booking, path, job in queued:
+        error = job.exception() if job is not None else None
+        if error is not None:
+            logger.error("Ticket #%s could not be rendered", booking.id, exc_info=error)
+            yield booking, None, error
+        else:
+            yield booking, path, None
+
+
+def ticket_file(booking):
+    """
+    Path of the booking's current ticket, rendering it right now when the
+    background render has not happened (yet). Returns (path, fingerprint).
+    """
+    context = ticket_context(booking)
+    path = ticket_path(booking.id, context)
+    if not os.path.exists(path):
+        store_ticket(context, path)
+    return path, fingerprint(context)
@@ -9,7 +9,11 @@ urlpatterns = [
 
     # Admin Booking Management
     path('admin-panel/bookings/', views.admin_booking_list, name='admin_booking_list'),
+    path('admin-panel/bookings/bulk/', views.admin_bulk_booking_action, name='admin_bulk_booking_action'),
+    path('admin-panel/bookings/export.<str:export_format>', views.admin_booking_export, name='admin_booking_export'),
     path('admin-panel/payments/', views.admin_payment_report, name='admin_payment_report'),
+    path('admin-panel/payments/export.<str:export_format>', views.admin_payment_export, name='admin_payment_export'),
+    path('admin-panel/payments/reconcile/', views.admin_reconcile_payments, name='admin_reconcile_payments'),
     
     # Booking Actions (Approve/Cancel/Reject)
     path('staff/booking/<int:booking_id>/<str:action>/', views.admin_update_booking_status, name='admin_booking_action'),
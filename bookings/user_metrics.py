@@ -0,0 +1,67 @@
+"""
+Per-customer booking metrics stored on the user row: CustomUser.booking_count,
+total_paid (Paid bookings) and last_booking. The staff user list sorts by
+them, so they are indexed columns rather than per-row subqueries.
+
+refresh_user_metrics() recomputes them for the given users with a single
+UPDATE of correlated subqueries, each an index range scan on that user's
+own bookings (Booking(user, booking_date) and Booking(user, payment_status,
+total_price)). bookings.signals calls it inside every Booking save/delete
+that changes a metric, bookings.workflow after bulk transitions. Other
+bulk `QuerySet.update()` calls bypass it; `manage.py rebuild_user_metrics
+--check` reports such drift and the command without --check repairs it.
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Booking
+
+METRIC_FIELDS = ('booking_count', 'total_paid', 'last_booking')
+
+
+def metric_expressions():
+    """{field: expression} computing each metric from the Booking table."""
+    mine = Booking.objects.filter(user=OuterRef('pk')).order_by().values('user')
+    return {
+        'booking_count': Coalesce(
+            Subquery(mine.annotate(total=Count('pk')).values('total')), Value(0), output_field=IntegerField(),
+        ),
+        'total_paid': Coalesce(
+            Subquery(mine.filter(payment_status='Paid').annotate(total=Sum('total_price')).values('total')),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+        'last_booking': Subquery(
+            Booking.objects.filter(user=OuterRef('pk')).order_by('-booking_date').values('booking_date')[:1]
+        ),
+    }
+
+
+def refresh_user_metrics(user_ids):
+    """Recomputes the stored metrics of these users."""
+    user_ids = sorted({pk for pk in user_ids if pk})
+    if not user_ids:
+        return
+    users = get_user_model().objects.filter(pk__in=user_ids)
+    with transaction.atomic():
+        # Lock first, so the UPDATE's subqueries (a new snapshot) see every
+        # booking committed by a concurrent writer we waited for
+        list(users.select_for_update().order_by('pk').values_list('pk', flat=True))
+        users.update(**metric_expressions())
+
+
+def drifted_users(user_ids):
+    """[(user_id, stored, actual)] for the users in `user_ids` whose metrics are off."""
+    users = get_user_model().objects.filter(pk__in=user_ids).order_by('pk')
+    actual = users.annotate(**{f'actual_{name}': expression for name, expression in metric_expressions().items()})
+    drifted = []
+    for row in actual.values('pk', *METRIC_FIELDS, *[f'actual_{name}' for name in METRIC_FIELDS]):
+        stored = tuple(row[name] for name in METRIC_FIELDS)
+        computed = tuple(row[f'actual_{name}'] for name in METRIC_FIELDS)
+        if stored != computed:
+            drifted.append((row['pk'], stored, computed))
+    return drifted
@@ -1,32 +1,57 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
-from django.db.models import Sum, Q
+from django.db.models import Sum
 from django.contrib import messages
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
 from datetime import datetime, date
 from tours.models import Tour, TourDate
 from .models import Booking
-from .forms import BookingForm
-from .utils import render_to_pdf
+from .forms import BookingForm, StatementUploadForm
+from .seats import SeatsUnavailable
+from .holds import place_hold, release_hold, book_from_hold
+from .tickets import TICKET_STATUSES, ticket_file
+from .revenue import filtered_total, revenue_chart
+from .stats import booking_stats
+from .reconciliation import MAX_ISSUES_SHOWN, StatementError, reconcile
+from .exports import BOOKING_COLUMNS, PAYMENT_COLUMNS, export_response
+from .workflow import TRANSITIONS, InvalidTransition, apply_transition
+from bondvoyage.pagination import paginate_keyset
 
 @login_required
 def book_tour(request, tour_id):
     tour = get_object_or_404(Tour, id=tour_id)
     
     if request.method == 'POST':
+        # Changing the booking: give the seats of the earlier hold back first
+        previous = request.session.pop('booking_data', None) or {}
+        if previous.get('hold_id'):
+            release_hold(previous['hold_id'], user=request.user)
+
         form = BookingForm(request.POST, tour=tour)
         
         if form.is_valid():
             data = form.cleaned_data
 
-            request.session['booking_data'] = {
-                'tour_id': tour.id,
-                'tour_date_id': data['tour_date'].id, 
-                'number_of_people': data['number_of_people'],
-                'price_per_person': float(tour.price) # Convert Decimal to float for JSON
-            }
-            return redirect('payment_page')
+            # Hold the seats while the customer pays
+            try:
+                hold = place_hold(request.user, data['tour_date'], data['number_of_people'])
+            except SeatsUnavailable as error:
+                form.add_error(None, f"Sorry, only {error.remaining} seats are left for this date." if error.remaining else "Sorry, this date is fully booked.")
+            else:
+                request.session['booking_data'] = {
+                    'tour_id': tour.id,
+                    'tour_date_id': data['tour_date'].id, 
+                    'number_of_people': data['number_of_people'],
+                    'price_per_person': float(tour.price), # Convert Decimal to float for JSON
+                    'hold_id': hold.id,
+                    'hold_expires_at': hold.expires_at.isoformat(),
+                }
+                return redirect('payment_page')
             
     else:
         form = BookingForm(tour=tour)
@@ -55,16 +80,27 @@ def payment_page(request):
         if transaction_id:
             tour_date = get_object_or_404(TourDate, id=booking_data['tour_date_id'])
             
-            Booking.objects.create(
-                user=request.user,
-                tour=tour,
-                tour_date=tour_date,
-                number_of_people=booking_data['number_of_people'],
-                total_price=total_price,
-                transaction_id=transaction_id,
-                status='Pending',        # Admin needs to verify
-                payment_status='Pending' # Admin needs to verify money
-            )
+            # The hold's seats become the booking's. If the hold expired and
+            # the date sold out meanwhile, nothing is created.
+            try:
+                book_from_hold(
+                    booking_data.get('hold_id'),
+                    user=request.user,
+                    tour=tour,
+                    tour_date=tour_date,
+                    number_of_people=booking_data['number_of_people'],
+                    total_price=total_price,
+                    transaction_id=transaction_id,
+                    status='Pending',        # Admin needs to verify
+                    payment_status='Pending' # Admin needs to verify money
+                )
+            except SeatsUnavailable as error:
+                del request.session['booking_data']
+                if error.remaining:
+                    messages.error(request, f"Sorry, only {error.remaining} seats are left for this date now.")
+                else:
+                    messages.error(request, "Sorry, your seat hold expired and this date sold out meanwhile.")
+                return redirect('book_tour', tour_id=tour.id)
             
             del request.session['booking_data']
             
@@ -76,7 +112,8 @@ def payment_page(request):
     context = {
         'tour': tour,
         'total_price': total_price,
-        'booking_data': booking_data
+        'booking_data': booking_data,
+        'hold_expires_at': parse_datetime(booking_data.get('hold_expires_at') or ''),
     }
     return render(request, 'payment.html', context)
 
@@ -84,132 +121,237 @@ def payment_page(request):
 @login_required
 def download_ticket(request, booking_id):
     """
-    Generates a PDF Ticket for Confirmed or Completed Bookings.
+    Streams the PDF Ticket for Confirmed or Completed Bookings from the
+    ticket cache (bookings.tickets), rendering it only if it is missing.
     """
-    booking = get_object_or_404(Booking, id=booking_id)
+    booking = get_object_or_404(Booking.objects.select_related('user', 'tour', 'tour_date'), id=booking_id)
     
     # Security: Only Owner or Admin can download
     if request.user != booking.user and not request.user.is_staff:
         return HttpResponse("Unauthorized", status=403)
     
-    if booking.status not in ['Confirmed', 'Completed']:
+    if booking.status not in TICKET_STATUSES:
          return HttpResponse("Ticket is only available for Confirmed or Completed bookings.", status=400)
 
-    data = {
-        'booking': booking,
-        'tour': booking.tour,
-        'user': booking.user,
-    }
-    
-    pdf = render_to_pdf('ticket_pdf.html', data)
-    
-    if pdf:
-        response = HttpResponse(pdf, content_type='application/pdf')
-        filename = f"Ticket_{booking.id}_{booking.tour.name}.pdf"
-        content = f"attachment; filename={filename}"
-        response['Content-Disposition'] = content
-        return response
-        
-    return HttpResponse("Error Rendering PDF", status=400)
+    try:
+        path, etag = ticket_file(booking)
+    except ValueError:
+        return HttpResponse("Error Rendering PDF", status=400)
 
+    # The file name is a hash of everything on the ticket, so it doubles as the ETag
+    not_modified = get_conditional_response(request, etag=f'"{etag}"')
+    if not_modified is not None:
+        patch_cache_control(not_modified, private=True, no_cache=True)
+        return not_modified
+
+    response = FileResponse(
+        open(path, 'rb'),
+        as_attachment=True,
+        filename=f"Ticket_{booking.id}_{booking.tour.name}.pdf",
+        content_type='application/pdf',
+    )
+    response['ETag'] = f'"{etag}"'
+    # Private (tickets are personal); revalidate so an edited ticket is never stale
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _filtered_bookings(request):
+    """The booking list queryset for the request's status/search/date filters."""
+    bookings = Booking.objects.for_listing().order_by('-booking_date')
 
-@staff_member_required
-def admin_booking_list(request):
-    """
-    View all bookings with advanced filters (Status, Date, Search).
-    """
-    bookings = Booking.objects.all().order_by('-booking_date')
-    
     status_filter = request.GET.get('status')
     query = request.GET.get('q')
-    start_date = request.GET.get('start_date') 
-    end_date = request.GET.get('end_date')     
 
     if status_filter:
         bookings = bookings.filter(status=status_filter)
 
     if query:
-        bookings = bookings.filter(
-            Q(user__username__icontains=query) |
-            Q(tour__name__icontains=query) |
-            Q(id__icontains=query)
-        )
+        bookings = bookings.search(query)  # id, username prefix, tour name or transaction id
 
-    if start_date:
-        bookings = bookings.filter(booking_date__date__gte=start_date)
-    if end_date:
-        bookings = bookings.filter(booking_date__date__lte=end_date)
+    return bookings.booked_between(request.GET.get('start_date'), request.GET.get('end_date'))
+
+
+# The list's total stops counting here and shows "10,000+"
+ADMIN_LIST_COUNT_LIMIT = 10000
+
+
+@staff_member_required
+def admin_booking_list(request):
+    """
+    View all bookings with advanced filters (Status, Date, Search).
+    """
+    bookings = _filtered_bookings(request)
+
+    page = paginate_keyset(request, bookings)
+
+    counted = bookings.order_by().values('pk')[:ADMIN_LIST_COUNT_LIMIT + 1].count()
 
     context = {
-        'bookings': bookings,
-        'current_status': status_filter,
-        'start_date': start_date, 
-        'end_date': end_date,     
+        'bookings': page,
+        'page': page,
+        'total_count': f"{ADMIN_LIST_COUNT_LIMIT:,}+" if counted > ADMIN_LIST_COUNT_LIMIT else counted,
+        'current_status': request.GET.get('status'),
+        'start_date': request.GET.get('start_date'),
+        'end_date': request.GET.get('end_date'),
+        'bulk_actions': [(name, rule.label) for name, rule in TRANSITIONS.items()],
     }
     return render(request, 'admin/booking_list.html', context)
 
 
+@staff_member_required
+def admin_booking_export(request, export_format):
+    """The filtered booking list as a CSV or XLSX download."""
+    return export_response(_filtered_bookings(request), BOOKING_COLUMNS, f"bookings_{date.today():%Y-%m-%d}", export_format)
+
+
+ACTION_MESSAGES = {
+    'verify_payment': (messages.success, "verified and confirmed"),
+    'reject_payment': (messages.warning, "payment rejected"),
+    'mark_completed': (messages.success, "marked as Completed"),
+    'refund_cancel': (messages.info, "cancelled and marked as Refunded"),
+}
+
+
+def _run_transition(request, action, booking_ids):
+    """Applies a workflow action and reports the outcome with messages."""
+    try:
+        result = apply_transition(action, booking_ids)
+    except InvalidTransition:
+        messages.error(request, "Unknown booking action.")
+        return None
+
+    if result.updated:
+        notify, done = ACTION_MESSAGES[action]
+        ids = ', '.join(f"#{pk}" for pk in result.updated)
+        notify(request, f"Booking {ids} {done}." if len(result.updated) == 1 else f"{len(result.updated)} bookings {done}: {ids}.")
+    if result.skipped:
+        ids = ', '.join(f"#{pk}" for pk in result.skipped)
+        messages.warning(request, f"Skipped {ids}: not in a state that allows \"{TRANSITIONS[action].label}\" (already handled?).")
+    return result
+
+
 @staff_member_required
 def admin_update_booking_status(request, booking_id, action):
     """
     Handles logic for Verify, Reject, Complete, Refund buttons.
+    Only transitions allowed by bookings.workflow are applied.
     """
-    booking = get_object_or_404(Booking, id=booking_id)
-
-    if action == 'verify_payment':
-        booking.status = 'Confirmed'
-        booking.payment_status = 'Paid'
-        messages.success(request, f"Booking #{booking.id} verified and confirmed!")
-        
-    elif action == 'reject_payment':
-        booking.status = 'Cancelled'
-        booking.payment_status = 'Rejected'
-        messages.warning(request, f"Payment for Booking #{booking.id} rejected.")
-
-    elif action == 'mark_completed':
-        booking.status = 'Completed'
-        messages.success(request, f"Tour #{booking.id} marked as Completed!")
-        
-    elif action == 'refund_cancel':
-        booking.status = 'Cancelled'
-        booking.payment_status = 'Refunded'
-        messages.info(request, f"Booking #{booking.id} cancelled and marked as Refunded.")
-
-    booking.save()
+    get_object_or_404(Booking, id=booking_id)
+    _run_transition(request, action, [booking_id])
     return redirect('admin_booking_list')
 
 
 @staff_member_required
-def admin_payment_report(request):
+@require_POST
+def admin_bulk_booking_action(request):
     """
-    Financial Report View for Admins.
+    Applies one workflow action to every selected booking (POST action,
+    booking_ids) in a single compare-and-set UPDATE. Answers JSON
+    {"updated": [...], "skipped": [...]} to API clients, otherwise
+    redirects back to the list with a summary.
     """
-    payments = Booking.objects.all().order_by('-booking_date')
+    action = request.POST.get('action', '')
+    booking_ids = [value for value in request.POST.getlist('booking_ids') if value.isdigit()]
+    wants_json = not request.accepts('text/html')
+
+    if wants_json:
+        try:
+            result = apply_transition(action, booking_ids)
+        except InvalidTransition as error:
+            return JsonResponse({'error': str(error)}, status=400)
+        return JsonResponse({'action': action, 'updated': result.updated, 'skipped': result.skipped})
+
+    if not booking_ids:
+        messages.warning(request, "Select at least one booking.")
+    else:
+        _run_transition(request, action, booking_ids)
+
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('admin_booking_list')
+
+
+def _filtered_payments(request):
+    """The payment report queryset for the request's status/search/date filters."""
+    payments = Booking.objects.for_listing().order_by('-booking_date')
 
     status_filter = request.GET.get('status')
-    start_date = request.GET.get('start_date') 
-    end_date = request.GET.get('end_date')     
     query = request.GET.get('q')
 
     if status_filter:
         payments = payments.filter(payment_status=status_filter)
-    if start_date:
-        payments = payments.filter(booking_date__date__gte=start_date)
-    if end_date:
-        payments = payments.filter(booking_date__date__lte=end_date)
+    payments = payments.booked_between(request.GET.get('start_date'), request.GET.get('end_date'))
     if query:
-        payments = payments.filter(
-            Q(user__username__icontains=query) |
-            Q(transaction_id__icontains=query)
-        )
+        payments = payments.search(query)
+    return payments
 
-    total_revenue = Booking.objects.filter(payment_status='Paid').aggregate(Sum('total_price'))['total_price__sum'] or 0
-    report_total = payments.aggregate(Sum('total_price'))['total_price__sum'] or 0
+
+@staff_member_required
+def admin_payment_report(request):
+    """
+    Financial Report View for Admins.
+    """
+    payments = _filtered_payments(request)
+    status_filter = request.GET.get('status')
+    start_date = request.GET.get('start_date')
+    end_date = request.GET.get('end_date')
+
+    # Totals come from the daily rollup; only a text search needs the rows
+    total_revenue = booking_stats()['total_revenue']
+    if request.GET.get('q'):
+        report_total = payments.aggregate(Sum('total_price'))['total_price__sum'] or 0
+    else:
+        report_total = filtered_total(status_filter, start_date, end_date)
+
+    page = paginate_keyset(request, payments)
 
     context = {
-        'payments': payments,
+        'payments': page,
+        'page': page,
         'total_revenue': total_revenue,
         'report_total': report_total,
+        'revenue_chart': revenue_chart(start_date, end_date),
         'current_status': status_filter,
+        'start_date': start_date,
+        'end_date': end_date,
     }
-    return render(request, 'admin/payment_report.html', context)
\ No newline at end of file
+    return render(request, 'admin/payment_report.html', context)
+
+
+@staff_member_required
+def admin_reconcile_payments(request):
+    """
+    Matches an uploaded bank/UPI statement against pending bookings.
+    "Preview" only reports; "Verify matches" also confirms every clean match.
+    """
+    form = StatementUploadForm(request.POST or None, request.FILES or None)
+    result = None
+
+    if request.method == 'POST' and form.is_valid():
+        verify = request.POST.get('action') == 'verify'
+        try:
+            result = reconcile(form.cleaned_data['statement'], verify=verify)
+        except StatementError as error:
+            form.add_error('statement', str(error))
+        else:
+            if verify:
+                messages.success(request, f"{len(result.verified)} bookings verified and confirmed.")
+                if result.skipped:
+                    messages.warning(request, f"{len(result.skipped)} matched bookings changed meanwhile and were skipped.")
+
+    context = {
+        'form': form,
+        'result': result,
+        'issue_counts': result.counts() if result else {},
+        'issues': result.issues[:MAX_ISSUES_SHOWN] if result else [],
+        'max_issues': MAX_ISSUES_SHOWN,
+    }
+    return render(request, 'admin/reconcile.html', context)
+
+
+@staff_member_required
+def admin_payment_export(request, export_format):
+    """The filtered payment report as a CSV or XLSX download, for finance."""
+    return export_response(_filtered_payments(request), PAYMENT_COLUMNS, f"payments_{date.today():%Y-%m-%d}", export_format)
@@ -0,0 +1,121 @@
+"""
+Booking workflow: which staff action may move a booking from which
+(status, payment_status), and a bulk executor for them.
+
+    Pending/Pending  --verify_payment-->  Confirmed/Paid
+    Pending/Pending  --reject_payment-->  Cancelled/Rejected
+    Confirmed/Paid   --mark_completed-->  Completed/Paid
+    Confirmed/Paid   --refund_cancel--->  Cancelled/Refunded
+
+apply_transition() runs one action over many bookings as a single
+compare-and-set UPDATE (WHERE id IN (...) AND status = ... AND
+payment_status = ...). Rows whose state changed in the meantime (a
+colleague got there first) are left alone and reported as skipped.
+Seat counters, the revenue rollup and the customers' paid totals move
+once per batch (no transition claims seats, so none can find a departure
+full), and `bookings_transitioned` is sent once after commit,
+so caches and tickets are refreshed per batch too.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Booking
+from .revenue import apply_revenue_deltas, merge_deltas, rollup_delta
+from .seats import apply_seat_deltas, claim_delta
+from .user_metrics import refresh_user_metrics
+
+# Sent after commit with action=<name>, booking_ids=[...] (the updated ones)
+bookings_transitioned = Signal()
+
+
+@dataclass(frozen=True)
+class Transition:
+    label: str
+    from_status: str
+    from_payment_status: str
+    status: str
+    payment_status: str
+
+    def allows(self, booking):
+        return booking.status == self.from_status and booking.payment_status == self.from_payment_status
+
+
+TRANSITIONS = {
+    'verify_payment': Transition("Verify payment", 'Pending', 'Pending', 'Confirmed', 'Paid'),
+    'reject_payment': Transition("Reject payment", 'Pending', 'Pending', 'Cancelled', 'Rejected'),
+    'mark_completed': Transition("Mark completed", 'Confirmed', 'Paid', 'Completed', 'Paid'),
+    'refund_cancel': Transition("Refund & cancel", 'Confirmed', 'Paid', 'Cancelled', 'Refunded'),
+}
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+@dataclass
+class TransitionResult:
+    action: str
+    updated: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)  # missing, or no longer in the action's source state
+
+
+def allowed_actions(booking):
+    return [name for name, rule in TRANSITIONS.items() if rule.allows(booking)]
+
+
+def apply_transition(action, booking_ids):
+    """Applies `action` to every booking in `booking_ids` still in its source state."""
+    rule = TRANSITIONS.get(action)
+    if rule is None:
+        raise InvalidTransition(f"Unknown booking action {action!r}")
+
+    booking_ids = sorted({int(pk) for pk in booking_ids})
+    stamp = timezone.now()
+
+    with transaction.atomic():
+        Booking.objects.filter(
+            pk__in=booking_ids,
+            status=rule.from_status,
+            payment_status=rule.from_payment_status,
+        ).update(status=rule.status, payment_status=rule.payment_status, updated_at=stamp)
+
+        # The rows the UPDATE took carry our stamp, and stay locked by us
+        # until commit; their previous state is the rule's source state.
+        updated = list(
+            Booking.objects.filter(pk__in=booking_ids, status=rule.status, updated_at=stamp)
+            .order_by('pk')
+            .values('pk', 'user_id', 'tour_date_id', 'booking_date', 'tour_id', 'number_of_people', 'total_price')
+        )
+
+        deltas = defaultdict(int)
+        revenue = {}
+        for row in updated:
+            before = {**row, 'status': rule.from_status, 'payment_status': rule.from_payment_status}
+            after = {**row, 'status': rule.status, 'payment_status': rule.payment_status}
+            seat_claims = [
+                Booking(tour_date_id=row['tour_date_id'], status=values['status'], number_of_people=row['number_of_people']).seat_claim
+                for values in (before, after)
+            ]
+            for date_id, delta in claim_delta(*seat_claims).items():
+                deltas[date_id] += delta
+            merge_deltas(revenue, rollup_delta(before, after))
+        if revenue:
+            apply_revenue_deltas(revenue)  # one UPDATE per (day, tour) touched
+        if rule.payment_status != rule.from_payment_status:
+            refresh_user_metrics({row['user_id'] for row in updated})  # total_paid
+        if deltas:
+            # Last, so the departure rows are locked only until commit (as in bookings.signals)
+            apply_seat_deltas(dict(deltas))  # one UPDATE per departure for the whole batch
+
+        updated_ids = [row['pk'] for row in updated]
+        if updated_ids:
+            transaction.on_commit(
+                lambda: bookings_transitioned.send(sender=Booking, action=action, booking_ids=updated_ids)
+            )
+
+    done = set(updated_ids)
+    return TransitionResult(action, updated_ids, [pk for pk in booking_ids if pk not in done])
@@ -1,4 +1,6 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.http import StreamingHttpResponse
+from bookings.manifest import manifest_filename, stream_manifest_zip
 from .models import Tour, TourDate, TourImage
 
 class TourDateInline(admin.TabularInline):
@@ -30,5 +32,33 @@ class TourAdmin(admin.ModelAdmin):
 
 @admin.register(TourDate)
 class TourDateAdmin(admin.ModelAdmin):
-    list_display = ('tour', 'start_date', 'capacity', 'remaining_seats')
-    list_filter = ('start_date', 'tour')
\ No newline at end of file
+    list_display = ('tour', 'start_date', 'capacity', 'booked_seats', 'remaining_seats', 'sold_out')
+    list_filter = ('start_date', 'tour')
+    list_select_related = ('tour',)
+    actions = ['download_manifest']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_availability()
+
+    @admin.display(description='Booked', ordering='annotated_booked_seats')
+    def booked_seats(self, obj):
+        return obj.booked_seats
+
+    @admin.display(description='Remaining', ordering='annotated_remaining_seats')
+    def remaining_seats(self, obj):
+        return obj.remaining_seats
+
+    @admin.display(description='Sold out', boolean=True, ordering='annotated_sold_out')
+    def sold_out(self, obj):
+        return obj.sold_out
+
+    @admin.action(description='Download departure manifest (tickets + passenger list)')
+    def download_manifest(self, request, queryset):
+        if queryset.count() != 1:
+            self.message_user(request, "Select exactly one departure to download its manifest.", messages.WARNING)
+            return None
+
+        tour_date = queryset.select_related('tour').get()
+        response = StreamingHttpResponse(stream_manifest_zip(tour_date), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{manifest_filename(tour_date)}"'
+        return response
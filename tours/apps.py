@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class ToursConfig(AppConfig):
     name = 'tours'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (connects the search index handlers)
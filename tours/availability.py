@@ -0,0 +1,229 @@
+"""
+Precomputed month calendars of departure availability.
+
+One AvailabilityMonth row per (tour, month) holds that tour's departures
+keyed by day, and one row per month with tour=None merges the rows of
+every active tour. The calendar endpoint therefore reads a single row
+however many TourDates the month contains.
+
+Rows are refreshed incrementally by tours.signals: a TourDate edit or a
+seat change recomputes the touched (tour, month) from the tour's dates in
+that month (an index range scan on TourDate(tour, start_date)) and patches
+the all-tours row with the difference, so a booking costs the same however
+many tours the catalog has. (De)activating or deleting a tour adds or
+subtracts its rows the same way. Run `manage.py rebuild_availability_calendar`
+after bulk edits that bypass the signals; it re-merges from scratch.
+
+Only the tour's own month row is locked while it is recomputed. Every
+booking in the catalog patches the all-tours row of its month, so that row
+is never locked for a read-modify-write: a patch is an UPDATE conditional
+on the etag it read, retried on a fresh read when a concurrent patch got
+there first, and is the last write of its transaction.
+"""
+import hashlib
+import json
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import AvailabilityMonth, Tour, TourDate
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def month_range(month):
+    """[first day, first day of the next month)"""
+    if month.month == 12:
+        return month, month.replace(year=month.year + 1, month=1)
+    return month, month.replace(month=month.month + 1)
+
+
+def _etag(month, tour_id, days):
+    body = json.dumps([str(month), tour_id, days], sort_keys=True, separators=(',', ':'))
+    return hashlib.md5(body.encode()).hexdigest()
+
+
+def empty_etag(month, tour_id=None):
+    """ETag of a month with no departures (no row is stored for those)."""
+    return _etag(month, tour_id, {})
+
+
+def _store(tour_id, month, days):
+    rows = AvailabilityMonth.objects.filter(tour_id=tour_id, month=month)
+    if not days:
+        rows.delete()
+        return
+
+    etag = _etag(month, tour_id, days)
+    if not rows.update(days=days, etag=etag):
+        AvailabilityMonth.objects.create(tour_id=tour_id, month=month, days=days, etag=etag)
+
+
+def _tour_days(tour_id, month):
+    first, following = month_range(month)
+    dates = (
+        TourDate.objects.filter(tour_id=tour_id, start_date__gte=first, start_date__lt=following)
+        .annotate(seats_left=F('capacity') - F('seats_booked') - F('seats_held'))
+        .order_by('start_date', 'pk')
+        .values_list('pk', 'start_date', 'capacity', 'seats_left')
+    )
+
+    days = {}
+    for date_id, start_date, capacity, seats_left in dates:
+        seats_left = max(seats_left, 0)
+        day = days.setdefault(start_date.isoformat(), {'departures': 0, 'capacity': 0, 'seats_left': 0, 'tour_dates': []})
+        day['departures'] += 1
+        day['capacity'] += capacity
+        day['seats_left'] += seats_left
+        day['tour_dates'].append({'id': date_id, 'seats_left': seats_left})
+    return days
+
+
+def _add_days(merged, days, sign=1):
+    """Adds (sign=1) or subtracts (sign=-1) one tour's days to/from merged all-tours days."""
+    for day, entry in days.items():
+        total = merged.setdefault(day, {'departures': 0, 'capacity': 0, 'seats_left': 0, 'tours': 0})
+        total['departures'] += sign * entry['departures']
+        total['capacity'] += sign * entry['capacity']
+        total['seats_left'] += sign * entry['seats_left']
+        total['tours'] += sign
+        if total['tours'] <= 0:
+            del merged[day]
+
+
+def _merged_days(month):
+    merged = {}
+    rows = AvailabilityMonth.objects.filter(month=month, tour__is_active=True).values_list('days', flat=True)
+    for days in rows:
+        _add_days(merged, days)
+    return merged
+
+
+def _locked_tour_days(tour_id, month):
+    """
+    One tour's stored days of a month, with its row locked until commit,
+    so two refreshes of the same tour and month never both apply their
+    difference to the all-tours row.
+    """
+    row, _ = AvailabilityMonth.objects.select_for_update().get_or_create(
+        tour_id=tour_id, month=month, defaults={'days': {}, 'etag': empty_etag(month, tour_id)},
+    )
+    return row.days
+
+
+def _patch_merged(month, changes):
+    """
+    Applies [(old days, new days)] of active tours to the all-tours row
+    of a month, as a compare-and-swap on the row's etag (see above).
+    """
+    while True:
+        row = AvailabilityMonth.objects.filter(tour=None, month=month).values_list('pk', 'days', 'etag').first()
+        merged = dict(row[1]) if row else {}
+        for old, new in changes:
+            _add_days(merged, old, -1)
+            _add_days(merged, new)
+        days = dict(sorted(merged.items()))
+
+        if row is None:
+            if not days:
+                return
+            try:
+                with transaction.atomic():
+                    AvailabilityMonth.objects.create(tour=None, month=month, days=days, etag=_etag(month, None, days))
+                return
+            except IntegrityError:  # created concurrently; patch that row
+                continue
+
+        unchanged = AvailabilityMonth.objects.filter(pk=row[0], etag=row[2])
+        if days:
+            if unchanged.update(days=days, etag=_etag(month, None, days)):
+                return
+        elif unchanged.delete()[0]:
+            return
+
+
+def _store_merged(month, merged):
+    _store(None, month, dict(sorted(merged.items())))
+
+
+def refresh(pairs):
+    """
+    Recomputes the calendar for these (tour_id, month) pairs and patches
+    the all-tours rows with what changed for active tours.
+    """
+    tours_by_month = defaultdict(set)
+    for tour_id, month in pairs:
+        tours_by_month[month_start(month)].add(tour_id)
+    if not tours_by_month:
+        return
+
+    tour_ids = set().union(*tours_by_month.values())
+    active = set(Tour.objects.filter(pk__in=tour_ids, is_active=True).values_list('pk', flat=True))
+    for month in sorted(tours_by_month):
+        with transaction.atomic():
+            changes = []
+            for tour_id in sorted(tours_by_month[month]):  # one lock order, so two refreshes never deadlock
+                old, new = _locked_tour_days(tour_id, month), _tour_days(tour_id, month)
+                _store(tour_id, month, new)  # also drops the row locked for a month left without dates
+                if old != new and tour_id in active:
+                    changes.append((old, new))
+            if changes:
+                _patch_merged(month, changes)
+
+
+def tour_rows(tour_id):
+    """[(month, days)] of one tour's stored months."""
+    return list(AvailabilityMonth.objects.filter(tour_id=tour_id).order_by('month').values_list('month', 'days'))
+
+
+def patch_merged(rows, sign):
+    """
+    Adds (sign=1) or subtracts (sign=-1) a tour's tour_rows() to/from the
+    all-tours rows, when the tour is activated, hidden or deleted.
+    """
+    for month, days in sorted(rows, key=lambda row: row[0]):
+        with transaction.atomic():
+            _patch_merged(month, [({}, days)] if sign > 0 else [(days, {})])
+
+
+def refresh_merged(months):
+    """Re-merges the all-tours rows from scratch (rebuild)."""
+    with transaction.atomic():
+        for month in {month_start(month) for month in months}:
+            _store_merged(month, _merged_days(month))
+
+
+def rebuild():
+    """Recomputes every month that has (or had) a departure. Returns the row count."""
+    pairs = {
+        (tour_id, month_start(start_date))
+        for tour_id, start_date in TourDate.objects.values_list('tour_id', 'start_date').iterator()
+    }
+    pairs |= set(AvailabilityMonth.objects.filter(tour__isnull=False).values_list('tour_id', 'month'))
+    stale_merged = set(AvailabilityMonth.objects.filter(tour__isnull=True).values_list('month', flat=True))
+
+    refresh(pairs)
+    refresh_merged(stale_merged | {month for _, month in pairs})
+    return AvailabilityMonth.objects.count()
+
+
+def current_etag(month, tour_id=None):
+    etag = AvailabilityMonth.objects.filter(tour_id=tour_id, month=month).values_list('etag', flat=True).first()
+    return etag or empty_etag(month, tour_id)
+
+
+def month_payload(month, tour_id=None):
+    days = AvailabilityMonth.objects.filter(tour_id=tour_id, month=month).values_list('days', flat=True).first()
+    today = timezone.localdate().isoformat()
+    return {
+        'month': month.strftime('%Y-%m'),
+        'tour': tour_id,
+        'days': {
+            day: dict(entry, sold_out=entry['seats_left'] <= 0, past=day < today)
+            for day, entry in (days or {}).items()
+        },
+    }
@@ -0,0 +1,105 @@
+"""
+Fragment cache for the public catalog (home), tour detail pages and the
+customer dashboard.
+
+Rendered HTML is stored under keys that embed a version number per scope:
+
+    catalog        -> the home page tour grid (any search / page)
+    tour:<id>      -> a tour's detail fragments (summary, itinerary, gallery)
+    seats:<id>     -> a tour's upcoming departures with seats left
+    availability   -> catalog pages filtered by a departure date window
+    user:<id>      -> a customer's dashboard trip lists
+
+tours.signals bumps the matching version whenever a Tour, TourDate,
+TourImage or seat counter changes (bookings.signals: a customer's
+bookings), so stale fragments are simply never
+read again and expire on their own. Seat fragments also carry a short TTL
+(settings.TOUR_SEATS_MAX_STALENESS) which bounds staleness even when a
+change bypasses the signals or another process holds a local-memory cache.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+FRAGMENTS = ('home', 'tour_detail', 'tour_seats', 'dashboard')
+
+
+def _version_key(scope):
+    return f"fragver:{scope}"
+
+
+def _stat_key(fragment, outcome):
+    return f"fragstat:{fragment}:{outcome}"
+
+
+def _incr(key):
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:  # evicted between add() and incr()
+            cache.set(key, 1, timeout=None)
+
+
+def _version_seed():
+    # Seed versions from the clock: if a version key is evicted, its new
+    # value can never coincide with one older fragments were stored under.
+    return int(time.time() * 1000)
+
+
+def get_versions(scopes):
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    seed = _version_seed()
+    missing = {key: seed for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def bump(*scopes):
+    """Invalidates every fragment rendered under these scopes."""
+    for scope in scopes:
+        key = _version_key(scope)
+        if not cache.add(key, _version_seed(), timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, _version_seed(), timeout=None)
+
+
+def cached_fragment(fragment, scopes, render, vary_on=(), timeout=None):
+    """
+    Returns render()'s result from the cache, rendering and storing it on a
+    miss. `render` may return a string or a dict of named HTML snippets.
+    """
+    versions = get_versions(scopes)
+    vary = hashlib.md5(repr(tuple(vary_on)).encode()).hexdigest()
+    key = f"frag:{fragment}:{'.'.join(map(str, versions))}:{vary}"
+
+    html = cache.get(key)
+    if html is not None:
+        _incr(_stat_key(fragment, 'hits'))
+        return html
+
+    _incr(_stat_key(fragment, 'misses'))
+    html = render()
+    if timeout is None:
+        timeout = settings.CATALOG_CACHE_TIMEOUT
+    cache.set(key, html, timeout)
+    return html
+
+
+def stats():
+    """Hit/miss counters per fragment, e.g. {'home': {'hits': 10, 'misses': 2}}."""
+    keys = [_stat_key(fragment, outcome) for fragment in FRAGMENTS for outcome in ('hits', 'misses')]
+    found = cache.get_many(keys)
+    return {
+        fragment: {
+            outcome: found.get(_stat_key(fragment, outcome), 0)
+            for outcome in ('hits', 'misses')
+        }
+        for fragment in FRAGMENTS
+    }
@@ -0,0 +1,168 @@
+"""
+Faceted filtering for the public catalog (home page).
+
+Customers can narrow the tour list by location, price band, trip length
+and "has a departure with free seats between two dates". Each facet shows
+how many tours each choice would return, computed disjunctively: a facet's
+counts ignore its own selection but respect every other one.
+
+All counts come from ONE grouped query over (location, price band,
+duration band); the per-facet numbers are folded together in Python.
+The composite indexes on Tour(is_active, location), Tour(is_active, price)
+and TourDate(tour, start_date) back the filters.
+"""
+from collections import defaultdict
+from datetime import date
+
+from django.db.models import Case, CharField, Count, Exists, OuterRef, Q, Value, When
+from django.utils.dateparse import parse_date
+
+from .models import TourDate
+
+# (key, label, lower bound inclusive, upper bound exclusive or None)
+PRICE_BANDS = [
+    ('0-5000', 'Under ₹5,000', 0, 5000),
+    ('5000-10000', '₹5,000 – ₹10,000', 5000, 10000),
+    ('10000-25000', '₹10,000 – ₹25,000', 10000, 25000),
+    ('25000-50000', '₹25,000 – ₹50,000', 25000, 50000),
+    ('50000-', '₹50,000+', 50000, None),
+]
+
+DURATION_BANDS = [
+    ('1-3', '1–3 days', 1, 4),
+    ('4-7', '4–7 days', 4, 8),
+    ('8-14', '8–14 days', 8, 15),
+    ('15-', '15+ days', 15, None),
+]
+
+MAX_LOCATIONS_SHOWN = 15
+
+
+def _band_q(field, bands, keys):
+    condition = Q()
+    for key, _, lower, upper in bands:
+        if key in keys:
+            band = Q(**{f'{field}__gte': lower})
+            if upper is not None:
+                band &= Q(**{f'{field}__lt': upper})
+            condition |= band
+    return condition
+
+
+def _band_case(field, bands):
+    whens = []
+    for key, _, lower, upper in bands:
+        condition = {f'{field}__gte': lower}
+        if upper is not None:
+            condition[f'{field}__lt'] = upper
+        whens.append(When(**condition, then=Value(key)))
+    return Case(*whens, default=Value(''), output_field=CharField())
+
+
+def _parse_day(value):
+    try:
+        return parse_date(value or '')
+    except ValueError:  # well-formed but impossible, e.g. 2026-02-30
+        return None
+
+
+class CatalogFilters:
+    """The facet selection parsed from the query string."""
+
+    def __init__(self, params):
+        price_keys = {key for key, *_ in PRICE_BANDS}
+        duration_keys = {key for key, *_ in DURATION_BANDS}
+
+        self.locations = [value for value in params.getlist('location') if value]
+        self.prices = [value for value in params.getlist('price') if value in price_keys]
+        self.durations = [value for value in params.getlist('duration') if value in duration_keys]
+
+        self.available_from = _parse_day(params.get('available_from'))
+        self.available_to = _parse_day(params.get('available_to'))
+        if self.available_from or self.available_to:
+            self.available_from = max(self.available_from or date.today(), date.today())
+
+    @property
+    def has_date_window(self):
+        return self.available_from is not None
+
+    @property
+    def is_active(self):
+        return bool(self.locations or self.prices or self.durations or self.has_date_window)
+
+    def _facet_q(self, facet):
+        if facet == 'location' and self.locations:
+            return Q(location__in=self.locations)
+        if facet == 'price' and self.prices:
+            return _band_q('price', PRICE_BANDS, self.prices)
+        if facet == 'duration' and self.durations:
+            return _band_q('duration_days', DURATION_BANDS, self.durations)
+        return Q()
+
+    def apply_availability(self, tours):
+        """Keeps tours with a bookable departure inside the date window."""
+        if not self.has_date_window:
+            return tours
+
+        departures = TourDate.objects.filter(tour=OuterRef('pk'), start_date__gte=self.available_from).bookable()
+        if self.available_to:
+            departures = departures.filter(start_date__lte=self.available_to)
+        return tours.filter(Exists(departures))
+
+    def apply(self, tours):
+        """All selected facets, plus the date window."""
+        tours = self.apply_availability(tours)
+        for facet in ('location', 'price', 'duration'):
+            tours = tours.filter(self._facet_q(facet))
+        return tours
+
+    def counts(self, tours):
+        """
+        Facet counts for `tours` (already searched, not yet faceted) from a
+        single grouped query. Returns {'location': [...], 'price': [...],
+        'duration': [...]} with one dict per choice.
+        """
+        rows = list(
+            self.apply_availability(tours)
+            .order_by()
+            .annotate(
+                price_band=_band_case('price', PRICE_BANDS),
+                duration_band=_band_case('duration_days', DURATION_BANDS),
+            )
+            .values('location', 'price_band', 'duration_band')
+            .annotate(total=Count('pk'))
+        )
+
+        def matches(row, facet):
+            if facet == 'location':
+                return not self.locations or row['location'] in self.locations
+            if facet == 'price':
+                return not self.prices or row['price_band'] in self.prices
+            return not self.durations or row['duration_band'] in self.durations
+
+        tallies = {facet: defaultdict(int) for facet in ('location', 'price', 'duration')}
+        field_for = {'location': 'location', 'price': 'price_band', 'duration': 'duration_band'}
+        for row in rows:
+            for facet in tallies:
+                others = [other for other in tallies if other != facet]
+                if all(matches(row, other) for other in others):
+                    tallies[facet][row[field_for[facet]]] += row['total']
+
+        locations = sorted(tallies['location'].items(), key=lambda item: (-item[1], item[0]))
+        shown = [name for name, _ in locations[:MAX_LOCATIONS_SHOWN]]
+        shown += [name for name in self.locations if name not in shown]
+
+        return {
+            'location': [
+                {'value': name, 'label': name, 'count': tallies['location'].get(name, 0), 'selected': name in self.locations}
+                for name in shown
+            ],
+            'price': [
+                {'value': key, 'label': label, 'count': tallies['price'].get(key, 0), 'selected': key in self.prices}
+                for key, label, *_ in PRICE_BANDS
+            ],
+            'duration': [
+                {'value': key, 'label': label, 'count': tallies['duration'].get(key, 0), 'selected': key in self.durations}
+                for key, label, *_ in DURATION_BANDS
+            ],
+        }
@@ -0,0 +1,126 @@
+"""
+Upload-time image derivatives for Tour.image and TourImage.image.
+
+Each upload is cropped to fixed-size variants (thumb/card/hero), each at
+1x and 2x width, in WebP and JPEG. The stored paths live in the model's
+`image_variants` JSON field:
+
+    {
+        "source": "tour_images/goa.jpg",
+        "card": {"width": 600, "height": 400,
+                 "webp": {"600": "tour_images/variants/goa-card-600.webp", ...},
+                 "jpeg": {"600": "tour_images/variants/goa-card-600.jpg", ...}},
+        ...
+    }
+
+Templates render them with the {% picture %} tag (tours.templatetags.tour_images).
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {
+    'thumb': (100, 100),
+    'card': (600, 400),
+    'hero': (1200, 800),
+}
+
+SCALES = (1, 2)
+
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def _variant_path(source_name, variant, width, extension):
+    directory, filename = os.path.split(source_name)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(directory, 'variants', f"{stem}-{variant}-{width}.{extension}")
+
+
+def _load(image_field):
+    image_field.open('rb')
+    try:
+        image = Image.open(image_field)
+        image = ImageOps.exif_transpose(image)  # honour camera rotation
+        return image.convert('RGB')
+    finally:
+        image_field.close()
+
+
+def generate_variants(image_field):
+    """Renders every variant of an uploaded image; returns the JSON to store."""
+    source = _load(image_field)
+    variants = {'source': image_field.name}
+
+    for variant, (width, height) in VARIANTS.items():
+        entry = {'width': width, 'height': height}
+        entry.update({format_key: {} for format_key in FORMATS})
+
+        for scale in SCALES:
+            # Never upscale beyond 1x: a blurry 2x file is just wasted bytes
+            if scale > 1 and (source.width < width * scale or source.height < height * scale):
+                continue
+
+            resized = ImageOps.fit(source, (width * scale, height * scale), Image.LANCZOS)
+            for format_key, (pil_format, extension, options) in FORMATS.items():
+                buffer = BytesIO()
+                resized.save(buffer, pil_format, **options)
+
+                path = _variant_path(image_field.name, variant, width * scale, extension)
+                if default_storage.exists(path):
+                    default_storage.delete(path)
+                entry[format_key][str(width * scale)] = default_storage.save(path, ContentFile(buffer.getvalue()))
+
+        variants[variant] = entry
+
+    return variants
+
+
+def variant_paths(variants):
+    """Every file referenced by an image_variants dict."""
+    for variant in VARIANTS:
+        entry = (variants or {}).get(variant) or {}
+        for format_key in FORMATS:
+            yield from (entry.get(format_key) or {}).values()
+
+
+def delete_variants(variants):
+    for path in variant_paths(variants):
+        if default_storage.exists(path):
+            default_storage.delete(path)
+
+
+def refresh_variants(instance, force=False):
+    """
+    Regenerates variants when the instance's image changed (or force=True)
+    and stores them with a queryset update, so no save signals re-fire.
+    """
+    current = instance.image.name if instance.image else None
+    stored = instance.image_variants or {}
+
+    if not force and stored.get('source') == current:
+        return False
+
+    if stored:
+        delete_variants(stored)
+
+    variants = {}
+    if current:
+        try:
+            variants = generate_variants(instance.image)
+        except (OSError, UnidentifiedImageError):
+            # Unreadable upload: templates fall back to the original file
+            logger.exception("Could not build image variants for %s", current)
+            variants = {'source': current}
+
+    type(instance).objects.filter(pk=instance.pk).update(image_variants=variants)
+    instance.image_variants = variants
+    return True
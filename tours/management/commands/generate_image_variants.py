@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from tours.models import Tour, TourImage
+from tours import imaging
+
+
+class Command(BaseCommand):
+    help = 'Builds thumbnail/card/hero variants for existing Tour and gallery images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild variants that already exist')
+
+    def handle(self, *args, **options):
+        force = options['force']
+
+        for model in (Tour, TourImage):
+            built = 0
+            images = model.objects.exclude(image='').exclude(image__isnull=True).order_by('pk')
+            for instance in images.iterator(chunk_size=200):
+                if imaging.refresh_variants(instance, force=force):
+                    built += 1
+                    self.stdout.write(f"{model.__name__} #{instance.pk}: {instance.image.name}")
+
+            self.stdout.write(self.style.SUCCESS(f"{model.__name__}: built variants for {built} images."))
@@ -1,91 +1,105 @@
-import random
-from datetime import timedelta
-from django.core.management.base import BaseCommand
-from django.utils import timezone
-from django.contrib.auth import get_user_model
-from django.db import transaction # <--- Added for safety
-from faker import Faker
-from tours.models import Tour, TourDate
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
 from bookings.models import Booking
+from bookings.stats import invalidate_stats
+from tours import cache as fragment_cache
+from tours import sample_data
+from users.models import CustomUser
 
-User = get_user_model()
 
 class Command(BaseCommand):
-    help = 'Populates the database with dummy data'
+    help = (
+        'Replaces all tours, departures, bookings and customers with generated data '
+        '(deterministic for a given --seed; staff accounts are kept)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Customers to create')
+        parser.add_argument('--tours', type=int, default=10, help='Tours to create')
+        parser.add_argument('--dates-per-tour', type=int, default=5, help='Departures per tour')
+        parser.add_argument('--bookings', type=int, default=100, help='Bookings to create')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed builds the same data')
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Processes generating users and bookings (default: CPU count; always 1 on SQLite)',
+        )
+
+    def handle(self, *args, **options):
+        scale = sample_data.Scale(
+            users=options['users'], tours=options['tours'], dates_per_tour=options['dates_per_tour'],
+            bookings=options['bookings'], seed=options['seed'],
+        )
+        if min(scale.users, scale.tours, scale.dates_per_tour, scale.bookings) < 0:
+            raise CommandError("Scale parameters cannot be negative.")
+        if scale.bookings and not (scale.users and scale.tours and scale.dates_per_tour):
+            raise CommandError("Bookings need at least one user, tour and departure.")
+
+        # SQLite allows one writer at a time, so extra processes would only queue
+        workers = 1 if connection.vendor == 'sqlite' else max(options['workers'] or os.cpu_count() or 1, 1)
+        started = time.perf_counter()
+
+        self.stdout.write("1. Cleaning old data...")
+        sample_data.clear()
+
+        self.stdout.write(f"2. Creating {scale.tours} tours with {scale.dates_per_tour} departures each...")
+        tours = sample_data.create_tours(scale)
+        departures = sample_data.create_departures(scale, tours)
 
-    def handle(self, *args, **kwargs):
-        fake = Faker()
-        
-        try:
-            with transaction.atomic(): # If anything fails, undo everything
-                self.stdout.write("1. Cleaning old data...")
-                Booking.objects.all().delete()
-                TourDate.objects.all().delete()
-                Tour.objects.all().delete()
-                # Delete customers, but PROTECT the admin/superuser
-                User.objects.filter(is_staff=False, is_superuser=False).delete()
+        self.stdout.write(f"3. Creating {scale.users} users...")
+        password_hash = sample_data.password_hash()
+        self._run(workers, sample_data.load_users, [
+            (scale.seed, chunk, start, count, password_hash) for chunk, start, count in sample_data.user_chunks(scale)
+        ])
 
-                self.stdout.write("2. Creating Users...")
-                users = []
-                for _ in range(20):
-                    email = fake.unique.email()
-                    # Add random number to ensure username is unique and doesn't clash with Admin
-                    username = email.split('@')[0] + str(random.randint(1000, 9999))
-                    
-                    user = User.objects.create_user(
-                        username=username,
-                        email=email,
-                        password="password123",
-                        phone_number=fake.phone_number()[:15], # Crop to 15 chars to prevent "too long" error
-                        address=fake.address()[:200], # Crop address to be safe
-                        role='customer'
-                    )
-                    users.append(user)
+        self.stdout.write(f"4. Creating {scale.bookings} bookings...")
+        user_ids = sample_data.customer_ids()
+        self._run(workers, sample_data.load_bookings, [
+            (scale.seed, chunk, group) for chunk, group in sample_data.booking_chunks(departures)
+        ], user_ids)
 
-                self.stdout.write("3. Creating Tours...")
-                tours = []
-                tour_names = [
-                    "Swiss Alps Adventure", "Bali Beach Retreat", "Tokyo City Explore", 
-                    "Safari in Kenya", "Paris Romantic Getaway", "New York City Break",
-                    "Inca Trail Hike", "Santorini Sunset Cruise", "Dubai Luxury Escape",
-                    "Great Barrier Reef Dive"
-                ]
-                
-                for name in tour_names:
-                    tour = Tour.objects.create(
-                        name=name,
-                        location=fake.city(),
-                        description=fake.text(max_nb_chars=200), # Keep text short enough for DB
-                        duration_days=random.randint(3, 14),
-                        price=random.randint(500, 5000),
-                        is_active=True
-                    )
-                    tours.append(tour)
+        self.stdout.write("5. Rebuilding derived data...")
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for model in (CustomUser, Booking):
+                    cursor.execute(f"ANALYZE {connection.ops.quote_name(model._meta.db_table)}")
+        for command in (
+            'rebuild_seat_counts', 'rebuild_availability_calendar', 'rebuild_search_index',
+            'rebuild_revenue_rollup', 'rebuild_user_metrics',
+        ):
+            # Everything "drifted" from empty, so keep just each command's summary line
+            output = io.StringIO()
+            call_command(command, stdout=output)
+            self.stdout.write(f"   {command}: {output.getvalue().strip().splitlines()[-1]}")
+        fragment_cache.bump('catalog', 'availability')
+        invalidate_stats()
 
-                self.stdout.write("4. Creating Dates & Bookings...")
-                for tour in tours:
-                    for _ in range(5):
-                        start_date = timezone.now().date() + timedelta(days=random.randint(1, 90))
-                        tour_date = TourDate.objects.create(
-                            tour=tour,
-                            start_date=start_date,
-                            capacity=20
-                        )
-                        
-                        # Random bookings
-                        for _ in range(random.randint(0, 3)):
-                            user = random.choice(users)
-                            people = random.randint(1, 4)
-                            Booking.objects.create(
-                                user=user,
-                                tour=tour,
-                                tour_date=tour_date,
-                                number_of_people=people,
-                                total_price=tour.price * people,
-                                status=random.choice(['Pending', 'Confirmed', 'Cancelled'])
-                            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Success! Database populated in {time.perf_counter() - started:.1f}s "
+            f"(customer password: {sample_data.PASSWORD})."
+        ))
 
-            self.stdout.write(self.style.SUCCESS("Success! Database populated."))
+    def _run(self, workers, function, jobs, user_ids=()):
+        """Runs `function(*job)` for every job, in a process pool when workers > 1."""
+        done = 0
+        if workers <= 1 or len(jobs) <= 1:
+            sample_data.init_worker(user_ids)
+            for job in jobs:
+                done += function(*job)
+                self.stdout.write(f"   {done} rows")
+            return
 
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f"ERROR FAILED: {str(e)}"))
\ No newline at end of file
+        # Children must open their own connections, not share the parent's socket
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(jobs)), initializer=sample_data.init_worker, initargs=(user_ids,),
+        ) as pool:
+            for future in as_completed([pool.submit(function, *job) for job in jobs]):
+                done += future.result()
+                self.stdout.write(f"   {done} rows")
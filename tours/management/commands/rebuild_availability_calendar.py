@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from tours import availability
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the precomputed month availability calendars from the TourDate table'
+
+    def handle(self, *args, **options):
+        rows = availability.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt the availability calendar ({rows} month rows)."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from tours.models import Tour
+from tours import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the tour search index (tsvector on PostgreSQL, FTS5 table on SQLite)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        tour_ids = list(Tour.objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(tour_ids), batch_size):
+            search.index_tours(tour_ids[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {len(tour_ids)} tours."))
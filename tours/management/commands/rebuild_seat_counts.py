@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from tours.models import TourDate
+from bookings.seats import actual_held_counts, actual_seat_counts
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds (or with --check, verifies) the TourDate seat counters from the Booking and SeatHold tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drift, do not write anything')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tour dates per grouped query')
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+        batch_size = options['batch_size']
+
+        checked = 0
+        drifted = []
+
+        dates = TourDate.objects.order_by('pk').values_list('pk', 'seats_booked', 'seats_held')
+        batch = []
+        for row in dates.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                drifted += self._process(batch, check_only)
+                checked += len(batch)
+                batch = []
+        if batch:
+            drifted += self._process(batch, check_only)
+            checked += len(batch)
+
+        for date_id, stored, actual in drifted:
+            self.stdout.write(f"TourDate #{date_id}: counters={stored} actual={actual}")
+
+        if check_only and drifted:
+            raise CommandError(f"{len(drifted)} of {checked} tour dates have drifted seat counters.")
+
+        if check_only:
+            self.stdout.write(self.style.SUCCESS(f"Verified {checked} tour dates, no drift."))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {checked} tour dates ({len(drifted)} corrected)."))
+
+    def _process(self, batch, check_only):
+        """
+        Compares one batch against two grouped aggregates and fixes drift.
+        Counters are reported as (booked, held).
+        """
+        date_ids = [date_id for date_id, _, _ in batch]
+        booked = actual_seat_counts(date_ids)
+        held = actual_held_counts(date_ids)
+
+        drifted = []
+        for date_id, seats_booked, seats_held in batch:
+            actual = (booked.get(date_id, 0), held.get(date_id, 0))
+            if (seats_booked, seats_held) != actual:
+                drifted.append((date_id, (seats_booked, seats_held), actual))
+
+        if drifted and not check_only:
+            with transaction.atomic():
+                TourDate.objects.bulk_update(
+                    [TourDate(pk=date_id, seats_booked=seats, seats_held=holds) for date_id, _, (seats, holds) in drifted],
+                    ['seats_booked', 'seats_held'],
+                )
+        return drifted
@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 01:15
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_seats_booked(apps, schema_editor):
+    TourDate = apps.get_model('tours', 'TourDate')
+    Booking = apps.get_model('bookings', 'Booking')
+
+    rows = (
+        Booking.objects.filter(tour_date__isnull=False, status__in=['Pending', 'Confirmed'])
+        .values('tour_date_id')
+        .annotate(seats=Sum('number_of_people'))
+    )
+    for row in rows:
+        TourDate.objects.filter(pk=row['tour_date_id']).update(seats_booked=row['seats'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0005_tour_updated_at_alter_tour_description_and_more'),
+        ('bookings', '0007_booking_updated_at_alter_booking_total_price_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tourdate',
+            name='seats_booked',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Seats held by Pending and Confirmed bookings'),
+        ),
+        migrations.RunPython(backfill_seats_booked, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 6.0 on 2026-10-18 02:10
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+# The search indexes are vendor specific (GIN/pg_trgm on PostgreSQL, FTS5 on
+# SQLite), so they are created here rather than declared in Tour.Meta.indexes.
+
+def create_search_indexes(apps, schema_editor):
+    Tour = apps.get_model('tours', 'Tour')
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute("CREATE INDEX IF NOT EXISTS tours_tour_search_vector_gin ON tours_tour USING gin (search_vector)")
+        schema_editor.execute("CREATE INDEX IF NOT EXISTS tours_tour_name_trgm ON tours_tour USING gin (name gin_trgm_ops)")
+        schema_editor.execute("CREATE INDEX IF NOT EXISTS tours_tour_location_trgm ON tours_tour USING gin (location gin_trgm_ops)")
+        Tour.objects.update(search_vector=(
+            SearchVector('name', weight='A', config='english')
+            + SearchVector('location', weight='A', config='english')
+            + SearchVector('description', weight='B', config='english')
+        ))
+
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS tours_tour_fts USING fts5("
+            "name, location, description, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        schema_editor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS tours_tour_fts_vocab USING fts5vocab(tours_tour_fts, 'row')")
+        schema_editor.execute(
+            "INSERT INTO tours_tour_fts (rowid, name, location, description) "
+            "SELECT id, name, location, description FROM tours_tour"
+        )
+
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'postgresql':
+        for index in ('tours_tour_search_vector_gin', 'tours_tour_name_trgm', 'tours_tour_location_trgm'):
+            schema_editor.execute(f"DROP INDEX IF EXISTS {index}")
+
+    elif vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS tours_tour_fts_vocab")
+        schema_editor.execute("DROP TABLE IF EXISTS tours_tour_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0006_tourdate_seats_booked'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tour',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
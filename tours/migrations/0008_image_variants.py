@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0007_tour_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tour',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized copies of the image (see tours.imaging)'),
+        ),
+        migrations.AddField(
+            model_name='tourimage',
+            name='image_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Resized copies of the image (see tours.imaging)'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-18 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0008_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tour',
+            index=models.Index(fields=['is_active', 'location'], name='tour_active_location_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tour',
+            index=models.Index(fields=['is_active', 'price'], name='tour_active_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tourdate',
+            index=models.Index(fields=['tour', 'start_date'], name='tourdate_tour_start_idx'),
+        ),
+    ]
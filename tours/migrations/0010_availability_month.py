@@ -0,0 +1,79 @@
+# Generated by Django 6.0 on 2026-10-18 04:10
+
+import hashlib
+import json
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def _etag(month, tour_id, days):
+    # As tours.availability._etag, so clients' cached calendars stay valid.
+    body = json.dumps([str(month), tour_id, days], sort_keys=True, separators=(',', ':'))
+    return hashlib.md5(body.encode()).hexdigest()
+
+
+def backfill_calendar(apps, schema_editor):
+    """What tours.availability.rebuild() stores, for the catalog of this migration."""
+    TourDate = apps.get_model('tours', 'TourDate')
+    AvailabilityMonth = apps.get_model('tours', 'AvailabilityMonth')
+
+    tour_months = {}
+    dates = TourDate.objects.order_by('start_date', 'pk').values_list(
+        'pk', 'tour_id', 'tour__is_active', 'start_date', 'capacity', 'seats_booked',
+    )
+    for date_id, tour_id, is_active, start_date, capacity, seats_booked in dates.iterator():
+        seats_left = max(capacity - seats_booked, 0)
+        month = start_date.replace(day=1)
+        days = tour_months.setdefault((tour_id, month), (is_active, {}))[1]
+        day = days.setdefault(start_date.isoformat(), {'departures': 0, 'capacity': 0, 'seats_left': 0, 'tour_dates': []})
+        day['departures'] += 1
+        day['capacity'] += capacity
+        day['seats_left'] += seats_left
+        day['tour_dates'].append({'id': date_id, 'seats_left': seats_left})
+
+    merged_months = {}
+    for (tour_id, month), (is_active, days) in tour_months.items():
+        if not is_active:
+            continue
+        merged = merged_months.setdefault(month, {})
+        for day, entry in days.items():
+            total = merged.setdefault(day, {'departures': 0, 'capacity': 0, 'seats_left': 0, 'tours': 0})
+            total['departures'] += entry['departures']
+            total['capacity'] += entry['capacity']
+            total['seats_left'] += entry['seats_left']
+            total['tours'] += 1
+
+    rows = [
+        AvailabilityMonth(tour_id=tour_id, month=month, days=days, etag=_etag(month, tour_id, days))
+        for (tour_id, month), (_, days) in tour_months.items()
+    ]
+    for month, merged in merged_months.items():
+        days = dict(sorted(merged.items()))
+        rows.append(AvailabilityMonth(tour_id=None, month=month, days=days, etag=_etag(month, None, days)))
+    AvailabilityMonth.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0009_catalog_facet_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('days', models.JSONField(default=dict, help_text='{"2025-12-25": {"departures": 1, "seats_left": 12, ...}}')),
+                ('etag', models.CharField(max_length=32)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('tour', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='availability_months', to='tours.tour')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('tour__isnull', False)), fields=('tour', 'month'), name='availability_tour_month_uniq'), models.UniqueConstraint(condition=models.Q(('tour__isnull', True)), fields=('month',), name='availability_all_month_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_calendar, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 05:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tours', '0010_availability_month'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tourdate',
+            name='seats_held',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Seats reserved by unexpired seat holds'),
+        ),
+    ]
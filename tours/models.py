@@ -1,5 +1,8 @@
+from datetime import date
 from django.db import models
-from django.db.models import Sum
+from django.db.models import BooleanField, ExpressionWrapper, F, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.contrib.postgres.search import SearchVectorField
 from ckeditor.fields import RichTextField
 
 class Tour(models.Model):
@@ -16,15 +19,79 @@ class Tour(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     
     image = models.ImageField(upload_to='tour_images/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized copies of the image (see tours.imaging)")
     
     is_active = models.BooleanField(default=True, help_text="Uncheck to hide this tour from users")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Maintained by tours.signals; only populated on PostgreSQL (see tours.search)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Catalog facets (tours.facets) filter active tours by these
+            models.Index(fields=['is_active', 'location'], name='tour_active_location_idx'),
+            models.Index(fields=['is_active', 'price'], name='tour_active_price_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class TourDateQuerySet(models.QuerySet):
+
+    def upcoming(self):
+        """Departures from today onwards, soonest first."""
+        return self.filter(start_date__gte=date.today()).order_by('start_date')
+
+    def bookable(self):
+        """Dates that still have at least one free seat."""
+        return self.filter(capacity__gt=F('seats_booked') + F('seats_held'))
+
+    def with_availability(self, live=False):
+        """
+        Annotates booked seats, remaining seats and a sold-out flag for
+        every date in one query. The TourDate properties below reuse these
+        annotations instead of recomputing per instance.
+
+        By default the figures come from the seats_booked and seats_held
+        counters (no join). live=True recomputes them from Booking and the
+        unexpired SeatHolds in a single query.
+        """
+        if live:
+            from bookings.models import Booking, SeatHold
+
+            booked = Coalesce(
+                Sum('bookings__number_of_people', filter=Q(bookings__status__in=Booking.SEAT_HOLDING_STATUSES)),
+                0,
+            )
+            # A subquery, so joining holds cannot multiply the booking rows
+            held = Coalesce(
+                Subquery(
+                    SeatHold.objects.live().filter(tour_date=OuterRef('pk'))
+                    .order_by().values('tour_date').annotate(seats=Sum('seats')).values('seats')
+                ),
+                0,
+            )
+        else:
+            booked = F('seats_booked')
+            held = F('seats_held')
+
+        return self.annotate(
+            annotated_booked_seats=ExpressionWrapper(booked, output_field=IntegerField()),
+            annotated_held_seats=ExpressionWrapper(held, output_field=IntegerField()),
+        ).annotate(
+            annotated_remaining_seats=ExpressionWrapper(
+                F('capacity') - F('annotated_booked_seats') - F('annotated_held_seats'), output_field=IntegerField()
+            ),
+        ).annotate(
+            annotated_sold_out=ExpressionWrapper(
+                Q(annotated_remaining_seats__lte=0), output_field=BooleanField()
+            ),
+        )
+
+
 class TourDate(models.Model):
     """
     Specific available dates for a Tour (e.g., Manali Trip starting on 25th Dec).
@@ -33,25 +100,54 @@ class TourDate(models.Model):
     start_date = models.DateField()
     capacity = models.PositiveIntegerField(default=20, help_text="Total seats available for this batch")
 
+    # Denormalized seat counter, kept in sync by bookings.signals.
+    # Run `manage.py rebuild_seat_counts` to repair it after bulk edits.
+    seats_booked = models.PositiveIntegerField(default=0, editable=False, help_text="Seats held by Pending and Confirmed bookings")
+    # Seats reserved by SeatHolds while their customers pay (bookings.holds)
+    seats_held = models.PositiveIntegerField(default=0, editable=False, help_text="Seats reserved by unexpired seat holds")
+
+    objects = TourDateQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['tour', 'start_date'], name='tourdate_tour_start_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # The seat counters belong to bookings.seats / bookings.holds: never
+        # write back copies loaded before other customers changed them.
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ('seats_booked', 'seats_held')
+            ]
+        super().save(*args, **kwargs)
+
     # --- Helper Properties ---
+    # Prefer values annotated by TourDateQuerySet.with_availability()
     
     @property
     def booked_seats(self):
-        """Calculates how many people have booked this specific date."""
-        # We import inside the method to avoid "Circular Import" errors
-        from bookings.models import Booking 
-        
-        total_booked = Booking.objects.filter(
-            tour_date=self, 
-            status__in=['Pending', 'Confirmed']
-        ).aggregate(Sum('number_of_people'))['number_of_people__sum']
-        
-        return total_booked or 0  # Return 0 if no bookings exist
+        """How many people have booked this specific date (no query)."""
+        return getattr(self, 'annotated_booked_seats', self.seats_booked)
+
+    @property
+    def held_seats(self):
+        """Seats reserved by customers who are still paying (no query)."""
+        return getattr(self, 'annotated_held_seats', self.seats_held)
 
     @property
     def remaining_seats(self):
         """Calculates seats left."""
-        return self.capacity - self.booked_seats
+        if hasattr(self, 'annotated_remaining_seats'):
+            return self.annotated_remaining_seats
+        return self.capacity - self.booked_seats - self.held_seats
+
+    @property
+    def sold_out(self):
+        if hasattr(self, 'annotated_sold_out'):
+            return self.annotated_sold_out
+        return self.remaining_seats <= 0
 
     def __str__(self):
         """
@@ -60,7 +156,7 @@ class TourDate(models.Model):
         left = self.remaining_seats
         date_str = self.start_date.strftime('%d %b %Y')
         
-        if left <= 0:
+        if self.sold_out:
             return f"{date_str} (SOLD OUT)"
         else:
             return f"{date_str} ({left} seats left)"
@@ -72,6 +168,29 @@ class TourImage(models.Model):
     """
     tour = models.ForeignKey(Tour, on_delete=models.CASCADE, related_name='gallery_images')
     image = models.ImageField(upload_to='tour_gallery/')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False, help_text="Resized copies of the image (see tours.imaging)")
     
     def __str__(self):
-        return f"Gallery Image for {self.tour.name}"
\ No newline at end of file
+        return f"Gallery Image for {self.tour.name}"
+
+class AvailabilityMonth(models.Model):
+    """
+    Precomputed departure calendar for one month: per tour, and (tour=None)
+    across all active tours. Maintained by tours.availability; served by
+    the availability_calendar JSON endpoint.
+    """
+    tour = models.ForeignKey(Tour, on_delete=models.CASCADE, null=True, blank=True, related_name='availability_months')
+    month = models.DateField(help_text="First day of the month")
+    days = models.JSONField(default=dict, help_text='{"2025-12-25": {"departures": 1, "seats_left": 12, ...}}')
+    etag = models.CharField(max_length=32)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['tour', 'month'], condition=Q(tour__isnull=False), name='availability_tour_month_uniq'),
+            models.UniqueConstraint(fields=['month'], condition=Q(tour__isnull=True), name='availability_all_month_uniq'),
+        ]
+
+    def __str__(self):
+        scope = self.tour.name if self.tour_id else "All tours"
+        return f"{scope} – {self.month:%b %Y}"
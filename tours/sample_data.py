@@ -0,0 +1,386 @@
+"""
+Synthetic data for development and load testing (`manage.py populate_db`).
+
+Everything is derived from one seed: each unit of work (a chunk of users,
+a group of departures) seeds its own Random from (seed, kind, chunk), so
+the data is the same however many worker processes build it.
+
+Users and bookings, the big tables, are streamed with COPY on PostgreSQL
+and executemany() INSERTs elsewhere, bypassing model save() and signals;
+tours and departures are few and use bulk_create(). The derived tables
+(seat counters, availability calendar, search index, revenue rollup) are
+rebuilt afterwards by their own rebuild_* commands.
+
+Demand is skewed the way real catalogs are: a few tours and locations get
+most of the bookings, so their departures sell out (the overflow ends up
+Cancelled), and a minority of customers book repeatedly.
+"""
+import io
+import random
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from faker import Faker
+
+from bookings.models import Booking, DailyRevenue, SeatHold, normalize_transaction_id
+from .models import AvailabilityMonth, Tour, TourDate, TourImage
+from . import search
+
+PASSWORD = 'password123'
+FAKER_LOCALE = 'en_IN'
+INSERT_BATCH_SIZE = 5000
+
+# Rows per unit of work handed to a worker process
+USERS_PER_CHUNK = 20000
+BOOKINGS_PER_CHUNK = 50000
+
+TOUR_THEMES = [
+    'Adventure', 'Retreat', 'Explorer', 'Getaway', 'Heritage Walk', 'Trek', 'Safari',
+    'Backwaters Cruise', 'Food Trail', 'Wildlife Trail', 'Beach Escape', 'Pilgrimage',
+]
+CAPACITIES = (12, 16, 20, 24, 30, 40)
+PARTY_SIZES = (1, 2, 3, 4, 5, 6)
+PARTY_WEIGHTS = (22, 38, 14, 16, 6, 4)
+EMAIL_DOMAINS = ('gmail.com', 'yahoo.co.in', 'outlook.com', 'rediffmail.com', 'hotmail.com')
+
+# (status, payment_status, weight) for departures still ahead / already run
+UPCOMING_OUTCOMES = [
+    ('Pending', 'Pending', 20),
+    ('Confirmed', 'Paid', 60),
+    ('Cancelled', 'Rejected', 8),
+    ('Cancelled', 'Refunded', 12),
+]
+PAST_OUTCOMES = [
+    ('Completed', 'Paid', 78),
+    ('Cancelled', 'Rejected', 7),
+    ('Cancelled', 'Refunded', 15),
+]
+# A booking that no longer fits on its departure: the payment was turned away
+OVERFLOW_OUTCOME = ('Cancelled', 'Rejected')
+
+
+@dataclass(frozen=True)
+class Scale:
+    users: int = 20
+    tours: int = 10
+    dates_per_tour: int = 5
+    bookings: int = 100
+    seed: int = 0
+
+
+@dataclass(frozen=True)
+class Departure:
+    """A TourDate and how many bookings to generate for it."""
+    pk: int
+    tour_id: int
+    start_date: object
+    capacity: int
+    price: object
+    bookings: int
+
+
+def _rng(seed, kind, chunk=0):
+    return random.Random(f"{seed}:{kind}:{chunk}")
+
+
+def _zipf_weights(rng, count, exponent=1.1):
+    """Popularity weights 1/rank^s, handed out in random order."""
+    ranks = list(range(1, count + 1))
+    rng.shuffle(ranks)
+    return [1 / rank ** exponent for rank in ranks]
+
+
+def _aware(day, seconds):
+    moment = datetime.combine(day, time.min, tzinfo=dt_timezone.utc) + timedelta(seconds=seconds)
+    return moment if settings.USE_TZ else timezone.make_naive(moment, dt_timezone.utc)
+
+
+# --- Cleaning ---
+
+def clear():
+    """
+    Removes all catalog and booking data and every customer. Staff and
+    superuser accounts are never deleted.
+    """
+    search.unindex_tours(Tour.objects.values_list('pk', flat=True))
+
+    models = [Booking, SeatHold, DailyRevenue, AvailabilityMonth, TourImage, TourDate, Tour]
+    tables = [model._meta.db_table for model in models]
+    connection.ops.execute_sql_flush(
+        connection.ops.sql_flush(no_style(), tables, reset_sequences=False, allow_cascade=True)
+    )
+
+    User = get_user_model()
+    customers = User.objects.filter(is_staff=False, is_superuser=False).order_by('pk').values_list('pk', flat=True)
+    while True:
+        batch = list(customers[:INSERT_BATCH_SIZE])
+        if not batch:
+            break
+        User.objects.filter(pk__in=batch).delete()
+
+
+# --- Loading ---
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _db_value(column, value):
+    # Strings and numbers pass straight to the driver; dates need the backend's adapter
+    if value is None or type(value) in (str, int, bool):
+        return value
+    return column.get_db_prep_save(value, connection)
+
+
+def insert_rows(model, fields, rows):
+    """
+    Inserts tuples of python values for `fields` into model's table with
+    COPY (PostgreSQL) or batched INSERTs. Bypasses save(), field defaults
+    and auto_now, so every value must be supplied.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = [model._meta.get_field(name) for name in fields]
+    column_list = ', '.join(connection.ops.quote_name(column.column) for column in columns)
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            batch = rows[start:start + INSERT_BATCH_SIZE]
+
+            if connection.vendor == 'postgresql':
+                buffer = io.StringIO()
+                for row in batch:
+                    buffer.write('\t'.join(_copy_value(value) for value in row))
+                    buffer.write('\n')
+                sql = f"COPY {table} ({column_list}) FROM STDIN"
+                raw = cursor.cursor
+                if hasattr(raw, 'copy_expert'):  # psycopg2
+                    buffer.seek(0)
+                    raw.copy_expert(sql, buffer)
+                else:  # psycopg 3
+                    with raw.copy(sql) as copy:
+                        copy.write(buffer.getvalue())
+            else:
+                placeholders = ', '.join(['%s'] * len(columns))
+                cursor.executemany(
+                    f"INSERT INTO {table} ({column_list}) VALUES ({placeholders})",
+                    [[_db_value(column, value) for column, value in zip(columns, row)] for row in batch],
+                )
+    return len(rows)
+
+
+# --- Tours and departures (small: built in the main process) ---
+
+def create_tours(scale):
+    rng = _rng(scale.seed, 'tours')
+    fake = Faker(FAKER_LOCALE)
+    fake.seed_instance(f"{scale.seed}:tours")
+
+    locations = [fake.unique.city() for _ in range(min(max(8, scale.tours // 10), 50))]
+    location_weights = _zipf_weights(rng, len(locations))
+
+    tours = []
+    for _ in range(scale.tours):
+        location = rng.choices(locations, location_weights)[0]
+        tours.append(Tour(
+            name=f"{location} {rng.choice(TOUR_THEMES)}",
+            location=location,
+            description=fake.text(max_nb_chars=200),
+            duration_days=rng.randint(2, 15),
+            price=rng.randrange(2000, 80000, 500),
+            is_active=rng.random() < 0.95,
+        ))
+    return Tour.objects.bulk_create(tours, batch_size=1000)
+
+
+def create_departures(scale, tours):
+    """
+    Creates the TourDates, spread from ten months ago to eight months
+    ahead, and shares `scale.bookings` among them by tour popularity.
+    """
+    rng = _rng(scale.seed, 'dates')
+    today = timezone.localdate()
+    popularity = _zipf_weights(rng, len(tours))
+
+    dates, weights = [], []
+    for tour, weight in zip(tours, popularity):
+        for _ in range(scale.dates_per_tour):
+            dates.append(TourDate(
+                tour=tour,
+                start_date=today + timedelta(days=rng.randint(-300, 240)),
+                capacity=rng.choice(CAPACITIES),
+            ))
+            weights.append(weight * rng.uniform(0.5, 1.5))
+    dates = TourDate.objects.bulk_create(dates, batch_size=1000)
+
+    # Largest-remainder split, so the quotas add up to exactly scale.bookings
+    total_weight = sum(weights) or 1
+    shares = [scale.bookings * weight / total_weight for weight in weights]
+    quotas = [int(share) for share in shares]
+    leftover = scale.bookings - sum(quotas)
+    for index in sorted(range(len(shares)), key=lambda i: quotas[i] - shares[i])[:leftover]:
+        quotas[index] += 1
+
+    prices = {tour.pk: tour.price for tour in tours}
+    return [
+        Departure(tour_date.pk, tour_date.tour_id, tour_date.start_date, tour_date.capacity, prices[tour_date.tour_id], quota)
+        for tour_date, quota in zip(dates, quotas)
+    ]
+
+
+# --- Users and bookings (big: built in chunks, possibly in parallel) ---
+
+USER_FIELDS = [
+    'password', 'last_login', 'is_superuser', 'username', 'first_name', 'last_name', 'email',
+    'is_staff', 'is_active', 'date_joined', 'role', 'phone_number', 'address',
+    'booking_count', 'total_paid', 'last_booking',  # filled by rebuild_user_metrics
+]
+
+BOOKING_FIELDS = [
+    'user', 'tour', 'tour_date', 'number_of_people', 'total_price', 'transaction_id',
+    'transaction_ref', 'status', 'payment_status', 'booking_date', 'updated_at',
+]
+
+
+def user_chunks(scale):
+    """(chunk number, first user number, count) units of work."""
+    return [
+        (chunk, start, min(USERS_PER_CHUNK, scale.users - start))
+        for chunk, start in enumerate(range(0, scale.users, USERS_PER_CHUNK))
+    ]
+
+
+def booking_chunks(departures):
+    """Groups departures into units of roughly BOOKINGS_PER_CHUNK bookings."""
+    chunks, current, size = [], [], 0
+    for departure in departures:
+        if not departure.bookings:
+            continue
+        current.append(departure)
+        size += departure.bookings
+        if size >= BOOKINGS_PER_CHUNK:
+            chunks.append(current)
+            current, size = [], 0
+    if current:
+        chunks.append(current)
+    return list(enumerate(chunks))
+
+
+def build_users(seed, chunk, start, count, password_hash):
+    rng = _rng(seed, 'users', chunk)
+    fake = Faker(FAKER_LOCALE)
+    fake.seed_instance(f"{seed}:users:{chunk}")
+    today = timezone.localdate()
+
+    rows = []
+    for number in range(start, start + count):
+        first_name, last_name = fake.first_name(), fake.last_name()
+        # The running number keeps usernames unique (and clear of staff accounts)
+        username = f"{first_name}.{last_name}".lower().replace(' ', '')[:130] + f"_{number}"
+        joined = today - timedelta(days=2 + int(1095 * rng.random() ** 1.5))
+        rows.append((
+            password_hash, None, False, username, first_name, last_name,
+            f"{username}@{rng.choice(EMAIL_DOMAINS)}",
+            False, True, _aware(joined, rng.randrange(86400)), get_user_model().CUSTOMER,
+            f"+91{rng.randint(6000000000, 9999999999)}" if rng.random() < 0.9 else None,
+            fake.address().replace('\n', ', ')[:200] if rng.random() < 0.7 else None,
+            0, 0, None,
+        ))
+    return rows
+
+
+def _outcome_picker(rng, outcomes):
+    choices = [(status, payment_status) for status, payment_status, _ in outcomes]
+    weights = [weight for *_, weight in outcomes]
+    return lambda: rng.choices(choices, weights)[0]
+
+
+def build_bookings(seed, chunk, departures, user_ids):
+    """
+    Bookings for a group of departures. Seat-holding bookings never exceed
+    a departure's capacity; demand beyond it is recorded as Cancelled.
+    """
+    rng = _rng(seed, 'bookings', chunk)
+    today = timezone.localdate()
+    latest = today - timedelta(days=2)
+    cutoff = _aware(today - timedelta(days=1), 0)
+    upcoming_outcome = _outcome_picker(rng, UPCOMING_OUTCOMES)
+    past_outcome = _outcome_picker(rng, PAST_OUTCOMES)
+
+    rows = []
+    for departure in departures:
+        seats = 0
+        pick = past_outcome if departure.start_date < today else upcoming_outcome
+        for _ in range(departure.bookings):
+            people = rng.choices(PARTY_SIZES, PARTY_WEIGHTS)[0]
+            status, payment_status = pick()
+            if status != 'Cancelled':  # holds (or, once run, held) seats
+                if seats + people > departure.capacity:
+                    status, payment_status = OVERFLOW_OUTCOME
+                else:
+                    seats += people
+
+            # Booked up to five months ahead, and at least two days ago (so
+            # the data does not depend on the time of day it is generated)
+            booked_on = departure.start_date - timedelta(days=1 + int(150 * rng.random() ** 2))
+            if booked_on > latest:
+                booked_on = latest - timedelta(days=int(60 * rng.random() ** 2))
+            booking_date = _aware(booked_on, rng.randrange(86400))
+            updated_at = min(booking_date + timedelta(hours=rng.randint(0, 72)), cutoff)
+
+            transaction_id = None
+            if payment_status != 'Pending' or rng.random() < 0.8:
+                transaction_id = f"UPI{rng.randrange(10 ** 11, 10 ** 12)}"
+
+            rows.append((
+                # A few frequent travellers, a long tail of one-off customers
+                user_ids[int(len(user_ids) * rng.random() ** 3)],
+                departure.tour_id, departure.pk, people, departure.price * people,
+                transaction_id, normalize_transaction_id(transaction_id),
+                status, payment_status, booking_date, updated_at,
+            ))
+    return rows
+
+
+# Worker process state, set by init_worker()
+_worker_user_ids = []
+
+
+def init_worker(user_ids=()):
+    """ProcessPoolExecutor initializer: Django set up, own DB connection."""
+    import django
+    django.setup()
+    global _worker_user_ids
+    _worker_user_ids = list(user_ids)
+
+
+def load_users(seed, chunk, start, count, password_hash):
+    return insert_rows(get_user_model(), USER_FIELDS, build_users(seed, chunk, start, count, password_hash))
+
+
+def load_bookings(seed, chunk, departures):
+    return insert_rows(Booking, BOOKING_FIELDS, build_bookings(seed, chunk, departures, _worker_user_ids))
+
+
+def customer_ids():
+    """Generated customers in a stable order (by username, not by insert order)."""
+    User = get_user_model()
+    return list(
+        User.objects.filter(is_staff=False, is_superuser=False).order_by('username').values_list('pk', flat=True)
+    )
+
+
+def password_hash():
+    """Hashed once: every generated customer shares the same password."""
+    return make_password(PASSWORD)
@@ -0,0 +1,181 @@
+"""
+Ranked full-text search over Tour for the public catalog.
+
+PostgreSQL: a stored tsvector (Tour.search_vector) behind a GIN index, plus
+pg_trgm GIN indexes on name/location so misspelt queries still match.
+Results are ranked by ts_rank + trigram similarity.
+
+SQLite: an FTS5 shadow table (tours_tour_fts) ranked by bm25, with
+misspelt words corrected against the index vocabulary (fts5vocab).
+
+Both indexes are kept current by the Tour signals in tours.signals and can
+be rebuilt with `manage.py rebuild_search_index`.
+"""
+import difflib
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Greatest
+
+SEARCH_CONFIG = 'english'
+
+# SQLite only: relevance-ordered ids are materialized, so cap them
+MAX_SQLITE_RESULTS = 200
+
+FTS_TABLE = 'tours_tour_fts'
+FTS_VOCAB_TABLE = 'tours_tour_fts_vocab'
+
+
+def tour_search_vector():
+    """Weighted document: name and location rank above the description."""
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('location', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def tokenize(query):
+    return re.findall(r'\w+', query.lower())
+
+
+# --- Indexing (called from tours.signals) ---
+
+def index_tours(tour_ids):
+    """(Re)indexes the given tours after they were saved."""
+    from .models import Tour
+
+    tour_ids = list(tour_ids)
+    if not tour_ids:
+        return
+
+    if connection.vendor == 'postgresql':
+        Tour.objects.filter(pk__in=tour_ids).update(search_vector=tour_search_vector())
+
+    elif connection.vendor == 'sqlite':
+        rows = Tour.objects.filter(pk__in=tour_ids).values_list('pk', 'name', 'location', 'description')
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in tour_ids])
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, location, description) VALUES (%s, %s, %s, %s)",
+                list(rows),
+            )
+
+
+def unindex_tours(tour_ids):
+    """Drops deleted tours from the SQLite index (Postgres drops the row itself)."""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in tour_ids])
+
+
+# --- Querying ---
+
+def search_tours(queryset, query):
+    """
+    Filters a Tour queryset down to matches for `query`, annotated with
+    `search_rank` and ordered by relevance (best first).
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.none()
+
+    if connection.vendor == 'postgresql':
+        return _search_postgres(queryset, query, tokens)
+    if connection.vendor == 'sqlite':
+        return _search_sqlite(queryset, tokens)
+
+    # Other backends: unranked substring search
+    return queryset.filter(
+        Q(name__icontains=query) |
+        Q(location__icontains=query) |
+        Q(description__icontains=query)
+    ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def _search_postgres(queryset, query, tokens):
+    # Prefix-match the last word so results appear while the user is typing.
+    # Tokens are \w+ only, so the raw tsquery cannot be malformed.
+    raw = ' & '.join(tokens[:-1] + [f"{tokens[-1]}:*"])
+    search_query = SearchQuery(raw, search_type='raw', config=SEARCH_CONFIG)
+
+    similarity = Greatest(TrigramSimilarity('name', query), TrigramSimilarity('location', query))
+
+    return queryset.annotate(
+        search_rank=SearchRank(F('search_vector'), search_query) + similarity,
+    ).filter(
+        Q(search_vector=search_query) |
+        Q(name__trigram_similar=query) |
+        Q(location__trigram_similar=query)
+    ).order_by('-search_rank', 'name')
+
+
+def _fts_match(tokens):
+    quoted = [f'"{token}"' for token in tokens]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def _fts_ranked_ids(cursor, queryset, tokens):
+    # Only rows of the queryset (active tours, the catalog's filters) compete
+    # for the LIMIT, so hidden or filtered-out tours never crowd matches out
+    candidates, params = queryset.order_by().values('pk').query.sql_with_params()
+    cursor.execute(
+        f"SELECT rowid, -bm25({FTS_TABLE}, 10.0, 10.0, 1.0) AS score "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid IN ({candidates}) "
+        f"ORDER BY score DESC LIMIT %s",
+        [_fts_match(tokens), *params, MAX_SQLITE_RESULTS],
+    )
+    return cursor.fetchall()
+
+
+SPELLING_CUTOFF = 0.75
+
+
+def _spelling_candidates(cursor, token):
+    """
+    Indexed terms that could be a close match for `token`: same first letter,
+    and a length difflib's cutoff allows (a ratio of 2*matches/(len a + len b)
+    needs the shorter word to be at least 60% of the longer one).
+    """
+    shortest = int(len(token) * SPELLING_CUTOFF / (2 - SPELLING_CUTOFF))
+    longest = int(len(token) * (2 - SPELLING_CUTOFF) / SPELLING_CUTOFF)
+    cursor.execute(
+        f"SELECT term FROM {FTS_VOCAB_TABLE} WHERE term >= %s AND term < %s AND length(term) BETWEEN %s AND %s",
+        [token[0], chr(ord(token[0]) + 1), shortest, longest],
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _correct_spelling(cursor, tokens):
+    """Replaces words missing from the index with their closest indexed term."""
+    corrected = []
+    for token in tokens:
+        vocabulary = _spelling_candidates(cursor, token)
+        if token in vocabulary:
+            corrected.append(token)
+        else:
+            matches = difflib.get_close_matches(token, vocabulary, n=1, cutoff=SPELLING_CUTOFF)
+            corrected.append(matches[0] if matches else token)
+    return corrected
+
+
+def _search_sqlite(queryset, tokens):
+    with connection.cursor() as cursor:
+        ranked = _fts_ranked_ids(cursor, queryset, tokens)
+        if not ranked:
+            corrected = _correct_spelling(cursor, tokens)
+            if corrected != tokens:
+                ranked = _fts_ranked_ids(cursor, queryset, corrected)
+
+    if not ranked:
+        return queryset.none()
+
+    return queryset.filter(pk__in=[pk for pk, _ in ranked]).annotate(
+        search_rank=Case(
+            *[When(pk=pk, then=Value(score)) for pk, score in ranked],
+            output_field=FloatField(),
+        ),
+    ).order_by('-search_rank', 'name')
@@ -0,0 +1,114 @@
+"""
+Keeps derived catalog data in step with the tour tables:
+
+- the search index (tours.search)
+- the fragment cache versions (tours.cache)
+- resized image variants (tours.imaging)
+- the precomputed availability calendar (tours.availability)
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from bookings.seats import seats_changed
+from .models import Tour, TourDate, TourImage
+from . import availability, cache, imaging, search
+
+
+def _bump_after_commit(*scopes):
+    # After commit, so a concurrent request cannot re-cache pre-commit data
+    transaction.on_commit(lambda: cache.bump(*scopes))
+
+
+@receiver(post_save, sender=Tour)
+def index_tour(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_tours([instance.pk])
+
+
+@receiver(post_delete, sender=Tour)
+def unindex_tour(sender, instance, **kwargs):
+    search.unindex_tours([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Tour)
+def invalidate_tour(sender, instance, **kwargs):
+    _bump_after_commit('catalog', f"tour:{instance.pk}", f"seats:{instance.pk}")
+
+
+@receiver([post_save, post_delete], sender=TourDate)
+def invalidate_tour_dates(sender, instance, **kwargs):
+    _bump_after_commit(f"seats:{instance.tour_id}", 'availability')
+
+
+@receiver([post_save, post_delete], sender=TourImage)
+def invalidate_tour_gallery(sender, instance, **kwargs):
+    _bump_after_commit(f"tour:{instance.tour_id}")
+
+
+@receiver(post_save, sender=Tour)
+@receiver(post_save, sender=TourImage)
+def build_image_variants(sender, instance, raw=False, **kwargs):
+    if not raw:
+        imaging.refresh_variants(instance)
+
+
+@receiver(post_delete, sender=Tour)
+@receiver(post_delete, sender=TourImage)
+def delete_image_variants(sender, instance, **kwargs):
+    imaging.delete_variants(instance.image_variants)
+
+
+@receiver(seats_changed)
+def invalidate_seats(sender, tour_date_ids, **kwargs):
+    # Sent after commit (bookings.seats), so no on_commit here
+    touched = set(TourDate.objects.filter(pk__in=tour_date_ids).values_list('tour_id', 'start_date'))
+    cache.bump('availability', *{f"seats:{tour_id}" for tour_id, _ in touched})
+    availability.refresh(touched)
+
+
+@receiver(pre_save, sender=TourDate)
+def remember_calendar_slot(sender, instance, raw=False, **kwargs):
+    # A date moved to another month (or tour) must leave its old slot too
+    if instance.pk and not raw:
+        instance._calendar_slot = TourDate.objects.filter(pk=instance.pk).values_list('tour_id', 'start_date').first()
+
+
+@receiver(post_save, sender=TourDate)
+@receiver(post_delete, sender=TourDate)
+def refresh_calendar(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    slots = {(instance.tour_id, instance.start_date)}
+    if getattr(instance, '_calendar_slot', None):
+        slots.add(instance._calendar_slot)
+    transaction.on_commit(lambda: availability.refresh(slots))
+
+
+@receiver(pre_save, sender=Tour)
+def remember_visibility(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance._was_active = Tour.objects.filter(pk=instance.pk).values_list('is_active', flat=True).first()
+
+
+@receiver(post_save, sender=Tour)
+def patch_merged_calendar(sender, instance, created=False, raw=False, **kwargs):
+    # Activating or hiding a tour adds or removes its months in the all-tours rows
+    was_active = getattr(instance, '_was_active', None)
+    if raw or created or was_active is None or was_active == instance.is_active:
+        return
+    sign = 1 if instance.is_active else -1
+    transaction.on_commit(lambda: availability.patch_merged(availability.tour_rows(instance.pk), sign))
+
+
+@receiver(pre_delete, sender=Tour)
+def remember_calendar_rows(sender, instance, **kwargs):
+    # The per-tour rows go with the tour (cascade), so keep what to subtract
+    instance._calendar_rows = availability.tour_rows(instance.pk) if instance.is_active else []
+
+
+@receiver(post_delete, sender=Tour)
+def unmerge_deleted_tour(sender, instance, **kwargs):
+    rows = getattr(instance, '_calendar_rows', [])
+    if rows:
+        transaction.on_commit(lambda: availability.patch_merged(rows, -1))
@@ -0,0 +1,61 @@
+from django import template
+from django.core.files.storage import default_storage
+
+
+register = template.Library()
+
+DEFAULT_SIZES = {
+    'thumb': '100px',
+    'card': '(min-width: 768px) 33vw, 100vw',
+    'hero': '(min-width: 992px) 50vw, 100vw',
+}
+
+
+def _srcset(paths):
+    """'url 600w, url 1200w' from {'600': path, '1200': path}."""
+    return ', '.join(
+        f"{default_storage.url(path)} {width}w"
+        for width, path in sorted(paths.items(), key=lambda item: int(item[0]))
+    )
+
+
+@register.inclusion_tag('includes/picture.html')
+def picture(obj, variant, alt='', css_class='', style='', sizes=None, loading='lazy', fetchpriority=None):
+    """
+    <picture> for a Tour or TourImage: WebP with a JPEG fallback, both with
+    srcset. Falls back to the original upload when no variants exist yet.
+    Images are lazy-loaded; pass loading='eager' fetchpriority='high' for
+    the above-the-fold image that is the page's LCP element.
+
+        {% picture tour 'card' alt=tour.name css_class='card-img-top' %}
+        {% picture tour 'hero' alt=tour.name loading='eager' fetchpriority='high' %}
+    """
+    entry = (obj.image_variants or {}).get(variant)
+    context = {
+        'alt': alt, 'css_class': css_class, 'style': style, 'loading': loading, 'fetchpriority': fetchpriority,
+    }
+
+    if not entry or not entry.get('jpeg'):
+        context['src'] = obj.image.url if obj.image else ''
+        return context
+
+    jpeg = entry['jpeg']
+    smallest = min(jpeg, key=int)
+    context.update({
+        'src': default_storage.url(jpeg[smallest]),
+        'jpeg_srcset': _srcset(jpeg),
+        'webp_srcset': _srcset(entry.get('webp') or {}),
+        'sizes': sizes or DEFAULT_SIZES.get(variant, '100vw'),
+        'width': entry['width'],
+        'height': entry['height'],
+    })
+    return context
+
+
+@register.simple_tag
+def variant_url(obj, variant, image_format='jpeg'):
+    """URL of the 1x file of one variant, or the original upload."""
+    paths = ((obj.image_variants or {}).get(variant) or {}).get(image_format)
+    if paths:
+        return default_storage.url(paths[min(paths, key=int)])
+    return obj.image.url if obj.image else ''
@@ -1 +1,495 @@
-from django.test import TestCase
+import importlib
+import shutil
+import tempfile
+from datetime import date, timedelta
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.http import QueryDict
+from django.template import engines
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from bookings.models import Booking
+from users.models import CustomUser
+from PIL import Image
+from . import availability, imaging, search
+from .cache import get_versions, stats as cache_stats
+from .facets import CatalogFilters
+from .models import AvailabilityMonth, Tour, TourDate, TourImage
+
+
+class TourDateAvailabilityTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = CustomUser.objects.create_user(username='traveller', password='pass12345')
+        cls.tour = Tour.objects.create(
+            name='Manali Trip', location='Manali', description='Snow and hills',
+            duration_days=5, price=1000,
+        )
+
+    def add_dates(self, count, capacity=10, people=2):
+        """Creates `count` upcoming dates, each with one Pending booking."""
+        start = date.today() + timedelta(days=TourDate.objects.count() + 1)
+        for offset in range(count):
+            tour_date = TourDate.objects.create(tour=self.tour, start_date=start + timedelta(days=offset), capacity=capacity)
+            Booking.objects.create(user=self.customer, tour=self.tour, tour_date=tour_date, number_of_people=people)
+
+    def count_queries(self, url):
+        cache.clear()  # measure a cold render, not a fragment cache hit
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_booking_page_query_count_is_constant(self):
+        self.client.force_login(self.customer)
+        url = reverse('book_tour', args=[self.tour.id])
+
+        self.add_dates(3)
+        few = self.count_queries(url)
+        self.add_dates(60)
+        many = self.count_queries(url)
+
+        self.assertEqual(few, many)
+
+    def test_tour_detail_query_count_is_constant(self):
+        url = reverse('tour_detail', args=[self.tour.id])
+
+        self.add_dates(3)
+        few = self.count_queries(url)
+        self.add_dates(60)
+        many = self.count_queries(url)
+
+        self.assertEqual(few, many)
+
+    def test_annotated_properties_need_no_queries(self):
+        self.add_dates(5, capacity=2)
+        dates = list(TourDate.objects.upcoming().with_availability())
+
+        with self.assertNumQueries(0):
+            labels = [str(tour_date) for tour_date in dates]
+            sold_out = [tour_date.sold_out for tour_date in dates]
+
+        self.assertTrue(all(label.endswith('(SOLD OUT)') for label in labels))
+        self.assertTrue(all(sold_out))
+
+    def test_live_availability_matches_counter(self):
+        self.add_dates(4, capacity=10, people=3)
+        Booking.objects.filter(tour_date=TourDate.objects.first()).update(status='Cancelled')
+
+        live = {d.pk: d.remaining_seats for d in TourDate.objects.with_availability(live=True)}
+        counted = {d.pk: d.remaining_seats for d in TourDate.objects.with_availability()}
+
+        # The bulk update above bypassed the signals, so only the live figures see it
+        first = TourDate.objects.first().pk
+        self.assertEqual(live[first], 10)
+        self.assertEqual(counted[first], 7)
+        self.assertEqual({k: v for k, v in live.items() if k != first}, {k: v for k, v in counted.items() if k != first})
+
+
+class TourSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for name, location, description in [
+            ('Swiss Alps Adventure', 'Zurich', 'Snow peaks and chocolate'),
+            ('Bali Beach Retreat', 'Bali', 'Surf and sunsets'),
+            ('Goa Beach Party', 'Goa', 'Music on the sand, far from the alps'),
+        ]:
+            Tour.objects.create(name=name, location=location, description=description, duration_days=4, price=500)
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get(reverse('home'), {'q': query})
+        return [tour.name for tour in response.context['tours']]
+
+    def test_results_are_ranked_by_relevance(self):
+        # A name match outranks a description match
+        self.assertEqual(self.search('alps'), ['Swiss Alps Adventure', 'Goa Beach Party'])
+
+    def test_prefix_and_typo_tolerance(self):
+        self.assertEqual(self.search('swi'), ['Swiss Alps Adventure'])
+        self.assertEqual(self.search('zurch'), ['Swiss Alps Adventure'])
+
+    def test_hidden_tours_do_not_take_up_the_result_limit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Tour.objects.create(name='Alps Alps Alps', location='Alps', description='Alps', duration_days=4, price=500, is_active=False)
+        with mock.patch('tours.search.MAX_SQLITE_RESULTS', 1):
+            self.assertEqual(self.search('alps'), ['Swiss Alps Adventure'])
+
+    def test_spelling_is_checked_against_similar_terms_only(self):
+        with connection.cursor() as cursor:
+            self.assertEqual(search._spelling_candidates(cursor, 'zurch'), ['zurich'])
+            self.assertEqual(search._correct_spelling(cursor, ['zurch', 'peaks']), ['zurich', 'peaks'])
+
+    def test_index_follows_saves_and_deletes(self):
+        tour = Tour.objects.get(name='Goa Beach Party')
+        tour.name = 'Goa Jungle Trek'
+        with self.captureOnCommitCallbacks(execute=True):
+            tour.save()
+        self.assertEqual(self.search('jungle'), ['Goa Jungle Trek'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tour.delete()
+        self.assertEqual(self.search('goa'), [])
+
+
+class AvailabilityCalendarTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = CustomUser.objects.create_user(username='planner', password='pass12345')
+        cls.month = date(date.today().year + 1, 3, 1)
+        cls.tours = [
+            Tour.objects.create(name=name, location=name, description='Trek', duration_days=3, price=500)
+            for name in ('Kedarkantha', 'Hampta Pass')
+        ]
+        cls.dates = [
+            TourDate.objects.create(tour=tour, start_date=cls.month.replace(day=10), capacity=20)
+            for tour in cls.tours
+        ]
+
+    def setUp(self):
+        availability.rebuild()
+
+    def url(self):
+        return reverse('availability_calendar', args=[self.month.year, self.month.month])
+
+    def rows(self):
+        tour, _ = self.tours
+        day = self.month.replace(day=10).isoformat()
+        per_tour = AvailabilityMonth.objects.get(tour=tour, month=self.month).days[day]
+        merged = AvailabilityMonth.objects.get(tour=None, month=self.month).days
+        self.assertEqual(merged, availability._merged_days(self.month))  # the patched row matches a full merge
+        return per_tour['seats_left'], merged[day]['seats_left']
+
+    def test_etag_answers_304_until_seats_change(self):
+        response = self.client.get(self.url())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['days'][self.month.replace(day=10).isoformat()]['tours'], 2)
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(self.url(), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(user=self.customer, tour=self.tours[0], tour_date=self.dates[0], number_of_people=2)
+        response = self.client.get(self.url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_booking_and_cancellation_update_tour_and_all_tours_rows(self):
+        self.assertEqual(self.rows(), (20, 40))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = Booking.objects.create(user=self.customer, tour=self.tours[0], tour_date=self.dates[0], number_of_people=3)
+        self.assertEqual(self.rows(), (17, 37))
+
+        booking.status = 'Cancelled'
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.save()
+        self.assertEqual(self.rows(), (20, 40))
+
+    def test_hiding_a_tour_removes_it_from_the_all_tours_row(self):
+        tour = self.tours[1]
+        tour.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            tour.save()
+        self.assertEqual(self.rows(), (20, 20))
+
+        tour.is_active = True
+        with self.captureOnCommitCallbacks(execute=True):
+            tour.save()
+        self.assertEqual(self.rows(), (20, 40))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tour.delete()
+        self.assertEqual(self.rows(), (20, 20))
+
+    def test_a_concurrent_patch_of_the_all_tours_row_is_retried_not_lost(self):
+        real_etag = availability._etag
+        raced = []
+
+        def etag(month, tour_id, days):
+            if tour_id is None and not raced:  # another booking patches the row between our read and write
+                raced.append(AvailabilityMonth.objects.filter(tour=None, month=month).update(etag='concurrent'))
+            return real_etag(month, tour_id, days)
+
+        with mock.patch.object(availability, '_etag', side_effect=etag):
+            with self.captureOnCommitCallbacks(execute=True):
+                Booking.objects.create(user=self.customer, tour=self.tours[0], tour_date=self.dates[0], number_of_people=3)
+        self.assertEqual(raced, [1])
+        self.assertEqual(self.rows(), (17, 37))
+        merged = AvailabilityMonth.objects.get(tour=None, month=self.month)
+        self.assertEqual(merged.etag, availability._etag(self.month, None, merged.days))
+
+    def test_migration_backfill_matches_a_rebuild(self):
+        TourDate.objects.create(tour=self.tours[0], start_date=self.month.replace(day=10), capacity=6)
+        hidden = Tour.objects.create(name='Closed Trail', location='Manali', description='Trek', duration_days=2, price=400, is_active=False)
+        TourDate.objects.create(tour=hidden, start_date=self.month.replace(day=21), capacity=8)
+        Booking.objects.create(user=self.customer, tour=self.tours[1], tour_date=self.dates[1], number_of_people=4)
+        availability.rebuild()
+        rows = AvailabilityMonth.objects.order_by('tour', 'month').values_list('tour', 'month', 'days', 'etag')
+        rebuilt = list(rows)
+
+        AvailabilityMonth.objects.all().delete()
+        migration = importlib.import_module('tours.migrations.0010_availability_month')
+        migration.backfill_calendar(apps, schema_editor=None)
+        self.assertEqual(list(rows), rebuilt)
+
+
+def use_temporary_media(test):
+    """Points MEDIA_ROOT at a directory removed after the test."""
+    media_root = tempfile.mkdtemp(prefix='bondvoyage-media-')
+    test.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+    media = override_settings(MEDIA_ROOT=media_root)
+    media.enable()
+    test.addCleanup(media.disable)
+
+
+def jpeg_upload(name, size):
+    buffer = BytesIO()
+    Image.new('RGB', size, (40, 120, 200)).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class CatalogFacetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        start = date.today() + timedelta(days=20)
+        user = CustomUser.objects.create_user(username='facet-filler')
+        for n in range(24):
+            tour = Tour.objects.create(
+                name=f'Facet Tour {n}', location=['Goa', 'Leh', 'Munnar', 'Jaipur'][n % 4], description='Trip',
+                duration_days=[2, 5, 9, 16, 3][n % 5], price=[3000, 7500, 12000, 30000, 60000, 4999][n % 6],
+                is_active=n != 23,
+            )
+            if n % 3:
+                tour_date = TourDate.objects.create(tour=tour, start_date=start + timedelta(days=n), capacity=4)
+                if n % 7 == 0:
+                    Booking.objects.create(user=user, tour=tour, tour_date=tour_date, number_of_people=4)  # sold out
+
+    def assert_counts_match_filtered_queries(self, query):
+        params = QueryDict(query)
+        tours = Tour.objects.filter(is_active=True)
+        facets = CatalogFilters(params).counts(tours)
+
+        for facet, choices in facets.items():
+            for choice in choices:
+                # The count a choice shows is what selecting it instead of this facet's current selection returns
+                narrowed = params.copy()
+                narrowed.setlist(facet, [choice['value']])
+                with self.subTest(query=query, facet=facet, choice=choice['value']):
+                    self.assertEqual(choice['count'], CatalogFilters(narrowed).apply(tours).count())
+
+    def test_counts_match_the_filtered_count_under_combined_filters(self):
+        window = f"available_from={date.today() + timedelta(days=20)}&available_to={date.today() + timedelta(days=40)}"
+        for query in (
+            '',
+            'location=Goa',
+            'location=Goa&location=Leh&price=0-5000',
+            'price=5000-10000&price=50000-&duration=1-3',
+            'location=Munnar&duration=4-7&duration=15-',
+            window,
+            f'location=Leh&location=Jaipur&price=10000-25000&duration=8-14&{window}',
+        ):
+            self.assert_counts_match_filtered_queries(query)
+
+    def test_counts_take_one_query(self):
+        with self.assertNumQueries(1):
+            CatalogFilters(QueryDict('location=Goa&price=0-5000&duration=1-3')).counts(Tour.objects.filter(is_active=True))
+
+    @skipUnless(connection.vendor == 'sqlite', "Plan text and small-table plans differ per backend")
+    def test_counts_use_the_catalog_indexes(self):
+        window = f"available_from={date.today() + timedelta(days=20)}&available_to={date.today() + timedelta(days=40)}"
+        filters = CatalogFilters(QueryDict(f'location=Goa&{window}'))
+        tours = Tour.objects.filter(is_active=True)
+
+        plan = filters.apply_availability(tours).order_by().values('location').annotate(total=Count('pk')).explain()
+        self.assertIn('tour_active_location_idx', plan)
+        self.assertIn('tourdate_tour_start_idx', filters.apply(tours).explain())  # one range scan per tour, not a date scan
+
+
+class FragmentCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = CustomUser.objects.create_user(username='rafter')
+        cls.tour = Tour.objects.create(name='Rishikesh Rafting', location='Rishikesh', description='Rapids', duration_days=2, price=3000)
+        cls.tour_date = TourDate.objects.create(tour=cls.tour, start_date=date.today() + timedelta(days=12), capacity=10)
+
+    def setUp(self):
+        cache.clear()
+        use_temporary_media(self)
+
+    def page(self, name, *args, **params):
+        response = self.client.get(reverse(name, args=args), params)
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def book(self, people):
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(user=self.customer, tour=self.tour, tour_date=self.tour_date, number_of_people=people)
+
+    def test_booking_refreshes_cached_seat_counts(self):
+        self.assertIn('10 seats left', self.page('tour_detail', self.tour.pk))
+        hits = cache_stats()['tour_seats']['hits']
+
+        # A change that skips the signals is not seen: the fragment really is cached
+        TourDate.objects.filter(pk=self.tour_date.pk).update(capacity=20)
+        self.assertIn('10 seats left', self.page('tour_detail', self.tour.pk))
+        self.assertEqual(cache_stats()['tour_seats']['hits'], hits + 1)
+
+        versions = get_versions([f"seats:{self.tour.pk}", f"tour:{self.tour.pk}"])
+        self.book(3)
+        bumped = get_versions([f"seats:{self.tour.pk}", f"tour:{self.tour.pk}"])
+        self.assertNotEqual(bumped[0], versions[0])
+        self.assertEqual(bumped[1], versions[1])  # the tour's content fragments stay cached
+        self.assertIn('17 seats left', self.page('tour_detail', self.tour.pk))
+
+    def test_filling_a_departure_refreshes_the_date_window_grid(self):
+        window = {'available_from': self.tour_date.start_date.isoformat()}
+        self.assertIn('Rishikesh Rafting', self.page('home', **window))
+
+        self.book(10)
+        self.assertNotIn('Rishikesh Rafting', self.page('home', **window))
+        self.assertIn('Rishikesh Rafting', self.page('home'))
+
+    def test_tour_edit_refreshes_home_and_detail(self):
+        self.assertIn('Rishikesh Rafting', self.page('home'))
+        self.assertIn('Rapids', self.page('tour_detail', self.tour.pk))
+        versions = get_versions(['catalog', f"tour:{self.tour.pk}"])
+
+        tour = Tour.objects.get(pk=self.tour.pk)
+        tour.name, tour.description = 'Ganges Whitewater', 'Grade IV rapids'
+        with self.captureOnCommitCallbacks(execute=True):
+            tour.save()
+
+        bumped = get_versions(['catalog', f"tour:{self.tour.pk}"])
+        self.assertTrue(all(new != old for new, old in zip(bumped, versions)))
+        home = self.page('home')
+        self.assertIn('Ganges Whitewater', home)
+        self.assertNotIn('Rishikesh Rafting', home)
+        self.assertIn('Grade IV rapids', self.page('tour_detail', self.tour.pk))
+
+    def test_gallery_changes_refresh_the_detail_page(self):
+        self.assertNotIn('Tour Photo', self.page('tour_detail', self.tour.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            photo = TourImage.objects.create(tour=self.tour, image=jpeg_upload('rapids.jpg', (700, 500)))
+        self.assertIn('Tour Photo', self.page('tour_detail', self.tour.pk))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.delete()
+        self.assertNotIn('Tour Photo', self.page('tour_detail', self.tour.pk))
+
+
+class ImageVariantTests(TestCase):
+
+    def setUp(self):
+        use_temporary_media(self)
+
+    def upload(self, name, size):
+        return jpeg_upload(name, size)
+
+    def create_tour(self, image):
+        return Tour.objects.create(name='Munnar Tea Hills', location='Munnar', description='Tea', duration_days=3, price=600, image=image)
+
+    def test_upload_builds_every_variant_without_upscaling(self):
+        tour = self.create_tour(self.upload('munnar.jpg', (1300, 900)))
+        variants = Tour.objects.get(pk=tour.pk).image_variants
+
+        self.assertEqual(variants['source'], tour.image.name)
+        self.assertEqual(sorted(variants['card']['jpeg']), ['1200', '600'])
+        # 2x hero would need 2400px of source: only the 1x file is made
+        self.assertEqual(sorted(variants['hero']['webp']), ['1200'])
+        for variant, (width, height) in imaging.VARIANTS.items():
+            for image_format, paths in (('WEBP', variants[variant]['webp']), ('JPEG', variants[variant]['jpeg'])):
+                for rendered_width, path in paths.items():
+                    with default_storage.open(path) as handle, Image.open(handle) as image:
+                        scale = int(rendered_width) // width
+                        self.assertEqual((image.format, image.size), (image_format, (width * scale, height * scale)))
+
+    def test_new_image_replaces_and_delete_removes_the_files(self):
+        tour = self.create_tour(self.upload('old.jpg', (700, 500)))
+        old_paths = list(imaging.variant_paths(tour.image_variants))
+        self.assertTrue(old_paths)
+
+        tour.image = self.upload('new.jpg', (700, 500))
+        tour.save()
+        new_paths = list(imaging.variant_paths(tour.image_variants))
+        self.assertFalse([path for path in old_paths if default_storage.exists(path)])
+        self.assertTrue(all(default_storage.exists(path) for path in new_paths))
+
+        tour.delete()
+        self.assertFalse([path for path in new_paths if default_storage.exists(path)])
+
+    def test_unreadable_upload_falls_back_to_the_original(self):
+        with self.assertLogs('tours.imaging', 'ERROR'):
+            tour = self.create_tour(SimpleUploadedFile('broken.jpg', b'not an image', content_type='image/jpeg'))
+        self.assertEqual(tour.image_variants, {'source': tour.image.name})
+
+        html = engines['django'].from_string("{% load tour_images %}{% picture tour 'card' %}").render({'tour': tour})
+        self.assertIn(f'src="{tour.image.url}"', html)
+        self.assertNotIn('<picture>', html)
+
+    def test_hero_loads_eagerly_and_cards_lazily(self):
+        tour = self.create_tour(self.upload('hero.jpg', (1300, 900)))
+        template = engines['django'].from_string(
+            "{% load tour_images %}{% picture tour 'card' %}|{% picture tour 'hero' loading='eager' fetchpriority='high' %}"
+        )
+        card, hero = template.render({'tour': tour}).split('|')
+        self.assertIn('loading="lazy"', card)
+        self.assertNotIn('fetchpriority', card)
+        self.assertIn('loading="eager" fetchpriority="high"', hero)
+
+        cache.clear()
+        response = self.client.get(reverse('tour_detail', args=[tour.pk]))
+        self.assertContains(response, 'class="detail-image" style="" alt="Munnar Tea Hills" loading="eager" fetchpriority="high"')
+
+
+class PopulateDbTests(TestCase):
+
+    def populate(self, seed=7):
+        call_command(
+            'populate_db', users=40, tours=4, dates_per_tour=3, bookings=300, seed=seed, stdout=StringIO(),
+        )
+        return (
+            list(CustomUser.objects.filter(is_staff=False).order_by('username').values_list('username', 'phone_number')),
+            list(Booking.objects.order_by('tour__name', 'tour_date__start_date', 'booking_date', 'user__username').values_list(
+                'user__username', 'tour__name', 'number_of_people', 'status', 'payment_status', 'booking_date',
+            )),
+        )
+
+    def test_builds_the_requested_scale_and_keeps_staff(self):
+        staff = CustomUser.objects.create_user(username='ops', password='pass12345', is_staff=True)
+        self.populate()
+
+        self.assertTrue(CustomUser.objects.filter(pk=staff.pk).exists())
+        self.assertEqual(CustomUser.objects.filter(is_staff=False).count(), 40)
+        self.assertEqual(TourDate.objects.count(), 12)
+        self.assertEqual(Booking.objects.count(), 300)
+        self.assertLess(Booking.objects.filter(status='Cancelled').count(), 300)
+
+        # Derived tables were rebuilt: nothing oversold, nothing drifted
+        for tour_date in TourDate.objects.all():
+            self.assertLessEqual(tour_date.seats_booked, tour_date.capacity)
+        call_command('rebuild_seat_counts', check=True, stdout=StringIO())
+        call_command('rebuild_revenue_rollup', check=True, stdout=StringIO())
+
+    def test_same_seed_same_data(self):
+        first = self.populate(seed=3)
+        self.assertEqual(self.populate(seed=3), first)
+        self.assertNotEqual(self.populate(seed=4), first)
@@ -5,10 +5,12 @@ urlpatterns = [
     # Public Pages
     path('', views.home, name='home'),  # The Homepage
     path('tour/<int:tour_id>/', views.tour_detail, name='tour_detail'),
+    path('availability/<int:year>/<int:month>/', views.availability_calendar, name='availability_calendar'),
 
     # Admin Tour Management
     path('admin-panel/tours/', views.admin_tour_list, name='admin_tour_list'),
     path('admin-panel/tours/add/', views.admin_add_tour, name='admin_add_tour'),
     path('admin-panel/tours/edit/<int:tour_id>/', views.admin_edit_tour, name='admin_edit_tour'),
     path('admin-panel/tours/delete/<int:tour_id>/', views.admin_delete_tour, name='admin_delete_tour'),
+    path('admin-panel/cache-stats/', views.catalog_cache_stats, name='catalog_cache_stats'),
 ]
\ No newline at end of file
@@ -1,44 +1,125 @@
 from datetime import date
+from django.conf import settings
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.admin.views.decorators import staff_member_required
 from django.db.models import Q
 from django.forms import inlineformset_factory
+from django.http import Http404, JsonResponse
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
 
 from .models import Tour, TourDate, TourImage
 from .forms import TourForm, TourDateForm 
+from .search import search_tours
+from .facets import CatalogFilters
+from .cache import cached_fragment, stats as cache_stats
+from . import availability
+from bondvoyage.pagination import paginate_keyset
 
 def home(request):
     """
     The Homepage.
-    Displays all ACTIVE tours and handles the search bar.
+    Displays all ACTIVE tours and handles the search bar and facet filters.
+    The tour grid is served from the fragment cache (see tours.cache).
     """
-    tours = Tour.objects.filter(is_active=True).order_by('name')
-    
-    query = request.GET.get('q')
-    if query:
-        tours = tours.filter(
-            Q(name__icontains=query) | 
-            Q(location__icontains=query) |
-            Q(description__icontains=query)
-        )
+    filters = CatalogFilters(request.GET)
+
+    def render_grid():
+        tours = Tour.objects.filter(is_active=True).order_by('name')
+        
+        query = request.GET.get('q')
+        if query:
+            tours = search_tours(tours, query)  # Ranked by relevance
+
+        facets = filters.counts(tours)  # Counts are taken before the facets narrow the list
+        page = paginate_keyset(request, filters.apply(tours), per_page=12)
+        return render_to_string('includes/tour_grid.html', {
+            'tours': page,
+            'page': page,
+            'facets': facets,
+            'filters': filters,
+        }, request=request)
+
+    # The date-window facet depends on seat counts, which the catalog scope ignores
+    scopes = ['catalog', 'availability'] if filters.has_date_window else ['catalog']
+    tour_grid = cached_fragment(
+        'home', scopes, render_grid, vary_on=[date.today(), *sorted(request.GET.lists())],
+    )
         
-    return render(request, 'home.html', {'tours': tours})
+    return render(request, 'home.html', {'tour_grid': mark_safe(tour_grid)})
 
 
 def tour_detail(request, tour_id):
     """
     Detailed view of a single tour package.
+    Tour content and seat availability are cached separately: seats change
+    far more often and must never be staler than TOUR_SEATS_MAX_STALENESS.
     """
-    tour = get_object_or_404(Tour, pk=tour_id)
-    
-    available_dates = tour.dates.filter(start_date__gte=date.today()).order_by('start_date')
+    def render_fragments():
+        tour = get_object_or_404(Tour, pk=tour_id)
+        context = {'tour': tour}
+        return {
+            'media': render_to_string('includes/tour_detail_media.html', context),
+            'summary': render_to_string('includes/tour_detail_summary.html', context),
+            'extras': render_to_string('includes/tour_detail_extras.html', context),
+        }
+
+    def render_departures():
+        available_dates = TourDate.objects.filter(tour_id=tour_id).upcoming().with_availability()
+        return render_to_string('includes/tour_departures.html', {'available_dates': available_dates})
+
+    fragments = cached_fragment('tour_detail', [f"tour:{tour_id}"], render_fragments)
+    departures = cached_fragment(
+        'tour_seats', [f"seats:{tour_id}"], render_departures,
+        vary_on=[date.today()], timeout=settings.TOUR_SEATS_MAX_STALENESS,
+    )
     
     return render(request, 'tour_detail.html', {
-        'tour': tour, 
-        'available_dates': available_dates
+        'tour_id': tour_id,
+        'fragments': {name: mark_safe(html) for name, html in fragments.items()},
+        'departures': mark_safe(departures),
     })
 
 
+def _calendar_scope(request, year, month):
+    """(first day of the month, tour id or None) from the URL, or 404."""
+    try:
+        first = date(year, month, 1)
+        tour_id = int(request.GET['tour']) if request.GET.get('tour') else None
+    except ValueError:
+        raise Http404("No such month or tour")
+    return first, tour_id
+
+
+def _calendar_etag(request, year, month):
+    return availability.current_etag(*_calendar_scope(request, year, month))
+
+
+@require_GET
+@cache_control(no_cache=True)  # Always revalidate; unchanged months cost a 304
+@condition(etag_func=_calendar_etag)
+def availability_calendar(request, year, month):
+    """
+    Per-day departure availability for one month, as JSON: across all
+    active tours, or for one tour with ?tour=<id>. Served from the
+    precomputed calendar (tours.availability); supports If-None-Match.
+    """
+    first, tour_id = _calendar_scope(request, year, month)
+    if tour_id is not None:
+        get_object_or_404(Tour, pk=tour_id, is_active=True)
+    return JsonResponse(availability.month_payload(first, tour_id))
+
+
+@staff_member_required
+def catalog_cache_stats(request):
+    """
+    Hit/miss counters of the catalog fragment cache, as JSON.
+    """
+    return JsonResponse(cache_stats())
+
+
 TourDateFormSet = inlineformset_factory(
     Tour, TourDate, 
     form=TourDateForm, 
@@ -66,8 +147,10 @@ def admin_tour_list(request):
             Q(name__icontains=query) | 
             Q(location__icontains=query)
         )
+
+    page = paginate_keyset(request, tours)
         
-    return render(request, 'admin/tour_list.html', {'tours': tours})
+    return render(request, 'admin/tour_list.html', {'tours': page, 'page': page})
 
 
 @staff_member_required
@@ -119,7 +202,7 @@ def admin_edit_tour(request, tour_id):
             request.POST, 
             instance=tour, 
             prefix='dates',
-            queryset=TourDate.objects.filter(start_date__gte=date.today())
+            queryset=TourDate.objects.upcoming().with_availability()
         )
         image_formset = TourImageFormSet(request.POST, request.FILES, instance=tour, prefix='gallery_images')
 
@@ -134,7 +217,7 @@ def admin_edit_tour(request, tour_id):
         date_formset = TourDateFormSet(
             instance=tour, 
             prefix='dates',
-            queryset=TourDate.objects.filter(start_date__gte=date.today())
+            queryset=TourDate.objects.upcoming().with_availability()
         )
         image_formset = TourImageFormSet(instance=tour, prefix='gallery_images')
 
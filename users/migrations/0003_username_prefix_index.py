@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 07:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0002_alter_customuser_address_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['username'], name='user_username_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 6.0 on 2026-10-18 09:10
+
+import users.models
+from django.db import migrations, models
+
+
+# Substring search (ILIKE '%abc%') on the staff user list is served by
+# pg_trgm GIN indexes, which are PostgreSQL only and so created here rather
+# than declared in CustomUser.Meta.indexes.
+
+TRIGRAM_INDEXES = {
+    'users_customuser_username_trgm': 'username',
+    'users_customuser_email_trgm': 'email',
+    'users_customuser_phone_trgm': 'phone_number',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for index, column in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {index} ON users_customuser USING gin (UPPER({column}::text) gin_trgm_ops)"
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for index in TRIGRAM_INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0003_username_prefix_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='customuser',
+            managers=[
+                ('objects', users.models.CustomUserManager()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['email'], name='user_email_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['phone_number'], name='user_phone_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['date_joined'], name='user_joined_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['role', 'date_joined'], name='user_role_joined_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
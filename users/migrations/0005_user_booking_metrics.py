@@ -0,0 +1,64 @@
+# Generated by Django 6.0 on 2026-10-18 14:20
+
+from decimal import Decimal
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_booking_metrics(apps, schema_editor):
+    # Same expressions as bookings.user_metrics, over the historical models
+    User = apps.get_model('users', 'CustomUser')
+    Booking = apps.get_model('bookings', 'Booking')
+    mine = Booking.objects.filter(user=OuterRef('pk')).order_by().values('user')
+    User.objects.update(
+        booking_count=Coalesce(Subquery(mine.annotate(total=Count('pk')).values('total')), Value(0), output_field=IntegerField()),
+        total_paid=Coalesce(
+            Subquery(mine.filter(payment_status='Paid').annotate(total=Sum('total_price')).values('total')),
+            Value(Decimal('0')), output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+        last_booking=Subquery(Booking.objects.filter(user=OuterRef('pk')).order_by('-booking_date').values('booking_date')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0004_user_list_indexes'),
+        ('bookings', '0013_booking_user_paid_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='booking_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='last_booking',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='total_paid',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=14),
+        ),
+        # Before the indexes, so the backfill does not maintain them row by row
+        migrations.RunPython(backfill_booking_metrics, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['booking_count', 'id'], name='user_booking_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['total_paid', 'id'], name='user_total_paid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.comparison.Coalesce('last_booking', 'date_joined'), models.F('id'), name='user_last_booking_idx'),
+        ),
+    ]
@@ -1,5 +1,41 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce
+
+# Below this many characters a search is a prefix match (btree pattern
+# indexes); from here on a substring match (pg_trgm GIN indexes)
+TRIGRAM_MIN_LENGTH = 3
+
+LAST_BOOKING_KEY = Coalesce('last_booking', 'date_joined')
+
+
+class CustomUserQuerySet(models.QuerySet):
+
+    def search(self, query):
+        """Staff search on username, email and phone number."""
+        query = query.strip()
+        if not query:
+            return self
+        lookup = 'icontains' if len(query) >= TRIGRAM_MIN_LENGTH else 'startswith'
+        return self.filter(
+            Q(**{f'username__{lookup}': query})
+            | Q(**{f'email__{lookup}': query})
+            | Q(**{f'phone_number__{lookup}': query})
+        )
+
+    def with_last_booking_key(self):
+        """
+        Annotates last_booking_key: the last booking, or date_joined for
+        users who never booked. The user_last_booking_idx expression index
+        serves ordering and keyset pagination on it.
+        """
+        return self.annotate(last_booking_key=LAST_BOOKING_KEY)
+
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    pass
+
 
 class CustomUser(AbstractUser):
     """
@@ -35,6 +71,30 @@ class CustomUser(AbstractUser):
         help_text="Residential address for billing."
     )
 
+    # Booking metrics for the staff user list, kept in step with the
+    # Booking table by bookings.user_metrics
+    booking_count = models.PositiveIntegerField(default=0, editable=False)
+    total_paid = models.DecimalField(max_digits=14, decimal_places=2, default=0, editable=False)
+    last_booking = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = CustomUserManager()
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Booking search matches username prefixes (LIKE 'abc%'); PostgreSQL
+            # only uses an index for that with the pattern operator class.
+            models.Index(fields=['username'], name='user_username_prefix_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['email'], name='user_email_prefix_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['phone_number'], name='user_phone_prefix_idx', opclasses=['varchar_pattern_ops']),
+            # Staff user list: newest first, optionally one role
+            models.Index(fields=['date_joined'], name='user_joined_idx'),
+            models.Index(fields=['role', 'date_joined'], name='user_role_joined_idx'),
+            # Staff user list sorted by a booking metric (id is the keyset tie-breaker)
+            models.Index(fields=['booking_count', 'id'], name='user_booking_count_idx'),
+            models.Index(fields=['total_paid', 'id'], name='user_total_paid_idx'),
+            models.Index(LAST_BOOKING_KEY, F('id'), name='user_last_booking_idx'),
+        ]
+
     def __str__(self):
         return f"{self.username} ({self.get_role_display()})"
 
@@ -1 +1,233 @@
-from django.test import TestCase
\ No newline at end of file
+from datetime import date, timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from bookings.models import Booking
+from bookings.workflow import apply_transition
+from tours.models import Tour, TourDate
+from .models import CustomUser
+
+
+class AdminDashboardStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user(username='boss', password='pass12345', is_staff=True)
+        customer = CustomUser.objects.create_user(username='guest', password='pass12345')
+        tour = Tour.objects.create(name='Coorg Coffee Trail', location='Coorg', description='Estates', duration_days=3, price=300)
+        tour_date = TourDate.objects.create(tour=tour, start_date=date.today() + timedelta(days=12), capacity=100)
+        cls.bookings = [
+            Booking.objects.create(user=customer, tour=tour, tour_date=tour_date, number_of_people=people).pk
+            for people in (1, 2, 3, 4)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.staff)
+
+    def stats(self):
+        return self.client.get(reverse('admin_dashboard_stats')).json()
+
+    def test_one_query_then_cached(self):
+        self.client.get(reverse('admin_dashboard'))  # warm the session/user lookups
+
+        cache.clear()
+        with self.assertNumQueries(3):  # session, user, stats
+            response = self.client.get(reverse('admin_dashboard'))
+        with self.assertNumQueries(2):
+            self.client.get(reverse('admin_dashboard'))
+
+        self.assertEqual(response.context['total_bookings'], 4)
+        self.assertEqual(response.context['pending_bookings'], 4)
+        self.assertEqual(float(response.context['pending_pay_amt']), 3000)
+
+    def test_booking_changes_clear_the_cache(self):
+        self.assertEqual(float(self.stats()['total_revenue']), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_transition('verify_payment', self.bookings[:2])
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_transition('reject_payment', self.bookings[2:3])
+
+        stats = self.stats()
+        self.assertEqual(stats['confirmed_bookings'], 2)
+        self.assertEqual(stats['cancelled_bookings'], 1)
+        self.assertEqual(stats['rejected_pay_cnt'], 1)
+        self.assertEqual(float(stats['total_revenue']), 900)
+
+
+class CustomerDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = CustomUser.objects.create_user(username='frequent', password='pass12345')
+        cls.tour = Tour.objects.create(name='Andaman Dive', location='Havelock', description='Reefs', duration_days=5, price=800)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.customer)
+
+    def add_trips(self, count, days_from_now):
+        for offset in range(count):
+            start = date.today() + timedelta(days=days_from_now + offset)
+            tour_date = TourDate.objects.create(tour=self.tour, start_date=start, capacity=10)
+            Booking.objects.create(user=self.customer, tour=self.tour, tour_date=tour_date)
+
+    def render(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard'), params)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.content.decode()
+
+    def test_query_count_does_not_grow_with_history(self):
+        self.add_trips(2, 10)
+        self.add_trips(2, -30)
+        few, _ = self.render()
+
+        self.add_trips(30, 40)
+        self.add_trips(30, -100)
+        cache.clear()
+        many, html = self.render()
+
+        self.assertEqual(few, many)
+        self.assertIn('32 Upcoming', html)
+        self.assertIn('32 of 64 Trips', html)
+
+    def test_cached_until_a_booking_changes(self):
+        self.add_trips(1, 10)
+        first, _ = self.render()
+        cached, _ = self.render()
+        self.assertLess(cached, first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_trips(1, 20)
+        _, html = self.render()
+        self.assertIn('2 Upcoming', html)
+
+    def test_pages_walk_upcoming_trips_in_date_order(self):
+        self.add_trips(15, 5)
+        _, html = self.render()
+        self.assertIn('upcoming=', html)  # next-page link
+
+        next_query = html.split('href="?')[1].split('"')[0].replace('&amp;', '&')
+        response = self.client.get(reverse('dashboard') + '?' + next_query)
+        self.assertEqual(len(response.content.decode().split('history-tour-name')) - 1, 5)
+
+
+class AdminUserListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = CustomUser.objects.create_user(username='boss', password='pass12345', is_staff=True)
+        cls.tour = Tour.objects.create(name='Rishikesh Rafting', location='Rishikesh', description='Rapids', duration_days=2, price=100)
+        cls.tour_date = TourDate.objects.create(tour=cls.tour, start_date=date.today() + timedelta(days=20), capacity=500)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def add_customer(self, username, bookings=0, paid=0, phone=None):
+        user = CustomUser.objects.create_user(username=username, email=f'{username}@example.com', password='pass12345', phone_number=phone)
+        for index in range(bookings):
+            Booking.objects.create(
+                user=user, tour=self.tour, tour_date=self.tour_date, number_of_people=1,
+                payment_status='Paid' if index < paid else 'Pending',
+            )
+        return user
+
+    def listed(self, **params):
+        response = self.client.get(reverse('admin_user_list'), params)
+        return response, [user.username for user in response.context['users']]
+
+    def test_metrics_come_from_one_query(self):
+        self.add_customer('asha', bookings=3, paid=2)
+        self.listed()  # warm the session/user lookups
+
+        with CaptureQueriesContext(connection) as few:
+            self.listed()
+        for index in range(10):
+            self.add_customer(f'extra{index}', bookings=2, paid=1)
+        with CaptureQueriesContext(connection) as many:
+            response, _ = self.listed()
+
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+        asha = next(user for user in response.context['users'] if user.username == 'asha')
+        self.assertEqual((asha.booking_count, asha.total_paid), (3, 200))
+        self.assertIsNotNone(asha.last_booking)
+
+    def test_sorts_by_metrics_across_pages(self):
+        for index in range(30):
+            self.add_customer(f'c{index:02d}', bookings=index % 7, paid=index % 3)
+
+        _, first = self.listed(sort='bookings')
+        response, _ = self.listed(sort='bookings')
+        second = [user.username for user in self.client.get(
+            reverse('admin_user_list') + '?' + response.context['page'].next_query
+        ).context['users']]
+
+        ranked = sorted(CustomUser.objects.all(), key=lambda user: (-user.booking_count, -user.pk))
+        self.assertEqual(first + second, [user.username for user in ranked])
+
+        response, _ = self.listed(sort='last_booking')
+        later = self.client.get(reverse('admin_user_list') + '?' + response.context['page'].next_query)
+        self.assertEqual(len(response.context['users']) + len(later.context['users']), 31)
+
+        _, by_paid = self.listed(sort='paid')
+        richest = max(CustomUser.objects.all(), key=lambda user: (user.total_paid, user.pk))
+        self.assertEqual(by_paid[0], richest.username)
+
+    def test_metric_sorts_read_stored_columns(self):
+        self.add_customer('asha', bookings=2)
+        for sort in ('bookings', 'paid', 'last_booking'):
+            with CaptureQueriesContext(connection) as ctx:
+                self.listed(sort=sort)
+            listing = next(q['sql'] for q in ctx.captured_queries if 'FROM "users_customuser"' in q['sql'] and 'ORDER BY' in q['sql'])
+            self.assertNotIn('bookings_booking', listing)
+
+    def test_stored_metrics_follow_bookings(self):
+        asha = self.add_customer('asha', bookings=2, paid=1)
+        ravi = self.add_customer('ravi')
+
+        def metrics(user):
+            user.refresh_from_db()
+            return user.booking_count, user.total_paid, user.last_booking is not None
+
+        self.assertEqual(metrics(asha), (2, 100, True))
+        pending = Booking.objects.filter(user=asha, payment_status='Pending').get()
+
+        apply_transition('verify_payment', [pending.pk])
+        self.assertEqual(metrics(asha), (2, 200, True))
+
+        pending.refresh_from_db()
+        pending.user = ravi
+        pending.save()
+        self.assertEqual((metrics(asha), metrics(ravi)), ((1, 100, True), (1, 100, True)))
+
+        pending.delete()
+        self.assertEqual(metrics(ravi), (0, 0, False))
+
+    def test_rebuild_command_repairs_drift(self):
+        asha = self.add_customer('asha', bookings=3, paid=3)
+        Booking.objects.filter(user=asha).update(payment_status='Refunded')  # bypasses the signals
+
+        with self.assertRaisesMessage(CommandError, '1 of'):
+            call_command('rebuild_user_metrics', '--check', stdout=StringIO())
+        call_command('rebuild_user_metrics', stdout=StringIO())
+        call_command('rebuild_user_metrics', '--check', stdout=StringIO())
+
+        asha.refresh_from_db()
+        self.assertEqual((asha.booking_count, asha.total_paid), (3, 0))
+
+    def test_search_matches_prefix_and_substring(self):
+        self.add_customer('meera', phone='9876500000')
+        self.add_customer('ameer')
+
+        self.assertEqual(self.listed(q='me')[1], ['meera'])  # short: prefix only
+        self.assertEqual(sorted(self.listed(q='mee')[1]), ['ameer', 'meera'])
+        self.assertEqual(self.listed(q='76500')[1], ['meera'])
@@ -11,6 +11,7 @@ urlpatterns = [
     # Dashboards
     path('dashboard/', views.dashboard, name='dashboard'),             # Customer Dashboard
     path('admin-dashboard/', views.admin_dashboard, name='admin_dashboard'), # Admin Main Dashboard
+    path('admin-dashboard/stats/', views.admin_dashboard_stats, name='admin_dashboard_stats'), # Same figures as JSON
     
     # Admin User Management
     path('admin-panel/users/', views.admin_user_list, name='admin_user_list'),
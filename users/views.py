@@ -2,13 +2,34 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import login, get_user_model
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required
-from django.db.models import Sum, Q
+from django.http import JsonResponse
+from django.db.models import Count, F, Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.safestring import mark_safe
 
 from .forms import CustomUserCreationForm
 from bookings.models import Booking
+from bookings.stats import booking_stats
+from bondvoyage.pagination import paginate_keyset
+from tours.cache import cached_fragment
 
 User = get_user_model()
 
+# ?sort= choices on the staff user list -> ordering (all descending)
+USER_SORTS = {
+    'joined': '-date_joined',
+    'bookings': '-booking_count',
+    'paid': '-total_paid',
+    'last_booking': '-last_booking_key',
+}
+USER_SORT_LABELS = [
+    ('joined', 'Newest'),
+    ('bookings', 'Most bookings'),
+    ('paid', 'Total paid'),
+    ('last_booking', 'Last booking'),
+]
+
 def register(request):
     """
     Handles User Registration.
@@ -27,57 +48,72 @@ def register(request):
 @login_required
 def dashboard(request):
     """
-    Customer Dashboard: Shows their specific booking history.
+    Customer Dashboard: upcoming trips and past bookings, each paginated.
+    The rendered lists are cached per user (scope user:<id>), bumped by
+    bookings.signals whenever one of the user's bookings changes.
     """
     if request.user.is_staff or request.user.role == 'admin':
         return redirect('admin_dashboard')
 
-    my_bookings = Booking.objects.filter(user=request.user).order_by('-booking_date')
-    
-    return render(request, 'dashboard.html', {'bookings': my_bookings})
+    today = timezone.localdate()
+
+    def render_trips():
+        my_bookings = Booking.objects.filter(user=request.user).select_related('tour', 'tour_date')
+        is_upcoming = Q(tour_date__start_date__gte=today)
+
+        upcoming = (
+            my_bookings.filter(is_upcoming)
+            .annotate(trip_date=F('tour_date__start_date'))
+            .order_by('trip_date')
+        )
+        past = my_bookings.exclude(is_upcoming).order_by('-booking_date')  # includes open (dateless) bookings
+        counts = Booking.objects.filter(user=request.user).aggregate(
+            total=Count('pk'), upcoming=Count('pk', filter=is_upcoming),
+        )
+
+        return render_to_string('includes/dashboard_trips.html', {
+            'upcoming': paginate_keyset(request, upcoming, per_page=10, cursor_param='upcoming'),
+            'past': paginate_keyset(request, past, per_page=10, cursor_param='past'),
+            'total_trips': counts['total'],
+            'upcoming_count': counts['upcoming'],
+            'past_count': counts['total'] - counts['upcoming'],
+        })
+
+    trips = cached_fragment(
+        'dashboard', ['catalog', f"user:{request.user.pk}"], render_trips,
+        vary_on=[today, *sorted(request.GET.lists())],
+    )
+    return render(request, 'dashboard.html', {'trips': mark_safe(trips)})
 
 @staff_member_required
 def admin_dashboard(request):
     """
     Admin Dashboard: Shows global stats, revenue, and booking statuses.
     """
-    bookings = Booking.objects.all()
-    
-    stats = {
-        'total_bookings': bookings.count(),
-        'confirmed_bookings': bookings.filter(status='Confirmed').count(),
-        'pending_bookings': bookings.filter(status='Pending').count(),
-        'cancelled_bookings': bookings.filter(status='Cancelled').count(),
-        'completed_bookings': bookings.filter(status='Completed').count(),
-    }
-
-    revenue = bookings.filter(payment_status='Paid').aggregate(Sum('total_price'))['total_price__sum'] or 0
-    
-    pending_pay_amt = bookings.filter(payment_status='Pending').aggregate(Sum('total_price'))['total_price__sum'] or 0
-    pending_pay_cnt = bookings.filter(payment_status='Pending').count()
-    
-    refunded_pay_amt = bookings.filter(payment_status='Refunded').aggregate(Sum('total_price'))['total_price__sum'] or 0
-    refunded_pay_cnt = bookings.filter(payment_status='Refunded').count()
+    # One cached conditional-aggregation query over the revenue rollup
+    context = {**booking_stats()}
+    return render(request, 'admin_dashboard.html', context)
 
-    rejected_pay_amt = bookings.filter(payment_status='Rejected').aggregate(Sum('total_price'))['total_price__sum'] or 0
-    rejected_pay_cnt = bookings.filter(payment_status='Rejected').count()
 
-    context = {
-        **stats,
-        'total_revenue': revenue,
-        'pending_pay_amt': pending_pay_amt, 'pending_pay_cnt': pending_pay_cnt,
-        'refunded_pay_amt': refunded_pay_amt, 'refunded_pay_cnt': refunded_pay_cnt,
-        'rejected_pay_amt': rejected_pay_amt, 'rejected_pay_cnt': rejected_pay_cnt,
-    }
-    return render(request, 'admin_dashboard.html', context)
+@staff_member_required
+def admin_dashboard_stats(request):
+    """
+    The dashboard figures as JSON, for auto-refreshing widgets and scripts.
+    """
+    return JsonResponse(booking_stats())
 
 
 @staff_member_required
 def admin_user_list(request):
     """
-    Lists all registered users with filters for Roles and Search.
+    Lists all registered users with filters for Roles and Search, plus each
+    user's booking count, total paid and last booking (sortable).
     """
-    users = User.objects.all().order_by('-date_joined')
+    sort = request.GET.get('sort')
+    if sort not in USER_SORTS:
+        sort = 'joined'
+
+    users = User.objects.with_last_booking_key().order_by(USER_SORTS[sort])
     
     role_filter = request.GET.get('role')
     query = request.GET.get('q')
@@ -88,13 +124,15 @@ def admin_user_list(request):
         users = users.filter(role=User.CUSTOMER)
 
     if query:
-        users = users.filter(
-            Q(username__icontains=query) | 
-            Q(email__icontains=query)
-        )
+        users = users.search(query)
+
+    page = paginate_keyset(request, users)
 
     context = {
-        'users': users,
-        'current_role': role_filter
+        'users': page,
+        'page': page,
+        'current_role': role_filter,
+        'current_sort': sort,
+        'sort_choices': USER_SORT_LABELS,
     }
     return render(request, 'admin/user_list.html', context)
\ No newline at end of file